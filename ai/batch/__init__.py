@@ -0,0 +1,31 @@
+# The batch lane for non-interactive work such as the summary workflow.
+# With `SUMMARY_BATCH_MODE=true`, workflow requests are queued and sent through provider batch APIs
+# (OpenAI Batch, Anthropic Message Batches) instead of the synchronous path used for live chat.
+# Listeners register a handler for their kind of request with `register_batch_handler()`,
+# which is also how results reach them after a restart.
+# New batch backends implement `BaseBatchBackend` in `base_backend.py`.
+import os
+import threading
+from typing import Optional
+
+from .batch_queue import BatchQueue, register_batch_handler
+
+__all__ = [
+    "SUMMARY_BATCH_MODE",
+    "BatchQueue",
+    "get_batch_queue",
+    "register_batch_handler",
+]
+
+SUMMARY_BATCH_MODE = os.environ.get("SUMMARY_BATCH_MODE", "").lower() in ("1", "true")
+
+_batch_queue: Optional[BatchQueue] = None
+_batch_queue_lock = threading.Lock()
+
+
+def get_batch_queue() -> BatchQueue:
+    global _batch_queue
+    with _batch_queue_lock:
+        if _batch_queue is None:
+            _batch_queue = BatchQueue()
+        return _batch_queue
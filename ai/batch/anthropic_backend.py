@@ -0,0 +1,85 @@
+# Runs batch requests through the Anthropic Message Batches API.
+import logging
+import os
+from typing import List, Optional
+
+import anthropic
+
+from ..providers.base_provider import build_metadata
+from .base_backend import BaseBatchBackend, BatchRequest, BatchResult
+
+logger = logging.getLogger(__name__)
+
+
+class AnthropicBatchBackend(BaseBatchBackend):
+    def __init__(self):
+        self.client = anthropic.Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+
+    def submit(self, requests: List[BatchRequest]) -> str:
+        batch = self.client.messages.batches.create(
+            requests=[
+                {
+                    "custom_id": request["custom_id"],
+                    "params": {
+                        "model": request["model"],
+                        "system": request["system_content"],
+                        "messages": [
+                            {
+                                "role": "user",
+                                "content": [
+                                    {"type": "text", "text": request["prompt"]}
+                                ],
+                            }
+                        ],
+                        "max_tokens": request["max_tokens"],
+                    },
+                }
+                for request in requests
+            ]
+        )
+        logger.info(
+            f"[AnthropicBatch] Submitted batch {batch.id} ({len(requests)} requests)"
+        )
+        return batch.id
+
+    def poll(self, batch_id: str) -> Optional[List[BatchResult]]:
+        batch = self.client.messages.batches.retrieve(batch_id)
+        if batch.processing_status != "ended":
+            return None
+
+        results = []
+        for entry in self.client.messages.batches.results(batch_id):
+            if entry.result.type != "succeeded":
+                results.append(
+                    BatchResult(
+                        custom_id=entry.custom_id,
+                        text=None,
+                        metadata=None,
+                        error=f"Anthropic batch request {entry.result.type}",
+                    )
+                )
+                continue
+
+            message = entry.result.message
+            usage = message.usage
+            cached_tokens = usage.cache_read_input_tokens or 0
+            results.append(
+                BatchResult(
+                    custom_id=entry.custom_id,
+                    text="".join(
+                        block.text for block in message.content if block.type == "text"
+                    ),
+                    metadata=build_metadata(
+                        "anthropic",
+                        message.model,
+                        0.0,
+                        input_tokens=usage.input_tokens
+                        + cached_tokens
+                        + (usage.cache_creation_input_tokens or 0),
+                        output_tokens=usage.output_tokens,
+                        cached_tokens=cached_tokens,
+                    ),
+                    error=None,
+                )
+            )
+        return results
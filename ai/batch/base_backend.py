@@ -0,0 +1,31 @@
+# A base class for batch backends, defining the interface used by the batch queue.
+from typing import List, Optional, TypedDict
+
+from ..providers.base_provider import ResponseMetadata
+
+
+class BatchRequest(TypedDict):
+    custom_id: str
+    provider: str
+    model: str
+    reasoning_effort: Optional[str]
+    system_content: str
+    prompt: str
+    max_tokens: int
+
+
+class BatchResult(TypedDict):
+    custom_id: str
+    text: Optional[str]
+    metadata: Optional[ResponseMetadata]
+    error: Optional[str]
+
+
+class BaseBatchBackend(object):
+    # Submits a group of requests as one provider batch job and returns its id
+    def submit(self, requests: List[BatchRequest]) -> str:
+        raise NotImplementedError("Subclass must implement submit")
+
+    # Returns the results once the batch has ended, or None while it is still running
+    def poll(self, batch_id: str) -> Optional[List[BatchResult]]:
+        raise NotImplementedError("Subclass must implement poll")
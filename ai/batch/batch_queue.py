@@ -0,0 +1,303 @@
+# A local queue for non-interactive requests that groups them into provider batch jobs.
+# Requests are flushed as one batch per provider when `BATCH_MAX_SIZE` requests are waiting or the
+# oldest one has waited `BATCH_FLUSH_SECONDS`; batches are then polled until their results arrive and
+# the handler registered for each request's kind is called from the queue's background thread.
+# Requests are kept in a `BatchStore` until then, with their handler's JSON payload, so `resume()`
+# picks up the batches of the previous process after a restart or deploy.
+# Set `BATCH_BACKEND=local` to run batches through the local stand-in instead of provider batch APIs.
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+from state_store.batch_store import BatchStore
+
+from ..ai_constants import DEFAULT_SYSTEM_CONTENT
+from ..providers import (
+    build_prompt,
+    build_system_content,
+    convert_markdown_to_slack,
+    get_available_providers,
+    resolve_route,
+)
+from ..usage import check_quota, record_usage
+from .anthropic_backend import AnthropicBatchBackend
+from .base_backend import BaseBatchBackend, BatchRequest, BatchResult
+from .local_backend import LocalBatchBackend
+from .openai_backend import OpenAIBatchBackend
+
+logger = logging.getLogger(__name__)
+
+BATCH_BACKEND = os.environ.get("BATCH_BACKEND", "")
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "50"))
+BATCH_FLUSH_SECONDS = float(os.environ.get("BATCH_FLUSH_SECONDS", "30"))
+BATCH_POLL_SECONDS = float(os.environ.get("BATCH_POLL_SECONDS", "30"))
+# Provider batch APIs bill at half the synchronous price
+BATCH_COST_MULTIPLIER = 0.5
+
+_TICK_SECONDS = 1.0
+_BATCH_API_BACKENDS = {
+    "openai": OpenAIBatchBackend,
+    "anthropic": AnthropicBatchBackend,
+}
+
+# Called with the payload a request was queued with, and its text or error
+CompleteHandler = Callable[[dict, str], None]
+ErrorHandler = Callable[[dict, Exception], None]
+
+_handlers: Dict[str, Tuple[CompleteHandler, ErrorHandler]] = {}
+
+
+def register_batch_handler(
+    kind: str, on_complete: CompleteHandler, on_error: ErrorHandler
+):
+    _handlers[kind] = (on_complete, on_error)
+
+
+class _BatchJob:
+    def __init__(
+        self,
+        request: BatchRequest,
+        user_id: str,
+        channel_id: Optional[str],
+        listener: str,
+        kind: str,
+        payload: dict,
+    ):
+        self.request = request
+        self.user_id = user_id
+        self.channel_id = channel_id
+        self.listener = listener
+        self.kind = kind
+        self.payload = payload
+        self.queued_at = time.monotonic()
+
+
+class _InFlightBatch:
+    def __init__(self, backend_name: str, jobs: List[_BatchJob], poll_seconds: float):
+        self.backend_name = backend_name
+        self.jobs = {job.request["custom_id"]: job for job in jobs}
+        self.poll_seconds = poll_seconds
+        self.next_poll_at = time.monotonic() + poll_seconds
+
+
+class BatchQueue:
+    def __init__(
+        self,
+        *,
+        backend: str = BATCH_BACKEND,
+        max_size: int = BATCH_MAX_SIZE,
+        flush_seconds: float = BATCH_FLUSH_SECONDS,
+        poll_seconds: float = BATCH_POLL_SECONDS,
+        store: Optional[BatchStore] = None,
+    ):
+        self.backend = backend
+        self.max_size = max_size
+        self.flush_seconds = flush_seconds
+        self.poll_seconds = poll_seconds
+        self.store = store or BatchStore()
+        self._backends: Dict[str, BaseBatchBackend] = {}
+        self._pending: Dict[str, List[_BatchJob]] = {}
+        self._in_flight: Dict[Tuple[str, str], _InFlightBatch] = {}
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(
+        self,
+        *,
+        user_id: str,
+        prompt: str,
+        context: Optional[List] = [],
+        system_content: str = DEFAULT_SYSTEM_CONTENT,
+        channel_id: Optional[str] = None,
+        listener: str = "unknown",
+        kind: str,
+        payload: dict,
+    ) -> str:
+        """Queue a request whose result is handed to the handler registered for `kind`, with `payload`."""
+        if kind not in _handlers:
+            raise ValueError(f"No batch handler registered for {kind}")
+        check_quota(user_id)
+        route = resolve_route(user_id, prompt, context, listener)
+        request = BatchRequest(
+            custom_id=uuid.uuid4().hex,
+            provider=route["provider"],
+            model=route["model"],
+            reasoning_effort=route["reasoning_effort"],
+            system_content=build_system_content(system_content),
+            prompt=build_prompt(prompt, context),
+            max_tokens=get_available_providers()[route["model"]]["max_tokens"],
+        )
+        job = _BatchJob(request, user_id, channel_id, listener, kind, payload)
+        backend_name = self._backend_name(route["provider"])
+        self.store.add(
+            backend_name, request, user_id, channel_id, listener, kind, payload
+        )
+
+        with self._condition:
+            self._pending.setdefault(backend_name, []).append(job)
+            self._start()
+            self._condition.notify()
+        logger.info(
+            f"[batch_queue] Queued {request['custom_id']} for {backend_name} ({listener})"
+        )
+        return request["custom_id"]
+
+    def resume(self):
+        """Pick up the requests and batches left over by the previous process."""
+        jobs = self.store.unfinished()
+        if not jobs:
+            return
+        in_flight: Dict[Tuple[str, str], List[_BatchJob]] = {}
+        with self._condition:
+            for row in jobs:
+                job = _BatchJob(
+                    BatchRequest(**row["request"]),
+                    row["user_id"],
+                    row["channel_id"],
+                    row["listener"],
+                    row["kind"],
+                    row["payload"],
+                )
+                # The local stand-in keeps its results in memory, so its batches are run again
+                if row["batch_id"] is None or row["backend"] == "local":
+                    self._pending.setdefault(row["backend"], []).append(job)
+                else:
+                    in_flight.setdefault((row["backend"], row["batch_id"]), []).append(
+                        job
+                    )
+            for (backend_name, batch_id), batch_jobs in in_flight.items():
+                # Poll right away, the batch may have ended while the app was down
+                batch = _InFlightBatch(backend_name, batch_jobs, self.poll_seconds)
+                batch.next_poll_at = time.monotonic()
+                self._in_flight[(backend_name, batch_id)] = batch
+            self._start()
+            self._condition.notify()
+        logger.info(
+            f"[batch_queue] Resumed {len(jobs)} requests, {len(in_flight)} batches in flight"
+        )
+
+    def _backend_name(self, provider: str) -> str:
+        if self.backend == "local" or provider not in _BATCH_API_BACKENDS:
+            return "local"
+        return provider
+
+    def _get_backend(self, name: str) -> BaseBatchBackend:
+        if name not in self._backends:
+            backend_class = _BATCH_API_BACKENDS.get(name, LocalBatchBackend)
+            self._backends[name] = backend_class()
+        return self._backends[name]
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="batch-queue", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait(_TICK_SECONDS)
+            try:
+                self._flush()
+                self._poll()
+            except Exception as e:
+                logger.error(
+                    f"[batch_queue] ERROR: {type(e).__name__}: {str(e)}", exc_info=True
+                )
+
+    def _flush(self):
+        now = time.monotonic()
+        ready = []
+        with self._condition:
+            for backend_name, jobs in self._pending.items():
+                while jobs and (
+                    len(jobs) >= self.max_size
+                    or now - jobs[0].queued_at >= self.flush_seconds
+                ):
+                    ready.append((backend_name, jobs[: self.max_size]))
+                    del jobs[: self.max_size]
+
+        for backend_name, jobs in ready:
+            try:
+                batch_id = self._get_backend(backend_name).submit(
+                    [job.request for job in jobs]
+                )
+            except Exception as e:
+                logger.error(
+                    f"[batch_queue] Failed to submit batch: {e}", exc_info=True
+                )
+                self._fail(jobs, e)
+                continue
+            self.store.set_batch_id(
+                [job.request["custom_id"] for job in jobs], batch_id
+            )
+            # The local stand-in has its results ready right away
+            poll_seconds = 0.0 if backend_name == "local" else self.poll_seconds
+            self._in_flight[(backend_name, batch_id)] = _InFlightBatch(
+                backend_name, jobs, poll_seconds
+            )
+
+    def _poll(self):
+        now = time.monotonic()
+        for key, batch in list(self._in_flight.items()):
+            if now < batch.next_poll_at:
+                continue
+            batch.next_poll_at = now + batch.poll_seconds
+            try:
+                results = self._get_backend(batch.backend_name).poll(key[1])
+            except Exception as e:
+                logger.error(f"[batch_queue] Batch {key[1]} failed: {e}", exc_info=True)
+                del self._in_flight[key]
+                self._fail(batch.jobs.values(), e)
+                continue
+            if results is None:
+                continue
+
+            del self._in_flight[key]
+            logger.info(
+                f"[batch_queue] Batch {key[1]} ended with {len(results)} results"
+            )
+            for result in results:
+                job = batch.jobs.pop(result["custom_id"], None)
+                if job is not None:
+                    self._complete(job, result)
+            self._fail(
+                batch.jobs.values(), RuntimeError("No result returned for request")
+            )
+
+    def _complete(self, job: _BatchJob, result: BatchResult):
+        if result["error"] is not None:
+            self._fail([job], RuntimeError(result["error"]))
+            return
+        self.store.remove([job.request["custom_id"]])
+        # Results name the dated model snapshot, which `MODEL_PRICING` does not list,
+        # so record the requested model like the synchronous providers do
+        metadata = dict(result["metadata"], model=job.request["model"])
+        record_usage(
+            job.user_id,
+            job.channel_id,
+            job.listener,
+            metadata,
+            cost_multiplier=1.0
+            if self._backend_name(job.request["provider"]) == "local"
+            else BATCH_COST_MULTIPLIER,
+        )
+        try:
+            on_complete, _ = _handlers[job.kind]
+            on_complete(job.payload, convert_markdown_to_slack(result["text"]))
+        except Exception as e:
+            logger.error(f"[batch_queue] on_complete failed: {e}", exc_info=True)
+
+    def _fail(self, jobs, error: Exception):
+        jobs = list(jobs)
+        self.store.remove([job.request["custom_id"] for job in jobs])
+        for job in jobs:
+            try:
+                _, on_error = _handlers[job.kind]
+                on_error(job.payload, error)
+            except Exception as e:
+                logger.error(f"[batch_queue] on_error failed: {e}", exc_info=True)
@@ -0,0 +1,52 @@
+# A local stand-in for provider batch APIs. Requests run through the regular providers
+# one after another when the batch is submitted, and the results are returned on the next poll.
+# Used for providers without a batch API, for development and for tests.
+import itertools
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from ..providers import _get_provider
+from .base_backend import BaseBatchBackend, BatchRequest, BatchResult
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBatchBackend(BaseBatchBackend):
+    def __init__(self):
+        self._results: Dict[str, List[BatchResult]] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, requests: List[BatchRequest]) -> str:
+        results = [self._run(request) for request in requests]
+        with self._lock:
+            batch_id = f"local-{next(self._ids)}"
+            self._results[batch_id] = results
+        logger.info(f"[LocalBatch] Ran batch {batch_id} ({len(requests)} requests)")
+        return batch_id
+
+    def poll(self, batch_id: str) -> Optional[List[BatchResult]]:
+        with self._lock:
+            return self._results.pop(batch_id, None)
+
+    @staticmethod
+    def _run(request: BatchRequest) -> BatchResult:
+        try:
+            provider = _get_provider(request["provider"])
+            provider.set_model(request["model"])
+            provider.set_reasoning_effort(request["reasoning_effort"])
+            provider.set_web_search(False)
+            text, metadata = provider.generate_response(
+                request["prompt"], request["system_content"]
+            )
+            return BatchResult(
+                custom_id=request["custom_id"], text=text, metadata=metadata, error=None
+            )
+        except Exception as e:
+            return BatchResult(
+                custom_id=request["custom_id"],
+                text=None,
+                metadata=None,
+                error=f"{type(e).__name__}: {e}",
+            )
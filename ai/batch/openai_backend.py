@@ -0,0 +1,112 @@
+# Runs batch requests through the OpenAI Batch API against `/v1/responses`.
+# Requests are uploaded as a JSONL file, and the output file is parsed once the batch has ended.
+import io
+import json
+import logging
+import os
+from typing import List, Optional
+
+import openai
+
+from ..providers.base_provider import build_metadata
+from .base_backend import BaseBatchBackend, BatchRequest, BatchResult
+
+logger = logging.getLogger(__name__)
+
+_FAILED_STATUSES = ("failed", "expired", "cancelled")
+
+
+class OpenAIBatchBackend(BaseBatchBackend):
+    def __init__(self):
+        self.client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+
+    def submit(self, requests: List[BatchRequest]) -> str:
+        lines = []
+        for request in requests:
+            body = {
+                "model": request["model"],
+                "input": [
+                    {"role": "developer", "content": request["system_content"]},
+                    {"role": "user", "content": request["prompt"]},
+                ],
+                "max_output_tokens": request["max_tokens"],
+            }
+            if request["reasoning_effort"]:
+                body["reasoning"] = {"effort": request["reasoning_effort"]}
+            lines.append(
+                json.dumps(
+                    {
+                        "custom_id": request["custom_id"],
+                        "method": "POST",
+                        "url": "/v1/responses",
+                        "body": body,
+                    }
+                )
+            )
+
+        input_file = self.client.files.create(
+            file=("batch.jsonl", io.BytesIO("\n".join(lines).encode())),
+            purpose="batch",
+        )
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/responses",
+            completion_window="24h",
+        )
+        logger.info(
+            f"[OpenAIBatch] Submitted batch {batch.id} ({len(requests)} requests)"
+        )
+        return batch.id
+
+    def poll(self, batch_id: str) -> Optional[List[BatchResult]]:
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status in _FAILED_STATUSES:
+            raise RuntimeError(f"OpenAI batch {batch_id} {batch.status}")
+        if batch.status != "completed":
+            return None
+
+        results = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                content = self.client.files.content(file_id).text
+                results.extend(
+                    self._parse_line(json.loads(line))
+                    for line in content.splitlines()
+                    if line.strip()
+                )
+        return results
+
+    @staticmethod
+    def _parse_line(line: dict) -> BatchResult:
+        response = line.get("response") or {}
+        body = response.get("body") or {}
+        if line.get("error") or response.get("status_code") != 200:
+            error = line.get("error") or body.get("error")
+            return BatchResult(
+                custom_id=line["custom_id"], text=None, metadata=None, error=str(error)
+            )
+
+        text = "".join(
+            content.get("text", "")
+            for item in body.get("output", [])
+            if item.get("type") == "message"
+            for content in item.get("content", [])
+            if content.get("type") == "output_text"
+        )
+        usage = body.get("usage") or {}
+        metadata = build_metadata(
+            "openai",
+            body.get("model", ""),
+            0.0,
+            input_tokens=usage.get("input_tokens"),
+            output_tokens=usage.get("output_tokens"),
+            cached_tokens=(usage.get("input_tokens_details") or {}).get(
+                "cached_tokens"
+            ),
+            reasoning_tokens=(usage.get("output_tokens_details") or {}).get(
+                "reasoning_tokens"
+            ),
+        )
+        return BatchResult(
+            custom_id=line["custom_id"], text=text, metadata=metadata, error=None
+        )
@@ -0,0 +1,104 @@
+# Cooperative cancellation of the provider call a request is waiting on.
+# A listener runs its work inside `with cancellable(token):`, and another thread calls `token.cancel(reason)`
+# when the request became obsolete. Streaming providers register `on_cancel` callbacks that close their stream,
+# which ends the call right away and frees its connection or slot; other providers and the code between calls
+# check `raise_if_cancelled()`. Either way the request ends with `RequestCancelled`.
+# A token entered inside another one is also cancelled with it, e.g. by the request's deadline (`ai/deadlines.py`).
+# `ContextExecutor` tasks inherit the token, like spans.
+import contextvars
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RequestCancelled(Exception):
+    def __init__(self, reason: str):
+        super().__init__(f"Request cancelled: {reason}")
+        self.reason = reason
+
+
+def _unlinked():
+    """What `on_cancel` returns when there is nothing to unregister."""
+
+
+class CancellationToken:
+    def __init__(self):
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> bool:
+        """Cancel once, running the registered callbacks; returns False if it already was."""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"[cancellation] Cancel callback failed: {e}")
+        return True
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Run `callback` on cancellation, or now if already cancelled. Returns a function unregistering it."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+
+                def unregister():
+                    with self._lock:
+                        if callback in self._callbacks:
+                            self._callbacks.remove(callback)
+
+                return unregister
+        callback()
+        return _unlinked
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until cancelled or `timeout` seconds passed; returns whether it was cancelled."""
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise RequestCancelled(self.reason)
+
+
+_current_token: contextvars.ContextVar[Optional[CancellationToken]] = (
+    contextvars.ContextVar("cancellation_token", default=None)
+)
+
+
+def current_cancellation() -> Optional[CancellationToken]:
+    return _current_token.get()
+
+
+def raise_if_cancelled():
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+@contextmanager
+def cancellable(token: Optional[CancellationToken]):
+    """Run under `token`, which the enclosing token's cancellation also cancels; None leaves it."""
+    outer = _current_token.get()
+    unlink = _unlinked
+    if token is not None and outer is not None and outer is not token:
+        unlink = outer.on_cancel(lambda: token.cancel(outer.reason))
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+        unlink()
@@ -0,0 +1,221 @@
+# A local, CPU-only retrieval index over channel history.
+# Each channel gets a `ChannelIndex` holding hashed term-frequency vectors in a NumPy matrix.
+# Messages are added incrementally from `message` events, and queries are answered with a
+# vectorized TF-IDF cosine top-k search, so no network embedding service is needed.
+# `select_context()` combines the most relevant messages with the most recent few,
+# in chronological order, ready to be passed to `get_provider_response()`.
+import logging
+import os
+import re
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+INDEX_DIMENSIONS = int(os.environ.get("RETRIEVAL_INDEX_DIMENSIONS", "1024"))
+INDEX_MAX_MESSAGES = int(os.environ.get("RETRIEVAL_INDEX_MAX_MESSAGES", "2000"))
+RETRIEVAL_TOP_K = int(os.environ.get("RETRIEVAL_TOP_K", "8"))
+RETRIEVAL_RECENT = int(os.environ.get("RETRIEVAL_RECENT", "5"))
+
+_INITIAL_CAPACITY = 64
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def vectorize(text: str, dimensions: int = INDEX_DIMENSIONS) -> np.ndarray:
+    """
+    Hash the tokens of `text` into a signed, sublinear term-frequency vector.
+    crc32 is used instead of `hash()` so vectors are stable across processes.
+    """
+    vector = np.zeros(dimensions, dtype=np.float32)
+    tokens = _TOKEN_PATTERN.findall(text.lower())
+    if not tokens:
+        return vector
+
+    hashes = np.fromiter(
+        (zlib.crc32(token.encode()) for token in tokens),
+        dtype=np.uint32,
+        count=len(tokens),
+    )
+    buckets = (hashes % dimensions).astype(np.intp)
+    signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+    np.add.at(vector, buckets, signs)
+    return np.sign(vector) * np.log1p(np.abs(vector))
+
+
+class ChannelIndex:
+    def __init__(
+        self,
+        *,
+        dimensions: int = INDEX_DIMENSIONS,
+        max_messages: int = INDEX_MAX_MESSAGES,
+    ):
+        self.dimensions = dimensions
+        self.max_messages = max_messages
+        capacity = min(_INITIAL_CAPACITY, max_messages)
+        self._vectors = np.zeros((capacity, dimensions), dtype=np.float32)
+        self._timestamps = np.zeros(capacity, dtype=np.float64)
+        self._doc_freq = np.zeros(dimensions, dtype=np.float32)
+        self._messages: List[Optional[dict]] = [None] * capacity
+        self._slots: Dict[str, int] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        # Whether the channel's history before the app started has been added, see `mark_backfilled()`
+        self.backfilled = False
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, message: dict):
+        """Add or replace a parsed message (`user`, `text`, `ts`) in the index."""
+        ts = message.get("ts")
+        text = message.get("text")
+        if not ts or not text:
+            return
+
+        vector = vectorize(text, self.dimensions)
+        with self._lock:
+            slot = self._slots.get(ts)
+            if slot is None:
+                slot = self._allocate_slot()
+            else:
+                self._doc_freq -= self._vectors[slot] != 0
+
+            self._vectors[slot] = vector
+            self._doc_freq += vector != 0
+            self._timestamps[slot] = float(ts)
+            self._messages[slot] = {
+                "user": message.get("user"),
+                "text": text,
+                "ts": ts,
+            }
+            self._slots[ts] = slot
+
+    def add_messages(self, messages: Iterable[dict]):
+        for message in messages:
+            self.add(message)
+
+    def mark_backfilled(self) -> bool:
+        """
+        Claim the channel's one-time history backfill, returning False if it was already claimed.
+        The flag is separate from the index's size, since live `message` events are indexed
+        from startup on, usually before anyone mentions the app in the channel.
+        """
+        with self._lock:
+            if self.backfilled:
+                return False
+            self.backfilled = True
+            return True
+
+    def remove(self, ts: str):
+        with self._lock:
+            slot = self._slots.pop(ts, None)
+            if slot is None:
+                return
+            self._doc_freq -= self._vectors[slot] != 0
+            # Move the last live row into the freed slot to keep rows [0, size) dense
+            last = self._size - 1
+            if slot != last:
+                moved = self._messages[last]
+                self._vectors[slot] = self._vectors[last]
+                self._timestamps[slot] = self._timestamps[last]
+                self._messages[slot] = moved
+                self._slots[moved["ts"]] = slot
+            self._vectors[last] = 0
+            self._timestamps[last] = 0
+            self._messages[last] = None
+            self._size = last
+
+    def search(
+        self, query: str, top_k: int = RETRIEVAL_TOP_K, exclude_ts: Optional[str] = None
+    ) -> List[dict]:
+        """Return up to `top_k` messages ranked by TF-IDF cosine similarity to `query`."""
+        query_vector = vectorize(query, self.dimensions)
+        if top_k <= 0 or not query_vector.any():
+            return []
+
+        with self._lock:
+            size = self._size
+            if size == 0:
+                return []
+            idf = np.log((1.0 + size) / (1.0 + self._doc_freq)) + 1.0
+            weighted = self._vectors[:size] * idf
+            norms = np.linalg.norm(weighted, axis=1)
+            query_weighted = query_vector * idf
+            scores = weighted @ query_weighted
+            scores /= np.maximum(norms * np.linalg.norm(query_weighted), 1e-12)
+            if exclude_ts in self._slots:
+                scores[self._slots[exclude_ts]] = 0.0
+
+            k = min(top_k, size)
+            candidates = np.argpartition(-scores, k - 1)[:k]
+            ranked = candidates[np.argsort(-scores[candidates])]
+            return [self._messages[i] for i in ranked if scores[i] > 0]
+
+    def recent(self, count: int = RETRIEVAL_RECENT, exclude_ts: Optional[str] = None):
+        """Return the `count` newest messages, oldest first."""
+        with self._lock:
+            order = np.argsort(self._timestamps[: self._size])
+            messages = [self._messages[i] for i in order]
+        messages = [message for message in messages if message["ts"] != exclude_ts]
+        return messages[-count:] if count > 0 else []
+
+    def select_context(
+        self,
+        query: str,
+        *,
+        top_k: int = RETRIEVAL_TOP_K,
+        recent: int = RETRIEVAL_RECENT,
+        exclude_ts: Optional[str] = None,
+    ) -> List[dict]:
+        """
+        Combine the `top_k` messages most relevant to `query` with the `recent` newest ones,
+        de-duplicated and sorted in chronological order (most recent message last).
+        """
+        selected = {
+            message["ts"]: message
+            for message in self.search(query, top_k, exclude_ts)
+            + self.recent(recent, exclude_ts)
+        }
+        return sorted(selected.values(), key=lambda message: float(message["ts"]))
+
+    def _allocate_slot(self) -> int:
+        capacity = len(self._messages)
+        if self._size < capacity:
+            self._size += 1
+            return self._size - 1
+
+        if capacity < self.max_messages:
+            new_capacity = min(capacity * 2, self.max_messages)
+            self._vectors = np.resize(self._vectors, (new_capacity, self.dimensions))
+            self._vectors[capacity:] = 0
+            self._timestamps = np.resize(self._timestamps, new_capacity)
+            self._timestamps[capacity:] = 0
+            self._messages.extend([None] * (new_capacity - capacity))
+            self._size += 1
+            return self._size - 1
+
+        # The index is full: evict the oldest message and reuse its slot
+        oldest = int(np.argmin(self._timestamps[: self._size]))
+        self._doc_freq -= self._vectors[oldest] != 0
+        del self._slots[self._messages[oldest]["ts"]]
+        return oldest
+
+
+_indexes: Dict[str, ChannelIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_channel_index(channel_id: str) -> ChannelIndex:
+    with _indexes_lock:
+        index = _indexes.get(channel_id)
+        if index is None:
+            logger.info(f"[channel_index] Creating index for channel {channel_id}")
+            index = ChannelIndex()
+            _indexes[channel_id] = index
+        return index
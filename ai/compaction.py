@@ -0,0 +1,158 @@
+# Thread compaction for long DM and channel threads.
+# Once the messages after a thread's stored summary pass `COMPACTION_THRESHOLD_TOKENS`, everything but the
+# last `COMPACTION_TAIL_MESSAGES` is folded into a new summary, keyed by `(channel_id, thread_ts)`.
+# `compact_context()` returns the stored summary plus the messages posted after it, and schedules the
+# recompaction on a background thread, so replies never wait for it.
+import logging
+import os
+import threading
+from typing import List, Optional
+
+from observability.tracing import ContextExecutor
+from state_store.thread_state_store import ThreadSummary, get_thread_state_store
+
+from .deadlines import without_deadline
+from .model_router import Route
+from .providers import get_available_providers, get_provider_response
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+COMPACTION_THRESHOLD_TOKENS = int(os.environ.get("COMPACTION_THRESHOLD_TOKENS", "4000"))
+COMPACTION_TAIL_MESSAGES = int(os.environ.get("COMPACTION_TAIL_MESSAGES", "10"))
+COMPACTION_PROVIDER = os.environ.get("COMPACTION_PROVIDER", "openai")
+COMPACTION_MODEL = os.environ.get("COMPACTION_MODEL", "gpt-4.1-mini")
+
+SUMMARY_USER = "summary of earlier messages"
+
+COMPACTION_SYSTEM_CONTENT = """
+You maintain a running summary of a Slack thread so that it can be continued without the full history.
+Keep every question asked, answer given, decision made, open item, name, number and link that later messages
+may refer to. Refer to people by their Slack user ID. Drop greetings and small talk.
+Write plain, dense bullet points and no more than 400 words.
+"""
+COMPACTION_PROMPT = "Update the summary of this thread: merge the existing summary, if any, with the messages in the context."
+
+_pending = set()
+_pending_lock = threading.Lock()
+_executor = ContextExecutor(max_workers=2, thread_name_prefix="compaction")
+
+
+def estimate_tokens(context: Optional[List]) -> int:
+    return sum(len(message.get("text") or "") for message in context or []) // 4
+
+
+def _ts(message: dict) -> float:
+    return float(message.get("ts") or 0)
+
+
+def _summary_message(summary: ThreadSummary) -> dict:
+    return {
+        "user": SUMMARY_USER,
+        "text": summary["summary"],
+        "ts": summary["summarized_until"],
+    }
+
+
+def compact_context(
+    user_id: str, channel_id: str, thread_ts: str, context: Optional[List]
+) -> Optional[List]:
+    """Replace the already summarized part of a thread's context with its stored summary."""
+    if not context:
+        return context
+
+    try:
+        summary = get_thread_state_store().get_summary(channel_id, thread_ts)
+    except Exception as e:
+        logger.error(f"[compaction] Failed to read summary: {e}", exc_info=True)
+        return context
+
+    if summary:
+        cutoff = float(summary["summarized_until"])
+        recent = [message for message in context if _ts(message) > cutoff]
+        compacted = [_summary_message(summary)] + recent
+        logger.info(
+            f"[compaction] Replaced {len(context) - len(recent)} messages with the summary of {thread_ts}"
+        )
+    else:
+        recent = context
+        compacted = context
+
+    if (
+        len(recent) > COMPACTION_TAIL_MESSAGES
+        and estimate_tokens(recent) > COMPACTION_THRESHOLD_TOKENS
+    ):
+        _schedule_recompaction(
+            user_id, channel_id, thread_ts, summary, recent[:-COMPACTION_TAIL_MESSAGES]
+        )
+    return compacted
+
+
+def _schedule_recompaction(
+    user_id: str,
+    channel_id: str,
+    thread_ts: str,
+    summary: Optional[ThreadSummary],
+    messages: List[dict],
+):
+    key = (channel_id, thread_ts)
+    with _pending_lock:
+        if key in _pending:
+            return
+        _pending.add(key)
+    # The task copies the request's context for its span, but outlives the request: leave its
+    # cancellation token and deadline behind, so a superseded or timed-out request does not stop it
+    with without_deadline():
+        _executor.submit(_recompact, user_id, channel_id, thread_ts, summary, messages)
+
+
+def _compaction_route() -> Optional[Route]:
+    # Fall back to the regular router when the compaction model's provider is not configured
+    if COMPACTION_MODEL not in get_available_providers():
+        return None
+    return Route(
+        provider=COMPACTION_PROVIDER,
+        model=COMPACTION_MODEL,
+        reasoning_effort=None,
+        reason="thread compaction",
+    )
+
+
+def _recompact(
+    user_id: str,
+    channel_id: str,
+    thread_ts: str,
+    summary: Optional[ThreadSummary],
+    messages: List[dict],
+):
+    try:
+        context = ([_summary_message(summary)] if summary else []) + messages
+        logger.info(
+            f"[compaction] Compacting {len(messages)} messages of thread {thread_ts}"
+        )
+        text = get_provider_response(
+            user_id,
+            COMPACTION_PROMPT,
+            context,
+            COMPACTION_SYSTEM_CONTENT,
+            channel_id=channel_id,
+            listener="compaction",
+            route=_compaction_route(),
+            web_search=False,
+        )
+        get_thread_state_store().set_summary(
+            channel_id, thread_ts, text, messages[-1]["ts"]
+        )
+        logger.info(
+            f"[compaction] Thread {thread_ts} summarized until {messages[-1]['ts']}"
+        )
+    except Exception as e:
+        logger.error(
+            f"[compaction] Failed to compact thread {thread_ts}: {type(e).__name__}: {e}",
+            exc_info=True,
+        )
+    finally:
+        with _pending_lock:
+            _pending.discard((channel_id, thread_ts))
@@ -0,0 +1,67 @@
+# Context fetched on demand. With `CONTEXT_TOOLS=true`, mentions and DMs no longer fetch their thread or channel
+# history up front: `get_provider_response()` exposes the `ContextTools` it is given to the model as tools, and runs
+# the tool-call loop, so the model only pulls context when the question needs it. A request makes at most
+# `CONTEXT_TOOLS_MAX_CALLS` tool calls and spends at most `CONTEXT_TOOLS_MAX_TOKENS` input and output tokens
+# on its turns; past either limit, the model has to answer with what it has. Each result is cut to
+# `CONTEXT_TOOL_RESULT_CHARS` characters. Providers without tool support (`supports_tools`) get the context
+# the tools would have returned up front instead, from `ContextTools.prefetch()`.
+import logging
+import os
+from typing import Any, Dict, List, TypedDict
+
+from observability.metrics import increment
+from observability.tracing import start_span
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_TOOLS = os.environ.get("CONTEXT_TOOLS", "").lower() in ("1", "true")
+CONTEXT_TOOLS_MAX_CALLS = int(os.environ.get("CONTEXT_TOOLS_MAX_CALLS", "6"))
+CONTEXT_TOOLS_MAX_TOKENS = int(os.environ.get("CONTEXT_TOOLS_MAX_TOKENS", "30000"))
+CONTEXT_TOOL_RESULT_CHARS = int(os.environ.get("CONTEXT_TOOL_RESULT_CHARS", "12000"))
+
+CALL_LIMIT_RESULT = "Tool call limit reached: answer with the context you already have."
+
+
+class ToolSpec(TypedDict):
+    name: str
+    description: str
+    # JSON schema of the arguments
+    parameters: Dict[str, Any]
+
+
+class ToolCall(TypedDict):
+    # Provider-side id, which the call's result refers to
+    id: str
+    name: str
+    arguments: Dict[str, Any]
+
+
+class ContextTools:
+    """Tools the model can call for context; subclasses list their `specs` and implement them as methods."""
+
+    specs: List[ToolSpec] = []
+
+    def prefetch(self) -> List[dict]:
+        """The context to send up front to providers that cannot call tools."""
+        return []
+
+    def run(self, call: ToolCall) -> str:
+        name = call["name"]
+        increment("context_tool_calls", tool=name)
+        with start_span(
+            f"context_tool.{name}", {"tool.arguments": str(call["arguments"])}
+        ):
+            if name not in {spec["name"] for spec in self.specs}:
+                return f"Error: unknown tool {name}"
+            try:
+                result = getattr(self, name)(**call["arguments"])
+            except Exception as e:
+                # The model sees the error and can retry or answer without it
+                logger.warning(
+                    f"[context_tools] {name} failed: {type(e).__name__}: {e}"
+                )
+                increment("context_tool_errors", tool=name)
+                return f"Error: {type(e).__name__}: {e}"
+        if len(result) > CONTEXT_TOOL_RESULT_CHARS:
+            result = result[:CONTEXT_TOOL_RESULT_CHARS] + "\n[truncated]"
+        return result
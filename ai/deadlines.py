@@ -0,0 +1,126 @@
+# End-to-end deadlines. LLM-backed requests get a `Deadline` of `REQUEST_DEADLINE_SECONDS` as soon as they are
+# accepted (see `listeners/listener_utils/bulkheads.py`), and job workers one per job. Every stage after that,
+# Slack Web API calls and provider calls alike, asks `stage_timeout()` for its timeout, which is the stage's own
+# default capped at the time left. A `Deadline` is a `CancellationToken`, so when it passes, the request is
+# cancelled like a superseded one: streaming providers close their stream, and the other stages time out on
+# their own. The listener then replaces its placeholder with a timeout message, under `without_deadline()`.
+# Every expired deadline is counted in `deadline_timeouts`, by the stage that was running.
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from observability.metrics import increment
+
+from .cancellation import CancellationToken, cancellable
+
+logger = logging.getLogger(__name__)
+
+# 0 turns deadlines off
+REQUEST_DEADLINE_SECONDS = float(os.environ.get("REQUEST_DEADLINE_SECONDS", "300"))
+# Per provider call, within or without a deadline
+PROVIDER_TIMEOUT_SECONDS = float(os.environ.get("PROVIDER_TIMEOUT_SECONDS", "240"))
+
+DEADLINE_REASON = "timed out"
+
+
+class Deadline(CancellationToken):
+    """A cancellation token cancelling itself `seconds` after it was created."""
+
+    def __init__(self, seconds: float, clock: Callable[[], float] = time.monotonic):
+        super().__init__()
+        self.seconds = seconds
+        self._clock = clock
+        self.expires_at = clock() + seconds
+        # The stage that last asked for a timeout, which a timeout is counted against
+        self.stage = "queue"
+        self._timer = threading.Timer(seconds, self.expire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - self._clock())
+
+    @property
+    def expired(self) -> bool:
+        return self.reason == DEADLINE_REASON or self.remaining() <= 0
+
+    def expire(self):
+        if self.cancel(DEADLINE_REASON):
+            logger.warning(
+                f"[deadlines] Request timed out after {self.seconds:g}s in stage {self.stage}"
+            )
+            increment("deadline_timeouts", stage=self.stage)
+
+    def close(self):
+        """Stop the timer once the request is done."""
+        self._timer.cancel()
+
+
+_current_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar(
+    "deadline", default=None
+)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def start_deadline(seconds: float = REQUEST_DEADLINE_SECONDS) -> Optional[Deadline]:
+    return Deadline(seconds) if seconds > 0 else None
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    """Run under `deadline`, cancelling the work when it passes, and close it afterwards."""
+    if deadline is None:
+        yield None
+        return
+    reset = _current_deadline.set(deadline)
+    try:
+        with cancellable(deadline):
+            yield deadline
+    finally:
+        _current_deadline.reset(reset)
+        deadline.close()
+
+
+@contextmanager
+def without_deadline():
+    """For the last words of a request that timed out, such as replacing its placeholder."""
+    reset = _current_deadline.set(None)
+    try:
+        with cancellable(None):
+            yield
+    finally:
+        _current_deadline.reset(reset)
+
+
+def stage_timeout(stage: str, default: Optional[float]) -> Optional[float]:
+    """The timeout of `stage`: its `default`, capped at what is left of the request's deadline."""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return default
+    deadline.stage = stage
+    return capped_timeout(default)
+
+
+def capped_timeout(default: Optional[float]) -> Optional[float]:
+    """`default` capped at what is left of the request's deadline, for the stage already running."""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return default
+    if deadline.remaining() <= 0:
+        deadline.expire()
+    deadline.raise_if_cancelled()
+    remaining = deadline.remaining()
+    return remaining if default is None else min(default, remaining)
+
+
+def deadline_exceeded() -> bool:
+    """Whether the current request failed because its deadline passed."""
+    deadline = _current_deadline.get()
+    return deadline is not None and deadline.expired
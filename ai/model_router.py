@@ -0,0 +1,216 @@
+# Chooses the provider, model and reasoning effort for each request.
+# The model a user picked in the App Home is honored as-is. Users who pick "Auto" get each request
+# classified locally (prompt length, context size, listener type and explicit cues) and routed to the
+# cheapest model whose observed latency is expected to meet the listener's latency SLO.
+# Observed latencies are kept as moving averages per model and reasoning effort,
+# seeded from the usage store so a restart does not forget them.
+import logging
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple, TypedDict
+
+from state_store.get_user_state import get_user_state
+
+from .usage import MODEL_PRICING, get_usage_store
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+AUTO_PROVIDER = "auto"
+DEFAULT_PROVIDER = os.environ.get("DEFAULT_PROVIDER", "openai")
+DEFAULT_MODEL = os.environ.get("DEFAULT_MODEL", "gpt-5.2")
+
+# Latency SLO in seconds per listener type; workflows are not interactive
+LATENCY_SLO_SECONDS = {
+    "app_mentioned": float(os.environ.get("LATENCY_SLO_SECONDS", "15")),
+    "app_messaged": float(os.environ.get("LATENCY_SLO_SECONDS", "15")),
+    "ask_command": float(os.environ.get("LATENCY_SLO_SECONDS", "15")),
+    "summary_function": 120.0,
+}
+DEFAULT_LATENCY_SLO_SECONDS = 30.0
+# Requests that explicitly ask for careful reasoning tolerate slower answers
+HEAVY_SLO_MULTIPLIER = 4.0
+
+DEEP_REASONING_CUES = re.compile(
+    r"\b(think (hard|harder|deeply|carefully|step[- ]by[- ]step|it through)"
+    r"|reason (carefully|step[- ]by[- ]step)|deep dive|ultrathink)\b",
+    re.IGNORECASE,
+)
+FAST_CUES = re.compile(
+    r"\b(quick(ly)?|brief(ly)?|tl;?dr|one[- ]liner|short answer)\b", re.IGNORECASE
+)
+
+# Candidates per request class: (provider, model, reasoning effort, baseline latency in seconds)
+ROUTING_TABLE: Dict[str, List[Tuple[str, str, Optional[str], float]]] = {
+    "light": [
+        ("openai", "gpt-4.1-nano", None, 2.0),
+        ("anthropic", "claude-3-haiku-20240307", None, 2.5),
+        ("openai", "gpt-4.1-mini", None, 3.0),
+        ("vertexai", "gemini-1.5-flash-002", None, 3.0),
+        ("openai", "gpt-5.2", "low", 6.0),
+    ],
+    "standard": [
+        ("openai", "gpt-4.1-mini", None, 5.0),
+        ("vertexai", "gemini-1.5-flash-002", None, 5.0),
+        ("openai", "gpt-4.1", None, 8.0),
+        ("openai", "gpt-5.2", "low", 10.0),
+        ("anthropic", "claude-3-5-sonnet-20240620", None, 10.0),
+    ],
+    "heavy": [
+        ("openai", "o4-mini", "medium", 25.0),
+        ("openai", "gpt-5.2", "medium", 30.0),
+        ("openai", "gpt-5.2", "high", 60.0),
+    ],
+}
+
+# Token thresholds (estimated as characters / 4) separating the request classes
+LIGHT_MAX_TOKENS = 500
+HEAVY_MIN_TOKENS = 20000
+
+_LATENCY_SMOOTHING = 0.2
+
+
+class Route(TypedDict):
+    provider: str
+    model: str
+    reasoning_effort: Optional[str]
+    reason: str
+
+
+class _LatencyTracker:
+    def __init__(self):
+        self._averages: Dict[Tuple[str, Optional[str]], float] = {}
+        self._lock = threading.Lock()
+        self._seeded = False
+
+    def observe(self, model: str, effort: Optional[str], wall_time: float):
+        with self._lock:
+            for key in ((model, effort), (model, None)):
+                previous = self._averages.get(key)
+                self._averages[key] = (
+                    wall_time
+                    if previous is None
+                    else previous + _LATENCY_SMOOTHING * (wall_time - previous)
+                )
+
+    def expected(self, model: str, effort: Optional[str], baseline: float) -> float:
+        self._seed()
+        with self._lock:
+            return self._averages.get(
+                (model, effort), self._averages.get((model, None), baseline)
+            )
+
+    def _seed(self):
+        if self._seeded:
+            return
+        self._seeded = True
+        try:
+            for row in get_usage_store().rollup("model"):
+                self._averages.setdefault((row["key"], None), row["avg_wall_time"])
+        except Exception as e:
+            logger.warning(f"[model_router] Could not seed latencies: {e}")
+
+
+latency_tracker = _LatencyTracker()
+
+
+def classify_request(prompt: str, context: Optional[List], listener: str) -> str:
+    """Classify a request as `light`, `standard` or `heavy` using local signals only."""
+    prompt_tokens = len(prompt) // 4
+    context_tokens = (
+        sum(len(message.get("text") or "") for message in context or []) // 4
+    )
+
+    if DEEP_REASONING_CUES.search(prompt):
+        return "heavy"
+    if prompt_tokens + context_tokens >= HEAVY_MIN_TOKENS:
+        return "heavy"
+    if FAST_CUES.search(prompt) or (
+        prompt_tokens + context_tokens <= LIGHT_MAX_TOKENS
+        and listener in ("ask_command", "app_messaged", "app_mentioned")
+    ):
+        return "light"
+    return "standard"
+
+
+def _price(model: str) -> float:
+    input_price, _, output_price = MODEL_PRICING.get(model, (0.0, 0.0, 0.0))
+    return input_price + output_price
+
+
+def _auto_route(
+    prompt: str, context: Optional[List], listener: str, available_models: dict
+) -> Route:
+    request_class = classify_request(prompt, context, listener)
+    slo = LATENCY_SLO_SECONDS.get(listener, DEFAULT_LATENCY_SLO_SECONDS)
+    if request_class == "heavy":
+        slo *= HEAVY_SLO_MULTIPLIER
+
+    candidates = [
+        (provider, model, effort, latency_tracker.expected(model, effort, baseline))
+        for provider, model, effort, baseline in ROUTING_TABLE[request_class]
+        if model in available_models
+    ]
+    if not candidates:
+        return Route(
+            provider=DEFAULT_PROVIDER,
+            model=DEFAULT_MODEL,
+            reasoning_effort=None,
+            reason=f"auto: no {request_class} candidate available",
+        )
+
+    within_slo = [candidate for candidate in candidates if candidate[3] <= slo]
+    if within_slo:
+        provider, model, effort, expected = min(
+            within_slo, key=lambda candidate: _price(candidate[1])
+        )
+    else:
+        provider, model, effort, expected = min(
+            candidates, key=lambda candidate: candidate[3]
+        )
+    return Route(
+        provider=provider,
+        model=model,
+        reasoning_effort=effort,
+        reason=f"auto: {request_class} request, expected {expected:.1f}s (SLO {slo:.0f}s)",
+    )
+
+
+def route_request(
+    user_id: str,
+    prompt: str,
+    context: Optional[List],
+    listener: str,
+    available_models: dict,
+) -> Route:
+    user_state = get_user_state(user_id, True)
+    if user_state and user_state[0] == AUTO_PROVIDER:
+        return _auto_route(prompt, context, listener, available_models)
+
+    effort = "high" if DEEP_REASONING_CUES.search(prompt) else None
+    if user_state and user_state[1] in available_models:
+        provider, model = user_state
+        return Route(
+            provider=provider,
+            model=model,
+            reasoning_effort=effort,
+            reason="user selection",
+        )
+
+    if user_state:
+        logger.warning(
+            f"[model_router] Selected model {user_state[1]} is unavailable for user {user_id}"
+        )
+    return Route(
+        provider=DEFAULT_PROVIDER,
+        model=DEFAULT_MODEL,
+        reasoning_effort=effort,
+        reason="default",
+    )
+
+
+def record_latency(route: Route, wall_time: float):
+    latency_tracker.observe(route["model"], route["reasoning_effort"], wall_time)
@@ -0,0 +1,220 @@
+# Adaptive degradation under overload. With `OVERLOAD_CONTROL=true`, the controller watches how long requests
+# wait for an LLM listener thread, and how long provider calls take relative to their listener's latency SLO,
+# over the last `OVERLOAD_WINDOW_SECONDS`. The pressure is the larger of the two 90th percentiles relative to
+# its limit (`OVERLOAD_QUEUE_WAIT_SECONDS`, and the SLO). While it is at or above 1, the controller steps up
+# one degradation level every `OVERLOAD_STEP_SECONDS`; once it falls below `OVERLOAD_RECOVERY_PRESSURE`,
+# it steps back down one level every `OVERLOAD_RECOVERY_SECONDS`. Levels add up:
+# 1. the context sent to the model is cut to its `OVERLOAD_CONTEXT_MESSAGES` most recent messages,
+# 2. the web search tool is turned off,
+# 3. requests are routed to `OVERLOAD_FAST_MODEL` instead of the user's model,
+# 4. the output is capped at `OVERLOAD_MAX_OUTPUT_TOKENS`,
+# 5. low-priority listeners (`OVERLOAD_SHED_LISTENERS`, workflow runs by default) are turned away right away.
+# Every level change is logged and exported as the `overload_level` gauge.
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, List, Optional, Tuple, TypedDict
+
+from observability.metrics import increment, set_gauge
+
+from .model_router import DEFAULT_LATENCY_SLO_SECONDS, LATENCY_SLO_SECONDS, Route
+
+logger = logging.getLogger(__name__)
+
+OVERLOAD_CONTROL = os.environ.get("OVERLOAD_CONTROL", "").lower() in ("1", "true")
+OVERLOAD_WINDOW_SECONDS = float(os.environ.get("OVERLOAD_WINDOW_SECONDS", "60"))
+OVERLOAD_QUEUE_WAIT_SECONDS = float(os.environ.get("OVERLOAD_QUEUE_WAIT_SECONDS", "5"))
+OVERLOAD_STEP_SECONDS = float(os.environ.get("OVERLOAD_STEP_SECONDS", "10"))
+OVERLOAD_RECOVERY_SECONDS = float(os.environ.get("OVERLOAD_RECOVERY_SECONDS", "30"))
+OVERLOAD_RECOVERY_PRESSURE = float(os.environ.get("OVERLOAD_RECOVERY_PRESSURE", "0.5"))
+OVERLOAD_CONTEXT_MESSAGES = int(os.environ.get("OVERLOAD_CONTEXT_MESSAGES", "50"))
+OVERLOAD_FAST_PROVIDER = os.environ.get("OVERLOAD_FAST_PROVIDER", "openai")
+OVERLOAD_FAST_MODEL = os.environ.get("OVERLOAD_FAST_MODEL", "gpt-4.1-mini")
+OVERLOAD_MAX_OUTPUT_TOKENS = int(os.environ.get("OVERLOAD_MAX_OUTPUT_TOKENS", "1024"))
+OVERLOAD_SHED_LISTENERS = set(
+    os.environ.get("OVERLOAD_SHED_LISTENERS", "summary_function").split(",")
+)
+
+LEVELS = [
+    "normal",
+    "reduced_context",
+    "no_web_search",
+    "fast_model",
+    "short_output",
+    "shedding",
+]
+
+
+class Degradation(TypedDict):
+    level: int
+    # None keeps the full context, output limit or web search choice of the caller
+    context_messages: Optional[int]
+    web_search: bool
+    fast_model: bool
+    max_output_tokens: Optional[int]
+    shed: bool
+
+
+class _Window:
+    """Samples of the last `seconds`, for their 90th percentile."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self._samples: Deque[Tuple[float, float]] = deque()
+
+    def add(self, value: float, now: float):
+        self._samples.append((now, value))
+        self._prune(now)
+
+    def p90(self, now: float) -> float:
+        self._prune(now)
+        if not self._samples:
+            return 0.0
+        values = sorted(value for _, value in self._samples)
+        return values[min(len(values) - 1, int(len(values) * 0.9))]
+
+    def _prune(self, now: float):
+        while self._samples and self._samples[0][0] < now - self.seconds:
+            self._samples.popleft()
+
+
+class OverloadController:
+    def __init__(
+        self,
+        window_seconds: float = OVERLOAD_WINDOW_SECONDS,
+        queue_wait_seconds: float = OVERLOAD_QUEUE_WAIT_SECONDS,
+        step_seconds: float = OVERLOAD_STEP_SECONDS,
+        recovery_seconds: float = OVERLOAD_RECOVERY_SECONDS,
+        recovery_pressure: float = OVERLOAD_RECOVERY_PRESSURE,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.queue_wait_seconds = queue_wait_seconds
+        self.step_seconds = step_seconds
+        self.recovery_seconds = recovery_seconds
+        self.recovery_pressure = recovery_pressure
+        self._clock = clock
+        self._queue_waits = _Window(window_seconds)
+        # Provider wall time as a multiple of the listener's latency SLO
+        self._latencies = _Window(window_seconds)
+        self._level = 0
+        self._changed_at = clock()
+        self._lock = threading.Lock()
+
+    def record_queue_wait(self, seconds: float):
+        with self._lock:
+            self._queue_waits.add(seconds, self._clock())
+            self._evaluate()
+
+    def record_latency(self, listener: str, seconds: float):
+        slo = LATENCY_SLO_SECONDS.get(listener, DEFAULT_LATENCY_SLO_SECONDS)
+        with self._lock:
+            self._latencies.add(seconds / slo, self._clock())
+            self._evaluate()
+
+    @property
+    def level(self) -> int:
+        with self._lock:
+            self._evaluate()
+            return self._level
+
+    def degradation(self, listener: str) -> Degradation:
+        level = self.level
+        return Degradation(
+            level=level,
+            context_messages=OVERLOAD_CONTEXT_MESSAGES if level >= 1 else None,
+            web_search=level < 2,
+            fast_model=level >= 3,
+            max_output_tokens=OVERLOAD_MAX_OUTPUT_TOKENS if level >= 4 else None,
+            shed=level >= 5 and listener in OVERLOAD_SHED_LISTENERS,
+        )
+
+    def _signals(self, now: float) -> Tuple[float, float, float]:
+        queue_wait = self._queue_waits.p90(now)
+        latency_ratio = self._latencies.p90(now)
+        return (
+            max(queue_wait / self.queue_wait_seconds, latency_ratio),
+            queue_wait,
+            latency_ratio,
+        )
+
+    def _evaluate(self):
+        now = self._clock()
+        pressure, queue_wait, latency_ratio = self._signals(now)
+        elapsed = now - self._changed_at
+        level = self._level
+        if pressure >= 1 and level < len(LEVELS) - 1 and elapsed >= self.step_seconds:
+            level += 1
+        elif pressure < self.recovery_pressure and level > 0:
+            # Idle periods recover several levels at once, as nothing is recorded to re-evaluate them
+            level = max(0, level - int(elapsed // self.recovery_seconds))
+        if level == self._level:
+            return
+
+        log = logger.warning if level > self._level else logger.info
+        log(
+            f"[overload] Level {self._level} ({LEVELS[self._level]}) -> {level} ({LEVELS[level]}): "
+            f"pressure {pressure:.2f}, queue wait p90 {queue_wait:.1f}s, "
+            f"provider latency p90 {latency_ratio:.2f}x SLO"
+        )
+        increment(
+            "overload_level_changes", direction="up" if level > self._level else "down"
+        )
+        set_gauge("overload_level", level)
+        self._level = level
+        self._changed_at = now
+
+
+overload_controller = OverloadController()
+
+_NORMAL = Degradation(
+    level=0,
+    context_messages=None,
+    web_search=True,
+    fast_model=False,
+    max_output_tokens=None,
+    shed=False,
+)
+
+
+def record_queue_wait(seconds: float):
+    if OVERLOAD_CONTROL:
+        overload_controller.record_queue_wait(seconds)
+
+
+def record_provider_latency(listener: str, seconds: float):
+    if OVERLOAD_CONTROL:
+        overload_controller.record_latency(listener, seconds)
+
+
+def current_degradation(listener: str) -> Degradation:
+    if not OVERLOAD_CONTROL:
+        return _NORMAL
+    return overload_controller.degradation(listener)
+
+
+def should_shed(listener: str) -> bool:
+    """Whether to turn a request from `listener` away with a "busy, try again" message."""
+    return current_degradation(listener)["shed"]
+
+
+def degrade_route(
+    route: Route, degradation: Degradation, available_models: dict
+) -> Route:
+    """The fast model instead of the routed one from the `fast_model` level on, when it is configured."""
+    if not degradation["fast_model"] or OVERLOAD_FAST_MODEL not in available_models:
+        return route
+    return Route(
+        provider=OVERLOAD_FAST_PROVIDER,
+        model=OVERLOAD_FAST_MODEL,
+        reasoning_effort=None,
+        reason=f"overload level {degradation['level']}, instead of {route['model']}",
+    )
+
+
+def trim_context(context: Optional[List], degradation: Degradation) -> Optional[List]:
+    limit = degradation["context_messages"]
+    if not context or limit is None or len(context) <= limit:
+        return context
+    return context[-limit:]
@@ -1,10 +1,45 @@
 import logging
 import re
 from datetime import datetime
+from functools import lru_cache
 from typing import List, Optional
 
+from observability.cassette import record_provider_call
+from observability.profiler import profile_request
+from observability.tracing import CLIENT, current_span, start_span, traced
+from state_store.transcript_journal import record_transcript
+
 from ..ai_constants import DEFAULT_SYSTEM_CONTENT
+from ..cancellation import RequestCancelled, current_cancellation, raise_if_cancelled
+from ..context_tools import (
+    CALL_LIMIT_RESULT,
+    CONTEXT_TOOLS_MAX_CALLS,
+    CONTEXT_TOOLS_MAX_TOKENS,
+    ContextTools,
+)
+from ..model_router import Route, record_latency, route_request
+from ..overload import (
+    current_degradation,
+    degrade_route,
+    record_provider_latency,
+    trim_context,
+)
+from ..response_chains import (
+    RESPONSE_CHAINING,
+    get_response_chain,
+    invalidate_response_chain,
+    messages_since,
+    save_response_chain,
+)
+from ..usage import check_quota, record_usage
 from .anthropic import AnthropicAPI
+from .base_provider import (
+    BaseAPIProvider,
+    ResponseChainError,
+    ToolHistory,
+    merge_metadata,
+)
+from .local import LocalAPI
 from .openai import OpenAI_API
 from .vertexai import VertexAPI
 
@@ -38,23 +73,42 @@ def convert_markdown_to_slack(text: str) -> str:
 New AI providers must be added below.
 `get_available_providers()`
 This function retrieves available API models from different AI providers.
-It combines the available models into a single dictionary.
+It combines the available models into a single dictionary, built once per process.
 `_get_provider()`
 This function returns an instance of the appropriate API provider based on the given provider name.
+`warm_up_provider()`
+This function creates a provider's shared client and opens its connections at startup, if it is configured.
+`resolve_route()`
+This function returns the provider, model and reasoning effort the model router picks for a request.
+`build_prompt()` and `build_system_content()`
+These functions assemble the prompt from the context and add the current date to the system content,
+and are shared with the batch lane in `ai/batch`.
 `get_provider_response`()
-This function retrieves the user's selected API provider and model,
-sets the model, and generates a response.
+This function asks the model router for the user's selected API provider and model
+(or the one picked automatically when the user selected "Auto"),
+sets the model, and generates a response. Callers may pass an explicit `route`,
+e.g. to generate a fast draft, and turn off the web search tool.
+Callers answering a message in a thread pass `thread_ts` and the message's `message_ts`, so that
+providers supporting it can continue the thread's response chain (see `ai/response_chains.py`).
+Callers may also pass `tools` instead of the context, which providers supporting them call while
+generating, in a loop bounded by calls and tokens (see `ai/context_tools.py`).
+Under overload, requests are degraded by level: less context, no web search, a faster model, shorter output
+(see `ai/overload.py`). Every call is checked against the user's quota first, and its token usage is recorded
+by user, channel, model and listener type (see `ai/usage.py`). Each provider call runs in a
+tracing span carrying the model and token counts (see `observability/tracing.py`).
 Note that context is an optional parameter because some functionalities,
 such as commands, do not allow access to conversation history if the bot
 isn't in the channel where the command is run.
 """
 
 
+@lru_cache(maxsize=1)
 def get_available_providers():
     return {
         **AnthropicAPI().get_models(),
         **OpenAI_API().get_models(),
         **VertexAPI().get_models(),
+        **LocalAPI().get_models(),
     }
 
 
@@ -65,15 +119,144 @@ def _get_provider(provider_name: str):
         return OpenAI_API()
     elif provider_name.lower() == "vertexai":
         return VertexAPI()
+    elif provider_name.lower() == "local":
+        return LocalAPI()
     else:
         raise ValueError(f"Unknown provider: {provider_name}")
 
 
+def warm_up_provider(provider_name: str):
+    _get_provider(provider_name).warm_up()
+
+
+def resolve_route(
+    user_id: str, prompt: str, context: Optional[List] = [], listener: str = "unknown"
+) -> Route:
+    return route_request(user_id, prompt, context, listener, get_available_providers())
+
+
+def build_prompt(prompt: str, context: Optional[List] = []) -> str:
+    formatted_context = "\n".join([f"{msg['user']}: {msg['text']}" for msg in context])
+    return f"Prompt: {prompt}\nContext: {formatted_context}"
+
+
+def build_system_content(system_content: str = DEFAULT_SYSTEM_CONTENT) -> str:
+    # Add current date to system prompt
+    current_date = datetime.now().strftime("%A, %B %d, %Y")
+    return f"{system_content}\n\nCurrent date: {current_date}"
+
+
+def _generate(
+    provider: BaseAPIProvider,
+    provider_name: str,
+    prompt: str,
+    system_content: str,
+    chained: bool = False,
+):
+    raise_if_cancelled()
+    with start_span(
+        "provider.generate_response",
+        {
+            "llm.provider": provider_name,
+            "llm.model": provider.current_model,
+            "llm.reasoning_effort": provider.reasoning_effort,
+            "llm.chained": chained,
+            "llm.prompt_chars": len(prompt),
+        },
+        kind=CLIENT,
+    ) as span:
+        response, metadata = provider.generate_response(prompt, system_content)
+        span.set_attributes(
+            {
+                "llm.input_tokens": metadata["input_tokens"],
+                "llm.output_tokens": metadata["output_tokens"],
+                "llm.cached_tokens": metadata["cached_tokens"],
+                "llm.reasoning_tokens": metadata["reasoning_tokens"],
+                "llm.response_chars": len(response),
+            }
+        )
+        record_provider_call(provider_name, provider.current_model, response, metadata)
+        return response, metadata
+
+
+def _generate_with_tools(
+    provider: BaseAPIProvider,
+    provider_name: str,
+    prompt: str,
+    system_content: str,
+    tools: ContextTools,
+):
+    """Run the tool-call loop until the model answers, cutting the tools off once a limit is reached."""
+    history: ToolHistory = []
+    turns = []
+    calls = 0
+    while True:
+        raise_if_cancelled()
+        tokens = sum(turn["input_tokens"] + turn["output_tokens"] for turn in turns)
+        allow_tools = (
+            calls < CONTEXT_TOOLS_MAX_CALLS and tokens < CONTEXT_TOOLS_MAX_TOKENS
+        )
+        with start_span(
+            "provider.generate_tool_turn",
+            {
+                "llm.provider": provider_name,
+                "llm.model": provider.current_model,
+                "llm.turn": len(history) + 1,
+                "llm.allow_tools": allow_tools,
+            },
+            kind=CLIENT,
+        ) as span:
+            turn = provider.generate_tool_turn(
+                prompt, system_content, tools.specs, history, allow_tools
+            )
+            span.set_attributes(
+                {
+                    "llm.input_tokens": turn["metadata"]["input_tokens"],
+                    "llm.output_tokens": turn["metadata"]["output_tokens"],
+                    "llm.tool_calls": len(turn["tool_calls"]),
+                }
+            )
+        turns.append(turn["metadata"])
+        if not turn["tool_calls"] or not allow_tools:
+            break
+
+        results = []
+        for call in turn["tool_calls"]:
+            if calls >= CONTEXT_TOOLS_MAX_CALLS:
+                results.append(CALL_LIMIT_RESULT)
+                continue
+            calls += 1
+            logger.info(
+                f"[get_provider_response] Tool call {calls}: {call['name']}({call['arguments']})"
+            )
+            results.append(tools.run(call))
+        history.append((turn, results))
+
+    metadata = merge_metadata(turns)
+    current_span().set_attributes(
+        {"llm.tool_turns": len(turns), "llm.tool_calls": calls}
+    )
+    logger.info(
+        f"[get_provider_response] Answered after {calls} tool calls in {len(turns)} turns"
+    )
+    record_provider_call(provider_name, provider.current_model, turn["text"], metadata)
+    return turn["text"], metadata
+
+
+@traced("get_provider_response")
+@profile_request("get_provider_response")
 def get_provider_response(
     user_id: str,
     prompt: str,
     context: Optional[List] = [],
     system_content=DEFAULT_SYSTEM_CONTENT,
+    channel_id: Optional[str] = None,
+    listener: str = "unknown",
+    route: Optional[Route] = None,
+    web_search: bool = True,
+    thread_ts: Optional[str] = None,
+    message_ts: Optional[str] = None,
+    tools: Optional[ContextTools] = None,
 ):
     logger.info(f"[get_provider_response] Starting for user: {user_id}")
     logger.info(f"[get_provider_response] Prompt length: {len(prompt)}")
@@ -81,26 +264,42 @@ def get_provider_response(
     logger.debug(f"[get_provider_response] Prompt: {prompt[:200]}...")
 
     try:
-        formatted_context = "\n".join(
-            [f"{msg['user']}: {msg['text']}" for msg in context]
-        )
-        full_prompt = f"Prompt: {prompt}\nContext: {formatted_context}"
+        check_quota(user_id)
+
+        degradation = current_degradation(listener)
+        if degradation["level"]:
+            context = trim_context(context, degradation)
+            logger.info(
+                f"[get_provider_response] Degraded at overload level {degradation['level']}, "
+                f"{len(context or [])} context items"
+            )
 
+        full_prompt = build_prompt(prompt, context)
         logger.info(f"[get_provider_response] Full prompt length: {len(full_prompt)}")
-        logger.debug(
-            f"[get_provider_response] Formatted context: {formatted_context[:200]}..."
-        )
+        logger.debug(f"[get_provider_response] Full prompt: {full_prompt[:200]}...")
 
-        # Add current date to system prompt
-        current_date = datetime.now().strftime("%A, %B %d, %Y")
-        system_content_with_date = f"{system_content}\n\nCurrent date: {current_date}"
-        logger.info(f"[get_provider_response] Current date: {current_date}")
+        system_content_with_date = build_system_content(system_content)
 
-        # Use GPT-5 for all users
-        provider_name = "openai"
-        model_name = "gpt-5.2"
+        if route is None:
+            route = degrade_route(
+                resolve_route(user_id, prompt, context, listener),
+                degradation,
+                get_available_providers(),
+            )
+        provider_name = route["provider"]
+        model_name = route["model"]
         logger.info(
-            f"[get_provider_response] Using model: {model_name} from provider: {provider_name} for user: {user_id}"
+            f"[get_provider_response] Using model: {model_name} from provider: {provider_name} for user: {user_id} ({route['reason']})"
+        )
+        current_span().set_attributes(
+            {
+                "bolty.listener": listener,
+                "llm.provider": provider_name,
+                "llm.model": model_name,
+                "llm.route_reason": route["reason"],
+                "llm.context_messages": len(context or []),
+                "bolty.overload_level": degradation["level"],
+            }
         )
 
         logger.info(f"[get_provider_response] Initializing provider: {provider_name}")
@@ -108,9 +307,96 @@ def get_provider_response(
 
         logger.info(f"[get_provider_response] Setting model: {model_name}")
         provider.set_model(model_name)
+        provider.set_reasoning_effort(route["reasoning_effort"])
+        provider.set_web_search(web_search and degradation["web_search"])
+        provider.set_max_output_tokens(degradation["max_output_tokens"])
+
+        if tools is not None and not provider.supports_tools:
+            logger.info(
+                f"[get_provider_response] {provider_name} cannot call tools, fetching the context up front"
+            )
+            context = trim_context(tools.prefetch() + (context or []), degradation)
+            full_prompt = build_prompt(prompt, context)
+            tools = None
 
-        logger.info(f"[get_provider_response] Calling provider.generate_response()...")
-        response = provider.generate_response(full_prompt, system_content_with_date)
+        chaining = (
+            tools is None
+            and RESPONSE_CHAINING
+            and provider.supports_response_chaining
+            and channel_id
+            and thread_ts
+            and message_ts
+        )
+        chain = (
+            get_response_chain(channel_id, thread_ts, provider_name, model_name)
+            if chaining
+            else None
+        )
+
+        response = None
+        sent_prompt = full_prompt
+        if chain:
+            new_messages = messages_since(context, chain)
+            logger.info(
+                f"[get_provider_response] Continuing response chain with {len(new_messages)} new messages"
+            )
+            provider.set_previous_response_id(chain["response_id"])
+            try:
+                sent_prompt = build_prompt(prompt, new_messages)
+                response, metadata = _generate(
+                    provider,
+                    provider_name,
+                    sent_prompt,
+                    system_content_with_date,
+                    chained=True,
+                )
+            except ResponseChainError:
+                logger.warning(
+                    f"[get_provider_response] Response chain broken, falling back to full context"
+                )
+                invalidate_response_chain(channel_id, thread_ts)
+                provider.set_previous_response_id(None)
+                sent_prompt = full_prompt
+
+        if response is None and tools is not None:
+            logger.info(f"[get_provider_response] Running the tool-call loop...")
+            response, metadata = _generate_with_tools(
+                provider, provider_name, full_prompt, system_content_with_date, tools
+            )
+        elif response is None:
+            logger.info(
+                f"[get_provider_response] Calling provider.generate_response()..."
+            )
+            response, metadata = _generate(
+                provider, provider_name, full_prompt, system_content_with_date
+            )
+        cancellation = current_cancellation()
+        if cancellation is not None and cancellation.cancelled:
+            # Providers that cannot be interrupted return anyway, having spent the tokens
+            record_usage(user_id, channel_id, listener, metadata)
+            cancellation.raise_if_cancelled()
+        if chaining and metadata["response_id"]:
+            save_response_chain(
+                channel_id,
+                thread_ts,
+                provider_name,
+                model_name,
+                metadata["response_id"],
+                message_ts,
+            )
+        record_usage(user_id, channel_id, listener, metadata)
+        record_transcript(
+            user_id,
+            channel_id,
+            thread_ts,
+            listener,
+            sent_prompt,
+            system_content_with_date,
+            response,
+            metadata,
+        )
+        record_latency(route, metadata["wall_time"])
+        record_provider_latency(listener, metadata["wall_time"])
 
         logger.info(
             f"[get_provider_response] Response received! Length: {len(response)}"
@@ -122,6 +408,9 @@ def get_provider_response(
         logger.info(f"[get_provider_response] Converted to Slack formatting")
 
         return response
+    except RequestCancelled as e:
+        logger.info(f"[get_provider_response] {e}")
+        raise e
     except Exception as e:
         logger.error(
             f"[get_provider_response] ERROR: {type(e).__name__}: {str(e)}",
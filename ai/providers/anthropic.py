@@ -1,13 +1,26 @@
-from .base_provider import BaseAPIProvider
+from ..context_tools import ToolCall, ToolSpec
+from ..deadlines import PROVIDER_TIMEOUT_SECONDS, stage_timeout
+from .base_provider import BaseAPIProvider, ResponseMetadata, ToolHistory, ToolTurn, build_metadata
+from functools import lru_cache
+from typing import List, Optional, Tuple
 import anthropic
 import os
 import logging
+import time
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=None)
+def _shared_client(api_key: Optional[str]) -> anthropic.Anthropic:
+    # One client per key, so requests reuse its pool of keep-alive connections
+    return anthropic.Anthropic(api_key=api_key)
+
+
 class AnthropicAPI(BaseAPIProvider):
+    supports_tools = True
+
     MODELS = {
         "claude-3-5-sonnet-20240620": {
             "name": "Claude 3.5 Sonnet",
@@ -45,28 +58,47 @@ class AnthropicAPI(BaseAPIProvider):
         else:
             return {}
 
-    def generate_response(self, prompt: str, system_content: str) -> str:
+    def warm_up(self):
+        if self.api_key is not None:
+            _shared_client(self.api_key).models.list(limit=1)
+
+    def _metadata(self, response, wall_time: float) -> ResponseMetadata:
+        # Anthropic reports cache reads and writes separately from the uncached input tokens
+        usage = response.usage
+        cached_tokens = usage.cache_read_input_tokens or 0
+        return build_metadata(
+            "anthropic",
+            self.current_model,
+            wall_time,
+            input_tokens=usage.input_tokens + cached_tokens + (usage.cache_creation_input_tokens or 0),
+            output_tokens=usage.output_tokens,
+            cached_tokens=cached_tokens,
+        )
+
+    def generate_response(self, prompt: str, system_content: str) -> Tuple[str, ResponseMetadata]:
         logger.info(f"[Anthropic] Generating response with model: {self.current_model}")
         logger.info(f"[Anthropic] API key present: {bool(self.api_key)}")
         logger.info(f"[Anthropic] Prompt length: {len(prompt)}")
         logger.info(f"[Anthropic] System content length: {len(system_content)}")
         
         try:
-            logger.info(f"[Anthropic] Initializing Anthropic client...")
-            self.client = anthropic.Anthropic(api_key=self.api_key)
+            self.client = _shared_client(self.api_key)
             
             logger.info(f"[Anthropic] Making API request to {self.current_model}...")
             logger.debug(f"[Anthropic] System content: {system_content[:200]}...")
             logger.debug(f"[Anthropic] Prompt: {prompt[:200]}...")
             
+            start = time.perf_counter()
             response = self.client.messages.create(
                 model=self.current_model,
                 system=system_content,
                 messages=[
                     {"role": "user", "content": [{"type": "text", "text": prompt}]}
                 ],
-                max_tokens=self.MODELS[self.current_model]["max_tokens"],
+                max_tokens=self.output_token_limit(self.MODELS[self.current_model]["max_tokens"]),
+                timeout=stage_timeout("provider", PROVIDER_TIMEOUT_SECONDS),
             )
+            wall_time = time.perf_counter() - start
             
             logger.info(f"[Anthropic] API request successful!")
             logger.info(f"[Anthropic] Response type: {type(response)}")
@@ -75,8 +107,11 @@ class AnthropicAPI(BaseAPIProvider):
             result = response.content[0].text
             logger.info(f"[Anthropic] Output text length: {len(result)}")
             logger.debug(f"[Anthropic] Output text preview: {result[:200]}...")
-            
-            return result
+
+            metadata = self._metadata(response, wall_time)
+            logger.info(f"[Anthropic] Usage: {metadata}")
+
+            return result, metadata
         except anthropic.APIConnectionError as e:
             logger.error(f"[Anthropic] Server could not be reached: {e.__cause__}", exc_info=True)
             raise e
@@ -94,3 +129,55 @@ class AnthropicAPI(BaseAPIProvider):
         except Exception as e:
             logger.error(f"[Anthropic] Unexpected error: {type(e).__name__}: {str(e)}", exc_info=True)
             raise e
+
+    def generate_tool_turn(
+        self, prompt: str, system_content: str, tools: List[ToolSpec], history: ToolHistory, allow_tools: bool = True
+    ) -> ToolTurn:
+        logger.info(f"[Anthropic] Generating tool turn {len(history) + 1} with model: {self.current_model}")
+        self.client = _shared_client(self.api_key)
+
+        messages = [{"role": "user", "content": [{"type": "text", "text": prompt}]}]
+        for turn, results in history:
+            messages.append({"role": "assistant", "content": turn["output"]})
+            messages.append(
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "tool_result", "tool_use_id": call["id"], "content": result}
+                        for call, result in zip(turn["tool_calls"], results)
+                    ],
+                }
+            )
+
+        try:
+            start = time.perf_counter()
+            response = self.client.messages.create(
+                model=self.current_model,
+                system=system_content,
+                messages=messages,
+                tools=[
+                    {"name": spec["name"], "description": spec["description"], "input_schema": spec["parameters"]}
+                    for spec in tools
+                ],
+                tool_choice={"type": "auto" if allow_tools else "none"},
+                max_tokens=self.output_token_limit(self.MODELS[self.current_model]["max_tokens"]),
+                timeout=stage_timeout("provider", PROVIDER_TIMEOUT_SECONDS),
+            )
+            wall_time = time.perf_counter() - start
+        except Exception as e:
+            logger.error(f"[Anthropic] Tool turn failed: {type(e).__name__}: {str(e)}", exc_info=True)
+            raise e
+
+        text = "".join(block.text for block in response.content if block.type == "text")
+        tool_calls = [
+            ToolCall(id=block.id, name=block.name, arguments=block.input)
+            for block in response.content
+            if block.type == "tool_use"
+        ]
+        logger.info(f"[Anthropic] Tool turn returned {len(tool_calls)} tool calls, {len(text)} characters")
+        return ToolTurn(
+            text=text,
+            tool_calls=tool_calls,
+            metadata=self._metadata(response, wall_time),
+            output=response.content,
+        )
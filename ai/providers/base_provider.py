@@ -1,12 +1,128 @@
 # A base class for API providers, defining the interface and common properties for subclasses.
+from typing import Any, List, Optional, Tuple, TypedDict
+
+from ..context_tools import ToolCall, ToolSpec
+
+
+# Usage metadata returned alongside the generated text by `generate_response`.
+class ResponseMetadata(TypedDict):
+    provider: str
+    model: str
+    input_tokens: int
+    output_tokens: int
+    cached_tokens: int
+    reasoning_tokens: int
+    wall_time: float
+    # Provider-side id of the response, for providers that can continue from it
+    response_id: Optional[str]
+
+
+# Raised when a provider rejects the previous response id a request was chained onto.
+class ResponseChainError(Exception):
+    pass
+
+
+def build_metadata(
+    provider: str,
+    model: str,
+    wall_time: float,
+    input_tokens: Optional[int] = 0,
+    output_tokens: Optional[int] = 0,
+    cached_tokens: Optional[int] = 0,
+    reasoning_tokens: Optional[int] = 0,
+    response_id: Optional[str] = None,
+) -> ResponseMetadata:
+    return ResponseMetadata(
+        provider=provider,
+        model=model,
+        input_tokens=input_tokens or 0,
+        output_tokens=output_tokens or 0,
+        cached_tokens=cached_tokens or 0,
+        reasoning_tokens=reasoning_tokens or 0,
+        wall_time=wall_time,
+        response_id=response_id,
+    )
+
+
+def merge_metadata(turns: List[ResponseMetadata]) -> ResponseMetadata:
+    """The usage of the turns of a tool-call loop, recorded like a single response."""
+    last = turns[-1]
+    return build_metadata(
+        last["provider"],
+        last["model"],
+        sum(turn["wall_time"] for turn in turns),
+        input_tokens=sum(turn["input_tokens"] for turn in turns),
+        output_tokens=sum(turn["output_tokens"] for turn in turns),
+        cached_tokens=sum(turn["cached_tokens"] for turn in turns),
+        reasoning_tokens=sum(turn["reasoning_tokens"] for turn in turns),
+        response_id=last["response_id"],
+    )
+
+
+# One model turn of a tool-call loop, returned by `generate_tool_turn`: tool calls to run, or the final text.
+class ToolTurn(TypedDict):
+    text: str
+    tool_calls: List[ToolCall]
+    metadata: ResponseMetadata
+    # The turn's output in the provider's own format, sent back along with the results of its tool calls
+    output: Any
+
+
+# The earlier turns of a tool-call loop, each with the results of its tool calls in order
+ToolHistory = List[Tuple[ToolTurn, List[str]]]
 
 
 class BaseAPIProvider(object):
+    reasoning_effort: Optional[str] = None
+    web_search: bool = True
+    supports_response_chaining: bool = False
+    supports_tools: bool = False
+    previous_response_id: Optional[str] = None
+    max_output_tokens: Optional[int] = None
+
     def set_model(self, model_name: str):
         raise NotImplementedError("Subclass must implement set_model")
 
+    # Providers whose models do not support a reasoning effort can ignore it
+    def set_reasoning_effort(self, effort: Optional[str]):
+        self.reasoning_effort = effort
+
+    # Only used by providers that expose a web search tool
+    def set_web_search(self, enabled: bool):
+        self.web_search = enabled
+
+    # Only used by providers with `supports_response_chaining`: the prompt then holds only the new messages
+    def set_previous_response_id(self, response_id: Optional[str]):
+        self.previous_response_id = response_id
+
+    # Caps the output below the model's own limit, e.g. while the app sheds load
+    def set_max_output_tokens(self, limit: Optional[int]):
+        self.max_output_tokens = limit
+
+    def output_token_limit(self, model_limit: int) -> int:
+        if self.max_output_tokens:
+            return min(model_limit, self.max_output_tokens)
+        return model_limit
+
     def get_models(self) -> dict:
         raise NotImplementedError("Subclass must implement get_models")
 
-    def generate_response(self, prompt: str, system_content: str) -> str:
+    # Called once at startup to open connections ahead of the first request; optional for subclasses
+    def warm_up(self):
+        pass
+
+    def generate_response(
+        self, prompt: str, system_content: str
+    ) -> Tuple[str, ResponseMetadata]:
         raise NotImplementedError("Subclass must implement generate_response")
+
+    # Only used by providers with `supports_tools`: the tool-call loop itself runs in `get_provider_response`
+    def generate_tool_turn(
+        self,
+        prompt: str,
+        system_content: str,
+        tools: List[ToolSpec],
+        history: ToolHistory,
+        allow_tools: bool = True,
+    ) -> ToolTurn:
+        raise NotImplementedError("Subclass must implement generate_tool_turn")
@@ -0,0 +1,208 @@
+# A small quantized model running on the CPU, for lightweight tasks that do not need a remote round-trip,
+# such as speculative drafts (`SPECULATIVE_DRAFT_PROVIDER=local`) or thread summaries (`COMPACTION_PROVIDER=local`).
+# Set `LOCAL_MODEL_URL` to the OpenAI-compatible API of a llama.cpp server (`llama-server -m model.gguf --parallel 4`),
+# or `LOCAL_MODEL_PATH` to a GGUF file to run it in-process with the optional `llama-cpp-python` package.
+# Either way, one warm instance is shared by every request: the server client keeps its connections open,
+# and the in-process model is loaded once. Concurrent requests are batched by the server's continuous batching
+# across its `--parallel` slots, so at most `LOCAL_PARALLEL` are sent at once and the rest wait here. The
+# in-process model serves one request at a time.
+# Prompts are trimmed from the start to fit `LOCAL_CONTEXT_TOKENS`, keeping the most recent context.
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Tuple
+
+import openai
+
+from ..cancellation import CancellationToken, RequestCancelled, current_cancellation
+from ..deadlines import PROVIDER_TIMEOUT_SECONDS, stage_timeout
+from .base_provider import BaseAPIProvider, ResponseMetadata, build_metadata
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+LOCAL_MODEL_URL = os.environ.get("LOCAL_MODEL_URL", "")
+LOCAL_MODEL_PATH = os.environ.get("LOCAL_MODEL_PATH", "")
+LOCAL_MODEL = os.environ.get("LOCAL_MODEL", "local-small")
+LOCAL_MODEL_NAME = os.environ.get("LOCAL_MODEL_NAME", "Small local model")
+LOCAL_MAX_TOKENS = int(os.environ.get("LOCAL_MAX_TOKENS", "512"))
+LOCAL_CONTEXT_TOKENS = int(os.environ.get("LOCAL_CONTEXT_TOKENS", "4096"))
+LOCAL_PARALLEL = int(os.environ.get("LOCAL_PARALLEL", "4"))
+LOCAL_THREADS = int(os.environ.get("LOCAL_THREADS", str(os.cpu_count() or 4)))
+
+_slots = threading.BoundedSemaphore(LOCAL_PARALLEL)
+_model_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _server_client() -> openai.OpenAI:
+    # llama-server ignores the key unless started with --api-key
+    return openai.OpenAI(
+        base_url=f"{LOCAL_MODEL_URL.rstrip('/')}/v1",
+        api_key=os.environ.get("LOCAL_MODEL_API_KEY", "local"),
+    )
+
+
+@lru_cache(maxsize=1)
+def _in_process_model():
+    from llama_cpp import Llama
+
+    logger.info(f"[Local] Loading {LOCAL_MODEL_PATH}...")
+    return Llama(
+        model_path=LOCAL_MODEL_PATH,
+        n_ctx=LOCAL_CONTEXT_TOKENS,
+        n_threads=LOCAL_THREADS,
+        verbose=False,
+    )
+
+
+def _fit_prompt(prompt: str, system_content: str) -> str:
+    # Roughly 4 characters per token, leaving room for the system content and the response
+    budget = (LOCAL_CONTEXT_TOKENS - LOCAL_MAX_TOKENS) * 4 - len(system_content)
+    if len(prompt) <= budget:
+        return prompt
+    logger.info(f"[Local] Trimming prompt from {len(prompt)} to {budget} characters")
+    return prompt[-max(budget, 0) :]
+
+
+class LocalAPI(BaseAPIProvider):
+    LOCAL_PROVIDER = "Local"
+    MODELS = {
+        LOCAL_MODEL: {
+            "name": LOCAL_MODEL_NAME,
+            "provider": LOCAL_PROVIDER,
+            "max_tokens": LOCAL_MAX_TOKENS,
+        }
+    }
+
+    def __init__(self):
+        self.enabled = bool(LOCAL_MODEL_URL or LOCAL_MODEL_PATH)
+
+    def set_model(self, model_name: str):
+        if model_name not in self.MODELS.keys():
+            raise ValueError("Invalid model")
+        self.current_model = model_name
+
+    def get_models(self) -> dict:
+        if self.enabled:
+            return self.MODELS
+        else:
+            return {}
+
+    def warm_up(self):
+        if LOCAL_MODEL_URL:
+            _server_client().models.list()
+        elif LOCAL_MODEL_PATH:
+            # Loading maps the weights; one token pages them in
+            self._complete("Hi", "", max_tokens=1)
+
+    def _complete(self, prompt: str, system_content: str, max_tokens: int) -> dict:
+        messages = [
+            {"role": "system", "content": system_content},
+            {"role": "user", "content": prompt},
+        ]
+        if LOCAL_MODEL_URL:
+            with _slots:
+                cancellation = current_cancellation()
+                if cancellation is not None:
+                    return self._stream(messages, max_tokens, cancellation)
+                response = _server_client().chat.completions.create(
+                    model=LOCAL_MODEL,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    timeout=stage_timeout("provider", PROVIDER_TIMEOUT_SECONDS),
+                )
+            return response.model_dump()
+        # llama.cpp's in-process model holds one sequence's state at a time
+        with _model_lock:
+            return _in_process_model().create_chat_completion(
+                messages=messages, max_tokens=max_tokens
+            )
+
+    def _stream(
+        self, messages: list, max_tokens: int, cancellation: CancellationToken
+    ) -> dict:
+        """Stream the completion, so that cancelling the request closes it and frees the server's slot."""
+        stream = _server_client().chat.completions.create(
+            model=LOCAL_MODEL,
+            messages=messages,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True},
+            timeout=stage_timeout("provider", PROVIDER_TIMEOUT_SECONDS),
+        )
+        unregister = cancellation.on_cancel(stream.close)
+        content, usage = [], None
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    content.append(chunk.choices[0].delta.content)
+                if chunk.usage:
+                    usage = chunk.usage.model_dump()
+        except Exception:
+            # Closing the stream from another thread ends the read with an error
+            cancellation.raise_if_cancelled()
+            raise
+        finally:
+            unregister()
+            stream.close()
+        cancellation.raise_if_cancelled()
+        return {
+            "choices": [{"message": {"content": "".join(content)}}],
+            "usage": usage,
+        }
+
+    def generate_response(
+        self, prompt: str, system_content: str
+    ) -> Tuple[str, ResponseMetadata]:
+        logger.info(f"[Local] Generating response with model: {self.current_model}")
+        logger.info(f"[Local] Prompt length: {len(prompt)}")
+
+        try:
+            start = time.perf_counter()
+            completion = self._complete(
+                _fit_prompt(prompt, system_content),
+                system_content,
+                self.output_token_limit(LOCAL_MAX_TOKENS),
+            )
+            wall_time = time.perf_counter() - start
+
+            result = completion["choices"][0]["message"]["content"] or ""
+            logger.info(f"[Local] Output text length: {len(result)}")
+
+            usage = completion.get("usage") or {}
+            metadata = build_metadata(
+                "local",
+                self.current_model,
+                wall_time,
+                input_tokens=usage.get("prompt_tokens", 0),
+                output_tokens=usage.get("completion_tokens", 0),
+            )
+            logger.info(f"[Local] Usage: {metadata}")
+
+            return result, metadata
+        except RequestCancelled as e:
+            logger.info(f"[Local] Request cancelled: {e.reason}")
+            raise e
+        except ImportError as e:
+            logger.error(
+                "[Local] Install `llama-cpp-python` to run LOCAL_MODEL_PATH in-process",
+                exc_info=True,
+            )
+            raise e
+        except openai.APIConnectionError as e:
+            logger.error(
+                f"[Local] Server at {LOCAL_MODEL_URL} could not be reached: {e.__cause__}",
+                exc_info=True,
+            )
+            raise e
+        except Exception as e:
+            logger.error(
+                f"[Local] Unexpected error: {type(e).__name__}: {str(e)}",
+                exc_info=True,
+            )
+            raise e
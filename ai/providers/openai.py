@@ -1,9 +1,23 @@
+import json
 import logging
 import os
+import time
+from functools import lru_cache
+from typing import Any, List, Optional, Tuple
 
 import openai
 
-from .base_provider import BaseAPIProvider
+from ..cancellation import CancellationToken, RequestCancelled, current_cancellation
+from ..context_tools import ToolCall, ToolSpec
+from ..deadlines import PROVIDER_TIMEOUT_SECONDS, stage_timeout
+from .base_provider import (
+    BaseAPIProvider,
+    ResponseChainError,
+    ResponseMetadata,
+    ToolHistory,
+    ToolTurn,
+    build_metadata,
+)
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -11,7 +25,16 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=None)
+def _shared_client(api_key: Optional[str]) -> openai.OpenAI:
+    # One client per key, so requests reuse its pool of keep-alive connections
+    return openai.OpenAI(api_key=api_key)
+
+
 class OpenAI_API(BaseAPIProvider):
+    supports_response_chaining = True
+    supports_tools = True
+
     MODELS = {
         "gpt-4.1": {"name": "GPT-4.1", "provider": "OpenAI", "max_tokens": 10000},
         "gpt-4.1-mini": {
@@ -24,11 +47,17 @@ class OpenAI_API(BaseAPIProvider):
             "provider": "OpenAI",
             "max_tokens": 10000,
         },
-        "o4-mini": {"name": "o4-mini", "provider": "OpenAI", "max_tokens": 50000},
+        "o4-mini": {
+            "name": "o4-mini",
+            "provider": "OpenAI",
+            "max_tokens": 50000,
+            "reasoning": True,
+        },
         "gpt-5.2": {
             "name": "gpt-5.2",
             "provider": "OpenAI",
             "max_tokens": 200000,
+            "reasoning": True,
         },
     }
 
@@ -46,39 +75,116 @@ class OpenAI_API(BaseAPIProvider):
         else:
             return {}
 
-    def generate_response(self, prompt: str, system_content: str) -> str:
+    def warm_up(self):
+        if self.api_key is not None:
+            _shared_client(self.api_key).models.list()
+
+    def _stream(self, request_params: dict, cancellation: CancellationToken):
+        """Stream the response, so that cancelling the request closes the stream and frees its connection."""
+        stream = self.client.responses.create(**request_params, stream=True)
+        unregister = cancellation.on_cancel(stream.close)
+        try:
+            for event in stream:
+                if event.type in ("response.completed", "response.incomplete"):
+                    return event.response
+                if event.type == "response.failed":
+                    raise openai.APIError(
+                        f"Response failed: {event.response.error}",
+                        stream.response.request,
+                        body=None,
+                    )
+        except Exception:
+            # Closing the stream from another thread ends the read with an error
+            cancellation.raise_if_cancelled()
+            raise
+        finally:
+            unregister()
+            stream.close()
+        cancellation.raise_if_cancelled()
+        raise openai.APIError(
+            "Response stream ended early", stream.response.request, body=None
+        )
+
+    def _create(self, request_params: dict) -> Tuple[Any, float]:
+        request_params = {
+            **request_params,
+            "timeout": stage_timeout("provider", PROVIDER_TIMEOUT_SECONDS),
+        }
+        start = time.perf_counter()
+        cancellation = current_cancellation()
+        if cancellation is None:
+            response = self.client.responses.create(**request_params)
+        else:
+            response = self._stream(request_params, cancellation)
+        return response, time.perf_counter() - start
+
+    def _metadata(self, response, wall_time: float) -> ResponseMetadata:
+        usage = response.usage
+        return build_metadata(
+            "openai",
+            self.current_model,
+            wall_time,
+            input_tokens=getattr(usage, "input_tokens", 0),
+            output_tokens=getattr(usage, "output_tokens", 0),
+            cached_tokens=getattr(
+                getattr(usage, "input_tokens_details", None), "cached_tokens", 0
+            ),
+            reasoning_tokens=getattr(
+                getattr(usage, "output_tokens_details", None),
+                "reasoning_tokens",
+                0,
+            ),
+            response_id=response.id,
+        )
+
+    def _base_params(self, request_input: list) -> dict:
+        request_params = {
+            "model": self.current_model,
+            "input": request_input,
+            "tools": [{"type": "web_search"}] if self.web_search else [],
+            "max_output_tokens": self.output_token_limit(
+                self.MODELS[self.current_model]["max_tokens"]
+            ),
+        }
+
+        # The reasoning effort is chosen by the model router
+        if self.reasoning_effort and self.MODELS[self.current_model].get("reasoning"):
+            request_params["reasoning"] = {"effort": self.reasoning_effort}
+            logger.info(f"[OpenAI] Reasoning effort: {self.reasoning_effort}")
+        return request_params
+
+    def generate_response(
+        self, prompt: str, system_content: str
+    ) -> Tuple[str, ResponseMetadata]:
         logger.info(f"[OpenAI] Generating response with model: {self.current_model}")
         logger.info(f"[OpenAI] API key present: {bool(self.api_key)}")
         logger.info(f"[OpenAI] Prompt length: {len(prompt)}")
         logger.info(f"[OpenAI] System content length: {len(system_content)}")
 
         try:
-            logger.info(f"[OpenAI] Initializing OpenAI client...")
-            self.client = openai.OpenAI(api_key=self.api_key)
+            self.client = _shared_client(self.api_key)
 
             logger.info(
-                f"[OpenAI] Making API request to {self.current_model} with web_search tool..."
+                f"[OpenAI] Making API request to {self.current_model} (web_search: {self.web_search})..."
             )
             logger.debug(f"[OpenAI] System content: {system_content[:200]}...")
             logger.debug(f"[OpenAI] Prompt: {prompt[:200]}...")
 
-            # Check if user wants deep reasoning
-            request_params = {
-                "model": self.current_model,
-                "input": [
+            # A chained request continues from the previous response, which already holds the system content
+            if self.previous_response_id:
+                logger.info(f"[OpenAI] Continuing from {self.previous_response_id}")
+                request_input = [{"role": "user", "content": prompt}]
+            else:
+                request_input = [
                     {"role": "developer", "content": system_content},
                     {"role": "user", "content": prompt},
-                ],
-                "tools": [{"type": "web_search"}],
-                "max_output_tokens": self.MODELS[self.current_model]["max_tokens"],
-            }
+                ]
 
-            # Add high reasoning effort if "think" is in the prompt
-            if "think" in prompt.lower():
-                request_params["reasoning"] = {"effort": "high"}
-                logger.info("[OpenAI] Reasoning effort set to HIGH due to 'think' in prompt")
+            request_params = self._base_params(request_input)
+            if self.previous_response_id:
+                request_params["previous_response_id"] = self.previous_response_id
 
-            response = self.client.responses.create(**request_params)
+            response, wall_time = self._create(request_params)
 
             logger.info(f"[OpenAI] API request successful!")
             logger.info(f"[OpenAI] Response type: {type(response)}")
@@ -88,7 +194,13 @@ class OpenAI_API(BaseAPIProvider):
             logger.info(f"[OpenAI] Output text length: {len(result)}")
             logger.debug(f"[OpenAI] Output text preview: {result[:200]}...")
 
-            return result
+            metadata = self._metadata(response, wall_time)
+            logger.info(f"[OpenAI] Usage: {metadata}")
+
+            return result, metadata
+        except RequestCancelled as e:
+            logger.info(f"[OpenAI] Request cancelled: {e.reason}")
+            raise e
         except openai.APIConnectionError as e:
             logger.error(
                 f"[OpenAI] Server could not be reached: {e.__cause__}", exc_info=True
@@ -97,6 +209,13 @@ class OpenAI_API(BaseAPIProvider):
         except openai.RateLimitError as e:
             logger.error(f"[OpenAI] A 429 status code was received. {e}", exc_info=True)
             raise e
+        except (openai.NotFoundError, openai.BadRequestError) as e:
+            # The previous response expired, was deleted or cannot be continued
+            if self.previous_response_id:
+                logger.warning(f"[OpenAI] Response chain broken: {e}")
+                raise ResponseChainError(str(e)) from e
+            logger.error(f"[OpenAI] Request rejected: {e}", exc_info=True)
+            raise e
         except openai.AuthenticationError as e:
             logger.error(
                 f"[OpenAI] There's an issue with your API key. {e}", exc_info=True
@@ -114,3 +233,69 @@ class OpenAI_API(BaseAPIProvider):
                 exc_info=True,
             )
             raise e
+
+    def generate_tool_turn(
+        self,
+        prompt: str,
+        system_content: str,
+        tools: List[ToolSpec],
+        history: ToolHistory,
+        allow_tools: bool = True,
+    ) -> ToolTurn:
+        logger.info(
+            f"[OpenAI] Generating tool turn {len(history) + 1} with model: {self.current_model}"
+        )
+        self.client = _shared_client(self.api_key)
+
+        request_input = [
+            {"role": "developer", "content": system_content},
+            {"role": "user", "content": prompt},
+        ]
+        for turn, results in history:
+            # Reasoning items go back too, as the function calls refer to them
+            request_input.extend(turn["output"])
+            request_input.extend(
+                {
+                    "type": "function_call_output",
+                    "call_id": call["id"],
+                    "output": result,
+                }
+                for call, result in zip(turn["tool_calls"], results)
+            )
+
+        request_params = self._base_params(request_input)
+        request_params["tools"] = request_params["tools"] + [
+            {"type": "function", "strict": False, **spec} for spec in tools
+        ]
+        request_params["tool_choice"] = "auto" if allow_tools else "none"
+
+        try:
+            response, wall_time = self._create(request_params)
+        except RequestCancelled as e:
+            logger.info(f"[OpenAI] Request cancelled: {e.reason}")
+            raise e
+        except Exception as e:
+            logger.error(
+                f"[OpenAI] Tool turn failed: {type(e).__name__}: {str(e)}",
+                exc_info=True,
+            )
+            raise e
+
+        tool_calls = [
+            ToolCall(
+                id=item.call_id,
+                name=item.name,
+                arguments=json.loads(item.arguments or "{}"),
+            )
+            for item in response.output
+            if item.type == "function_call"
+        ]
+        logger.info(
+            f"[OpenAI] Tool turn returned {len(tool_calls)} tool calls, {len(response.output_text)} characters"
+        )
+        return ToolTurn(
+            text=response.output_text,
+            tool_calls=tool_calls,
+            metadata=self._metadata(response, wall_time),
+            output=response.output,
+        )
@@ -1,10 +1,13 @@
 import logging
 import os
+import time
+from typing import Tuple
 
 import google.api_core.exceptions
 import vertexai.generative_models
 
-from .base_provider import BaseAPIProvider
+from ..deadlines import stage_timeout
+from .base_provider import BaseAPIProvider, ResponseMetadata, build_metadata
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -88,7 +91,7 @@ class VertexAPI(BaseAPIProvider):
         else:
             return {}
 
-    def generate_response(self, prompt: str, system_content: str) -> str:
+    def generate_response(self, prompt: str, system_content: str) -> Tuple[str, ResponseMetadata]:
         logger.info(f"[VertexAI] Generating response with model: {self.current_model}")
         logger.info(f"[VertexAI] Enabled: {self.enabled}")
         logger.info(f"[VertexAI] Prompt length: {len(prompt)}")
@@ -107,7 +110,7 @@ class VertexAPI(BaseAPIProvider):
             self.client = vertexai.generative_models.GenerativeModel(
                 model_name=self.current_model,
                 generation_config={
-                    "max_output_tokens": self.MODELS[self.current_model]["max_tokens"],
+                    "max_output_tokens": self.output_token_limit(self.MODELS[self.current_model]["max_tokens"]),
                 },
                 system_instruction=system_instruction,
             )
@@ -115,9 +118,13 @@ class VertexAPI(BaseAPIProvider):
             logger.info(f"[VertexAI] Making API request...")
             logger.debug(f"[VertexAI] Prompt: {prompt[:200]}...")
             
+            # The Vertex AI SDK takes no per-call timeout, so the deadline is only checked before the call
+            stage_timeout("provider", None)
+            start = time.perf_counter()
             response = self.client.generate_content(
                 contents=prompt,
             )
+            wall_time = time.perf_counter() - start
             
             logger.info(f"[VertexAI] API request successful!")
             logger.info(f"[VertexAI] Response type: {type(response)}")
@@ -126,8 +133,20 @@ class VertexAPI(BaseAPIProvider):
             result = "".join(part.text for part in response.candidates[0].content.parts)
             logger.info(f"[VertexAI] Output text length: {len(result)}")
             logger.debug(f"[VertexAI] Output text preview: {result[:200]}...")
-            
-            return result
+
+            usage = response.usage_metadata
+            metadata = build_metadata(
+                "vertexai",
+                self.current_model,
+                wall_time,
+                input_tokens=usage.prompt_token_count,
+                output_tokens=usage.candidates_token_count,
+                cached_tokens=getattr(usage, "cached_content_token_count", 0),
+                reasoning_tokens=getattr(usage, "thoughts_token_count", 0),
+            )
+            logger.info(f"[VertexAI] Usage: {metadata}")
+
+            return result, metadata
 
         except google.api_core.exceptions.Unauthorized as e:
             logger.error(f"[VertexAI] Client is not Authorized. {e.reason}, {e.message}", exc_info=True)
@@ -0,0 +1,91 @@
+# Stateful threads on top of provider-side conversation state.
+# With `RESPONSE_CHAINING=true`, the last response id a provider returned in a Slack thread is stored by
+# `(channel_id, thread_ts)`. Follow-up turns with the same provider and model send only the messages
+# posted since that response and continue from it, instead of the whole thread.
+# `get_provider_response()` falls back to full context when there is no usable chain: it is older than
+# `RESPONSE_CHAIN_MAX_AGE_HOURS`, the user switched models, the provider rejects the previous response id,
+# or a message in the thread was edited or deleted.
+import logging
+import os
+import time
+from typing import List, Optional
+
+from state_store.thread_state_store import ResponseChain, get_thread_state_store
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+RESPONSE_CHAINING = os.environ.get("RESPONSE_CHAINING", "").lower() in ("1", "true")
+RESPONSE_CHAIN_MAX_AGE_HOURS = float(
+    os.environ.get("RESPONSE_CHAIN_MAX_AGE_HOURS", "24")
+)
+
+
+def get_response_chain(
+    channel_id: str, thread_ts: str, provider: str, model: str
+) -> Optional[ResponseChain]:
+    try:
+        chain = get_thread_state_store().get_response_chain(channel_id, thread_ts)
+    except Exception as e:
+        logger.error(f"[response_chains] Failed to read chain: {e}", exc_info=True)
+        return None
+    if chain is None:
+        return None
+    if chain["provider"] != provider or chain["model"] != model:
+        logger.info(f"[response_chains] Model changed in thread {thread_ts}")
+        return None
+    if time.time() - chain["updated_at"] > RESPONSE_CHAIN_MAX_AGE_HOURS * 3600:
+        logger.info(f"[response_chains] Chain of thread {thread_ts} expired")
+        invalidate_response_chain(channel_id, thread_ts)
+        return None
+    return chain
+
+
+def messages_since(context: Optional[List], chain: ResponseChain) -> List[dict]:
+    """Messages posted after the chained response's prompt, except bot replies it already holds."""
+    last_ts = float(chain["last_ts"])
+    return [
+        message
+        for message in context or []
+        if float(message.get("ts") or 0) > last_ts and not message.get("bot")
+    ]
+
+
+def save_response_chain(
+    channel_id: str,
+    thread_ts: str,
+    provider: str,
+    model: str,
+    response_id: str,
+    last_ts: str,
+):
+    try:
+        get_thread_state_store().set_response_chain(
+            channel_id, thread_ts, provider, model, response_id, last_ts
+        )
+    except Exception as e:
+        logger.error(f"[response_chains] Failed to save chain: {e}", exc_info=True)
+
+
+def invalidate_response_chain(channel_id: str, thread_ts: str):
+    try:
+        get_thread_state_store().delete_response_chain(channel_id, thread_ts)
+    except Exception as e:
+        logger.error(
+            f"[response_chains] Failed to invalidate chain: {e}", exc_info=True
+        )
+
+
+def invalidate_for_edit(event: dict):
+    """Drop the chain of the thread a `message_changed` or `message_deleted` event belongs to."""
+    if not RESPONSE_CHAINING:
+        return
+    message = event.get("message") or event.get("previous_message") or {}
+    thread_ts = message.get("thread_ts")
+    if thread_ts:
+        logger.info(
+            f"[response_chains] Message edited in thread {thread_ts}, dropping chain"
+        )
+        invalidate_response_chain(event.get("channel"), thread_ts)
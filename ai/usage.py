@@ -0,0 +1,99 @@
+# Token usage and cost accounting for provider calls.
+# `record_usage()` prices a response's usage metadata and adds it to the local `UsageStore` rollups,
+# and `check_quota()` is the per-user quota hook run by `get_provider_response()` before each call.
+# Set `USER_DAILY_TOKEN_QUOTA` to limit the input plus output tokens a user can spend in 24 hours.
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from state_store.usage_store import UsageStore
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+USER_DAILY_TOKEN_QUOTA = int(os.environ.get("USER_DAILY_TOKEN_QUOTA", "0"))
+
+# Approximate list prices in USD per million tokens: (input, cached input, output)
+MODEL_PRICING = {
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "o4-mini": (1.10, 0.275, 4.40),
+    "gpt-5.2": (1.75, 0.175, 14.00),
+    "claude-3-5-sonnet-20240620": (3.00, 0.30, 15.00),
+    "claude-3-sonnet-20240229": (3.00, 0.30, 15.00),
+    "claude-3-haiku-20240307": (0.25, 0.03, 1.25),
+    "claude-3-opus-20240229": (15.00, 1.50, 75.00),
+    "gemini-1.5-flash-001": (0.075, 0.075, 0.30),
+    "gemini-1.5-flash-002": (0.075, 0.075, 0.30),
+    "gemini-1.5-pro-001": (1.25, 1.25, 5.00),
+    "gemini-1.5-pro-002": (1.25, 1.25, 5.00),
+    "gemini-1.0-pro-001": (0.50, 0.50, 1.50),
+    "gemini-1.0-pro-002": (0.50, 0.50, 1.50),
+}
+
+
+class QuotaExceededError(Exception):
+    pass
+
+
+_usage_store: Optional[UsageStore] = None
+_usage_store_lock = threading.Lock()
+
+
+def get_usage_store() -> UsageStore:
+    global _usage_store
+    with _usage_store_lock:
+        if _usage_store is None:
+            _usage_store = UsageStore()
+        return _usage_store
+
+
+def estimate_cost(metadata: dict) -> float:
+    input_price, cached_price, output_price = MODEL_PRICING.get(
+        metadata["model"], (0.0, 0.0, 0.0)
+    )
+    uncached_tokens = metadata["input_tokens"] - metadata["cached_tokens"]
+    return (
+        uncached_tokens * input_price
+        + metadata["cached_tokens"] * cached_price
+        + metadata["output_tokens"] * output_price
+    ) / 1_000_000
+
+
+def record_usage(
+    user_id: str,
+    channel_id: Optional[str],
+    listener: str,
+    metadata: dict,
+    cost_multiplier: float = 1.0,
+):
+    # Accounting must never fail the reply it accounts for
+    try:
+        get_usage_store().record(
+            user_id=user_id,
+            channel_id=channel_id,
+            listener=listener,
+            metadata=metadata,
+            cost=estimate_cost(metadata) * cost_multiplier,
+        )
+    except Exception as e:
+        logger.error(
+            f"[usage] Failed to record usage: {type(e).__name__}: {str(e)}",
+            exc_info=True,
+        )
+
+
+def check_quota(user_id: str):
+    if USER_DAILY_TOKEN_QUOTA <= 0:
+        return
+    used = get_usage_store().user_tokens_since(user_id, time.time() - 24 * 3600)
+    if used >= USER_DAILY_TOKEN_QUOTA:
+        logger.warning(f"[usage] User {user_id} is over quota: {used} tokens")
+        raise QuotaExceededError(
+            f"You have used {used} of your {USER_DAILY_TOKEN_QUOTA} tokens for the last 24 hours. Try again later."
+        )
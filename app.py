@@ -1,10 +1,27 @@
 import os
 import logging
+from threading import Event
 
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
 
+from ai.batch import SUMMARY_BATCH_MODE, get_batch_queue
+from ai.channel_index import vectorize
+from ai.providers import get_available_providers, warm_up_provider
+from ai.usage import get_usage_store
 from listeners import register_listeners
+from listeners.listener_utils.bulkheads import fast_bulkhead
+from listeners.listener_utils.installation_clients import set_app
+from listeners.listener_utils.job_workers import DURABLE_JOB_QUEUE, start_job_workers
+from listeners.listener_utils.slack_transport import (
+    SLACK_HTTP_TIMEOUT,
+    get_slack_transport,
+)
+from observability.cassette import RecordingWebClient
+from observability.health import run_check, set_ready, start_health_server
+from observability.profiler import install_signal_handler
+from state_store.shared_backend import CLUSTER_MODE, get_shared_backend
+from state_store.thread_state_store import get_thread_state_store
 
 # Initialization
 logging.basicConfig(
@@ -18,15 +35,60 @@ logger.info(f"SLACK_BOT_TOKEN present: {bool(os.environ.get('SLACK_BOT_TOKEN'))}
 logger.info(f"SLACK_APP_TOKEN present: {bool(os.environ.get('SLACK_APP_TOKEN'))}")
 logger.info(f"OPENAI_API_KEY present: {bool(os.environ.get('OPENAI_API_KEY'))}")
 
-app = App(token=os.environ.get("SLACK_BOT_TOKEN"))
+# The traced client lets listener spans join their event's trace, and also records the Slack calls
+# of background jobs while RECORD_CASSETTE is set. Listeners start on the fast bulkhead, and
+# LLM-backed ones continue on their own (see listeners/listener_utils/bulkheads.py).
+# Its calls, and those of every event's client, share a keep-alive connection pool with SLACK_HTTP_POOL
+app = App(
+    client=RecordingWebClient(
+        token=os.environ.get("SLACK_BOT_TOKEN"),
+        timeout=SLACK_HTTP_TIMEOUT,
+        transport=get_slack_transport(),
+    ),
+    listener_executor=fast_bulkhead,
+)
 
 # Register Listeners
 logger.info("Registering listeners...")
 register_listeners(app)
+set_app(app)
 logger.info("Listeners registered successfully!")
 
+
+def warm_up():
+    """Do the work the first requests after a deploy would otherwise pay for, before taking traffic."""
+    run_check("slack.auth_test", app.client.auth_test)
+    run_check("model_catalog", get_available_providers)
+    for provider_name in ("openai", "anthropic", "vertexai", "local"):
+        run_check(f"provider.{provider_name}", lambda: warm_up_provider(provider_name))
+    if CLUSTER_MODE:
+        run_check("state.shared_backend", lambda: get_shared_backend().ping())
+    run_check("state.thread_state", get_thread_state_store)
+    run_check("state.usage", get_usage_store)
+    run_check("channel_index", lambda: vectorize("warm up"))
+
+
 # Start Bolt app
 if __name__ == "__main__":
+    # `kill -USR1 <pid>` profiles every request for PROFILING_WINDOW_SECONDS
+    install_signal_handler()
+    # /livez answers right away, /readyz once warm and connected
+    start_health_server()
+
+    logger.info("Warming up...")
+    warm_up()
+
+    if DURABLE_JOB_QUEUE:
+        logger.info("Starting job workers...")
+        start_job_workers()
+
+    if SUMMARY_BATCH_MODE:
+        logger.info("Resuming batches...")
+        get_batch_queue().resume()
+
     logger.info("Starting Socket Mode Handler...")
-    SocketModeHandler(app, os.environ.get("SLACK_APP_TOKEN")).start()
+    handler = SocketModeHandler(app, os.environ.get("SLACK_APP_TOKEN"))
+    handler.connect()
+    set_ready()
     logger.info("Bot is now running!")
+    Event().wait()
@@ -7,7 +7,16 @@ from slack_bolt.oauth.oauth_settings import OAuthSettings
 from slack_sdk.oauth.installation_store import FileInstallationStore
 from slack_sdk.oauth.state_store import FileOAuthStateStore
 
+from ai.batch import SUMMARY_BATCH_MODE, get_batch_queue
 from listeners import register_listeners
+from listeners.listener_utils.bulkheads import fast_bulkhead
+from listeners.listener_utils.installation_clients import set_app
+from listeners.listener_utils.job_workers import DURABLE_JOB_QUEUE, start_job_workers
+from listeners.listener_utils.slack_transport import (
+    SLACK_HTTP_TIMEOUT,
+    get_slack_transport,
+)
+from observability.tracing import TracedWebClient
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -26,8 +35,10 @@ def failure(args: FailureArgs) -> BoltResponse:
 
 
 # Initialization
+# Each installation's client is built from this one, sharing its keep-alive connection pool with SLACK_HTTP_POOL
 app = App(
     signing_secret=os.environ.get("SLACK_SIGNING_SECRET"),
+    client=TracedWebClient(timeout=SLACK_HTTP_TIMEOUT, transport=get_slack_transport()),
     installation_store=FileInstallationStore(),
     oauth_settings=OAuthSettings(
         client_id=os.environ.get("SLACK_CLIENT_ID"),
@@ -40,11 +51,18 @@ app = App(
         state_store=FileOAuthStateStore(expiration_seconds=600),
         callback_options=CallbackOptions(success=success, failure=failure),
     ),
+    listener_executor=fast_bulkhead,
 )
 
 # Register Listeners
 register_listeners(app)
+set_app(app)
 
 # Start Bolt app
 if __name__ == "__main__":
+    # Jobs run with the client of the installation they answer
+    if DURABLE_JOB_QUEUE:
+        start_job_workers()
+    if SUMMARY_BATCH_MODE:
+        get_batch_queue().resume()
     app.start(3000)
@@ -0,0 +1,125 @@
+# Compares the latency of the local CPU model against the remote providers on the lightweight tasks
+# it is meant for: intent classification, short acknowledgements, routing decisions and title generation.
+# Each task runs `--runs` times per model, `--concurrency` at a time, against every model in `--models`
+# that is configured; the first call per model is a warm-up and not counted.
+#
+# Run with `python -m benchmarks.provider_latency [--models local-small gpt-4.1-nano] [--runs 10] [--json out.json]`.
+import argparse
+import json
+import logging
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from ai.providers import _get_provider, get_available_providers
+
+logging.basicConfig(
+    level=logging.WARNING, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODELS = [
+    "local-small",
+    "gpt-4.1-nano",
+    "gpt-4.1-mini",
+    "claude-3-haiku-20240307",
+    "gemini-1.5-flash-002",
+]
+
+TASKS = {
+    "intent": (
+        "Classify the user's message as one of: question, request, feedback, chitchat. "
+        "Answer with the label only.",
+        "Can you pull last week's deploy failures into a table for me?",
+    ),
+    "acknowledgement": (
+        "You are a Slack assistant. Reply with one short, friendly sentence acknowledging the message.",
+        "Thanks, that fixed it!",
+    ),
+    "routing": (
+        "Decide whether answering this request needs a large model. Answer with light or heavy only.",
+        "Compare the trade-offs of event sourcing and CRUD for our billing service, step by step.",
+    ),
+    "title": (
+        "Write a title of at most six words for this Slack thread. Answer with the title only.",
+        "<U1>: Our staging deploys have been timing out since Tuesday.\n"
+        "<U2>: Looks like the migration step hangs on the lock.\n"
+        "<U1>: Can we add a timeout and retry?",
+    ),
+}
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def _run_once(
+    provider_name: str, model: str, system_content: str, prompt: str
+) -> float:
+    provider = _get_provider(provider_name)
+    provider.set_model(model)
+    provider.set_web_search(False)
+    start = time.perf_counter()
+    provider.generate_response(prompt, system_content)
+    return time.perf_counter() - start
+
+
+def benchmark(models: List[str], runs: int, concurrency: int) -> Dict[str, dict]:
+    available = get_available_providers()
+    results = {}
+    for model in models:
+        if model not in available:
+            logger.warning(f"[provider_latency] Skipping {model}: not configured")
+            continue
+        provider_name = available[model]["provider"].lower()
+        _get_provider(provider_name).warm_up()
+        # Not counted: the first call pays for connection setup or loading the weights
+        _run_once(provider_name, model, *TASKS["acknowledgement"])
+
+        results[model] = {}
+        for task, (system_content, prompt) in TASKS.items():
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                latencies = list(
+                    executor.map(
+                        lambda _: _run_once(
+                            provider_name, model, system_content, prompt
+                        ),
+                        range(runs),
+                    )
+                )
+            results[model][task] = {
+                "runs": runs,
+                "p50": statistics.median(latencies),
+                "p95": _percentile(latencies, 95),
+                "mean": statistics.mean(latencies),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare provider latency on lightweight tasks."
+    )
+    parser.add_argument("--models", nargs="+", default=DEFAULT_MODELS)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    results = benchmark(args.models, args.runs, args.concurrency)
+    print(f"{'model':<28} {'task':<16} {'p50_ms':>9} {'p95_ms':>9} {'mean_ms':>9}")
+    for model, tasks in results.items():
+        for task, summary in tasks.items():
+            print(
+                f"{model:<28} {task:<16} {summary['p50'] * 1000:>9.0f} "
+                f"{summary['p95'] * 1000:>9.0f} {summary['mean'] * 1000:>9.0f}"
+            )
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# Compares the per-call latency of Slack Web API calls made through slack_sdk's urllib transport,
+# which opens a connection per call, and through the pooled keep-alive transport, `--concurrency` calls at a time.
+# By default the calls go to a local stand-in for the Web API, which waits `--rtt-ms` per request and twice that
+# per new connection, for the TCP and TLS handshakes a call to slack.com pays for. With `--base-url` and
+# `SLACK_BOT_TOKEN` set, they are `auth.test` calls to that Web API instead.
+#
+# Run with `python -m benchmarks.slack_transport [--calls 200] [--concurrency 8] [--rtt-ms 20] [--json out.json]`.
+import argparse
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from listeners.listener_utils.slack_transport import PooledTransport
+from observability.tracing import TracedWebClient
+
+logging.basicConfig(
+    level=logging.WARNING, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+# httpx logs every request at info
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+class _SlackStandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    rtt = 0.0
+
+    def setup(self):
+        super().setup()
+        time.sleep(2 * self.rtt)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        time.sleep(self.rtt)
+        body = json.dumps({"ok": True, "url": "https://example.slack.com/"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _start_stand_in(rtt: float) -> ThreadingHTTPServer:
+    handler = type("SlackStandIn", (_SlackStandIn,), {"rtt": rtt})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def _run(client: TracedWebClient, calls: int, concurrency: int) -> Dict[str, float]:
+    def call(_) -> float:
+        start = time.perf_counter()
+        client.auth_test()
+        return time.perf_counter() - start
+
+    # Not counted: opens the first connection
+    client.auth_test()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(call, range(calls)))
+    elapsed = time.perf_counter() - start
+    return {
+        "calls": calls,
+        "p50": statistics.median(latencies),
+        "p95": _percentile(latencies, 95),
+        "mean": statistics.mean(latencies),
+        "calls_per_second": calls / elapsed,
+    }
+
+
+def benchmark(
+    calls: int, concurrency: int, rtt: float, base_url: Optional[str] = None
+) -> Dict[str, dict]:
+    server = None
+    if base_url is None:
+        server = _start_stand_in(rtt)
+        base_url = f"http://127.0.0.1:{server.server_port}/api/"
+    token = os.environ.get("SLACK_BOT_TOKEN")
+    transport = PooledTransport(max_connections=concurrency)
+    try:
+        return {
+            "urllib": _run(
+                TracedWebClient(token=token, base_url=base_url), calls, concurrency
+            ),
+            "pooled": _run(
+                TracedWebClient(token=token, base_url=base_url, transport=transport),
+                calls,
+                concurrency,
+            ),
+        }
+    finally:
+        transport.close()
+        if server is not None:
+            server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare Slack Web API call latency with and without the pooled transport."
+    )
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rtt-ms", type=float, default=20)
+    parser.add_argument(
+        "--base-url", help="A Web API to call instead of the local stand-in"
+    )
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    results = benchmark(args.calls, args.concurrency, args.rtt_ms / 1000, args.base_url)
+    print(
+        f"{'transport':<20} {'p50_ms':>9} {'p95_ms':>9} {'mean_ms':>9} {'calls/s':>9}"
+    )
+    for transport, summary in results.items():
+        print(
+            f"{transport:<20} {summary['p50'] * 1000:>9.1f} {summary['p95'] * 1000:>9.1f} "
+            f"{summary['mean'] * 1000:>9.1f} {summary['calls_per_second']:>9.1f}"
+        )
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,20 @@ from listeners import actions
 from listeners import commands
 from listeners import events
 from listeners import functions
+from listeners.listener_utils.slack_transport import slack_transport_middleware
+from listeners.middleware import event_dedupe_middleware, event_filter_middleware
+from observability.cassette import recording_middleware
+from observability.tracing import tracing_middleware
 
 
 def register_listeners(app):
+    # Runs first, so dropped events cost neither a span nor a listener thread
+    app.use(event_filter_middleware)
+    app.use(event_dedupe_middleware)
+    # Before the middleware wrapping the client, which keeps its transport
+    app.use(slack_transport_middleware)
+    app.use(tracing_middleware)
+    app.use(recording_middleware)
     actions.register(app)
     commands.register(app)
     events.register(app)
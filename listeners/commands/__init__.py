@@ -1,6 +1,13 @@
 from slack_bolt import App
+from ..listener_utils.bulkheads import in_llm_bulkhead
 from .ask_command import ask_callback
+from .digest_command import DIGEST_DEADLINE_SECONDS, digest_callback
+from .profile_command import profile_callback
 
 
 def register(app: App):
-    app.command("/ask-bolty")(ask_callback)
+    app.command("/ask-bolty")(in_llm_bulkhead(ask_callback))
+    app.command("/bolty-profile")(profile_callback)
+    app.command("/bolty-digest")(
+        in_llm_bulkhead(digest_callback, deadline_seconds=DIGEST_DEADLINE_SECONDS)
+    )
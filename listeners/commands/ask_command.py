@@ -1,14 +1,21 @@
 from slack_bolt import Ack, Say, BoltContext
 from logging import Logger
+from ai.deadlines import deadline_exceeded, without_deadline
 from ai.providers import get_provider_response
+from observability.profiler import profile_request
+from observability.tracing import traced
 from slack_sdk import WebClient
 
+from ..listener_utils.listener_constants import TIMEOUT_TEXT
+
 """
 Callback for handling the 'ask-bolty' command. It acknowledges the command, retrieves the user's ID and prompt,
 checks if the prompt is empty, and responds with either an error message or the provider's response.
 """
 
 
+@traced("ask_command")
+@profile_request("ask_command")
 def ask_callback(
     client: WebClient, ack: Ack, command, say: Say, logger: Logger, context: BoltContext
 ):
@@ -30,7 +37,9 @@ def ask_callback(
             )
         else:
             logger.info(f"[ask_command] Calling get_provider_response...")
-            response = get_provider_response(user_id, prompt)
+            response = get_provider_response(
+                user_id, prompt, channel_id=channel_id, listener="ask_command"
+            )
             logger.info(f"[ask_command] Received response from provider (length: {len(response)})")
             logger.debug(f"[ask_command] Response content: {response[:200]}...")
             
@@ -62,6 +71,6 @@ def ask_callback(
             logger.info(f"[ask_command] Message successfully posted!")
     except Exception as e:
         logger.error(f"[ask_command] ERROR: {type(e).__name__}: {str(e)}", exc_info=True)
-        client.chat_postEphemeral(
-            channel=channel_id, user=user_id, text=f"Received an error from Bolty:\n{type(e).__name__}: {e}"
-        )
+        text = TIMEOUT_TEXT if deadline_exceeded() else f"Received an error from Bolty:\n{type(e).__name__}: {e}"
+        with without_deadline():
+            client.chat_postEphemeral(channel=channel_id, user=user_id, text=text)
@@ -0,0 +1,236 @@
+# Callback for the `/bolty-digest [#channel ...] [hours]` command, which DMs the user a digest of the last
+# `hours` (`DIGEST_HOURS` by default) across the given channels, or every channel Bolty is a member of.
+# Channel histories are fetched `DIGEST_FETCH_CONCURRENCY` at a time, within `DIGEST_HISTORY_PER_MINUTE`
+# calls a minute shared by every digest, and each channel is summarized as soon as its history arrives,
+# `DIGEST_SUMMARY_CONCURRENCY` at a time. Channel summaries are posted in the digest's thread as they complete,
+# then merged into one digest, which replaces the progress message along with the total time taken.
+import os
+import re
+import threading
+import time
+from concurrent.futures import as_completed
+from logging import Logger
+from typing import List, Optional, Tuple
+
+from slack_bolt import Ack, BoltContext
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+
+from ai.deadlines import deadline_exceeded, without_deadline
+from ai.providers import get_provider_response
+from observability.profiler import profile_request
+from observability.tracing import ContextExecutor, traced
+
+from ..listener_utils.listener_constants import (
+    DIGEST_CHANNEL_PROMPT,
+    DIGEST_MERGE_PROMPT,
+    TIMEOUT_TEXT,
+)
+from ..listener_utils.message_utils import split_message
+from ..listener_utils.parse_conversation import parse_conversation
+from ..listener_utils.rate_limits import RateLimiter, call_rate_limited
+
+DIGEST_HOURS = float(os.environ.get("DIGEST_HOURS", "24"))
+DIGEST_MAX_CHANNELS = int(os.environ.get("DIGEST_MAX_CHANNELS", "50"))
+DIGEST_MAX_MESSAGES = int(os.environ.get("DIGEST_MAX_MESSAGES", "100"))
+DIGEST_FETCH_CONCURRENCY = int(os.environ.get("DIGEST_FETCH_CONCURRENCY", "8"))
+DIGEST_SUMMARY_CONCURRENCY = int(os.environ.get("DIGEST_SUMMARY_CONCURRENCY", "4"))
+DIGEST_HISTORY_PER_MINUTE = float(os.environ.get("DIGEST_HISTORY_PER_MINUTE", "50"))
+# A digest reads and summarizes many channels, so it gets longer than a single answer
+DIGEST_DEADLINE_SECONDS = float(os.environ.get("DIGEST_DEADLINE_SECONDS", "900"))
+
+CHANNEL_REFERENCE = re.compile(r"<#([CG][A-Z0-9]+)(?:\|([^>]*))?>")
+
+# conversations.history and chat.update are Tier 3 methods; posts are limited to about one a second per channel
+history_limiter = RateLimiter(DIGEST_HISTORY_PER_MINUTE, burst=DIGEST_FETCH_CONCURRENCY)
+post_limiter = RateLimiter(60, burst=3)
+update_limiter = RateLimiter(50, burst=5)
+_fetcher = ContextExecutor(
+    max_workers=DIGEST_FETCH_CONCURRENCY, thread_name_prefix="digest"
+)
+_summary_slots = threading.BoundedSemaphore(DIGEST_SUMMARY_CONCURRENCY)
+
+
+def parse_digest_command(text: str) -> Tuple[List[Tuple[str, str]], float]:
+    """The `(id, name)` of the channels referenced in the command text, and the hours to cover."""
+    channels = [
+        (channel_id, name or channel_id)
+        for channel_id, name in CHANNEL_REFERENCE.findall(text)
+    ]
+    hours = DIGEST_HOURS
+    for word in CHANNEL_REFERENCE.sub(" ", text).split():
+        try:
+            hours = float(word.rstrip("h"))
+        except ValueError:
+            pass
+    return channels, hours
+
+
+def member_channels(client: WebClient) -> List[Tuple[str, str]]:
+    channels = []
+    cursor = None
+    while len(channels) < DIGEST_MAX_CHANNELS:
+        response = client.users_conversations(
+            types="public_channel,private_channel",
+            exclude_archived=True,
+            limit=200,
+            cursor=cursor,
+        )
+        channels.extend(
+            (channel["id"], channel.get("name") or channel["id"])
+            for channel in response["channels"]
+        )
+        cursor = (response.get("response_metadata") or {}).get("next_cursor")
+        if not cursor:
+            break
+    return channels[:DIGEST_MAX_CHANNELS]
+
+
+def summarize_channel(
+    client: WebClient, user_id: str, channel_id: str, name: str, oldest: float
+) -> Optional[str]:
+    """Summarize one channel's messages since `oldest`, or None when it had none."""
+    history = call_rate_limited(
+        history_limiter,
+        client.conversations_history,
+        channel=channel_id,
+        oldest=str(oldest),
+        limit=DIGEST_MAX_MESSAGES,
+    )["messages"]
+    conversation = parse_conversation(history)
+    if not conversation:
+        return None
+    with _summary_slots:
+        return get_provider_response(
+            user_id,
+            DIGEST_CHANNEL_PROMPT.format(channel=name),
+            conversation,
+            channel_id=channel_id,
+            listener="digest_command",
+            web_search=False,
+        )
+
+
+def _post(client: WebClient, channel: str, thread_ts: str, text: str):
+    for chunk in split_message(text):
+        call_rate_limited(
+            post_limiter,
+            client.chat_postMessage,
+            channel=channel,
+            thread_ts=thread_ts,
+            text=chunk,
+        )
+
+
+@traced("digest_command")
+@profile_request("digest_command")
+def digest_callback(
+    client: WebClient, ack: Ack, command: dict, logger: Logger, context: BoltContext
+):
+    ack()
+    user_id = context["user_id"]
+    start = time.perf_counter()
+    channels, hours = parse_digest_command(command.get("text") or "")
+    logger.info(
+        f"[digest_command] Digest of {len(channels) or 'member'} channels over {hours}h for {user_id}"
+    )
+
+    dm_channel = client.conversations_open(users=user_id)["channel"]["id"]
+    header = None
+    try:
+        channels = channels or member_channels(client)
+        if not channels:
+            client.chat_postMessage(
+                channel=dm_channel,
+                text="Bolty is not a member of any channel yet. Invite it, or name the channels to digest.",
+            )
+            return
+        header = client.chat_postMessage(
+            channel=dm_channel,
+            text=f"Building a digest of {len(channels)} channels over the last {hours:g} hours...",
+        )["ts"]
+
+        oldest = time.time() - hours * 3600
+        futures = {
+            _fetcher.submit(
+                summarize_channel, client, user_id, channel_id, name, oldest
+            ): (channel_id, name)
+            for channel_id, name in channels
+        }
+        summaries = []
+        quiet, failed = [], []
+        for done, future in enumerate(as_completed(futures), start=1):
+            channel_id, name = futures[future]
+            try:
+                summary = future.result()
+            except SlackApiError as e:
+                logger.warning(
+                    f"[digest_command] Failed to read {channel_id}: {e.response.get('error')}"
+                )
+                failed.append(channel_id)
+                continue
+            except Exception as e:
+                logger.error(
+                    f"[digest_command] Failed to summarize {channel_id}: {type(e).__name__}: {e}",
+                    exc_info=True,
+                )
+                failed.append(channel_id)
+                continue
+            if summary is None:
+                quiet.append(channel_id)
+                continue
+            summaries.append({"user": f"#{name}", "text": summary})
+            _post(client, dm_channel, header, f"*<#{channel_id}>*\n{summary}")
+            call_rate_limited(
+                update_limiter,
+                client.chat_update,
+                channel=dm_channel,
+                ts=header,
+                text=f"Building a digest of {len(channels)} channels over the last {hours:g} hours... "
+                f"{done}/{len(channels)} done",
+            )
+
+        if summaries:
+            digest = get_provider_response(
+                user_id,
+                DIGEST_MERGE_PROMPT,
+                summaries,
+                listener="digest_command",
+                web_search=False,
+            )
+        else:
+            digest = "Nothing was posted in these channels."
+        footer = [
+            (
+                f"_Digest of {len(summaries)} of {len(channels)} channels over the last {hours:g} hours, "
+                f"built in {time.perf_counter() - start:.1f}s._"
+            )
+        ]
+        if quiet:
+            footer.append(f"_No activity: {', '.join(f'<#{c}>' for c in quiet)}_")
+        if failed:
+            footer.append(
+                f"_Could not digest: {', '.join(f'<#{c}>' for c in failed)}. Is Bolty a member?_"
+            )
+        chunks = split_message(f"{digest}\n\n" + "\n".join(footer))
+        client.chat_update(channel=dm_channel, ts=header, text=chunks[0])
+        for chunk in chunks[1:]:
+            _post(client, dm_channel, header, chunk)
+        logger.info(
+            f"[digest_command] Digest of {len(summaries)}/{len(channels)} channels built in "
+            f"{time.perf_counter() - start:.1f}s"
+        )
+    except Exception as e:
+        logger.error(
+            f"[digest_command] ERROR: {type(e).__name__}: {str(e)}", exc_info=True
+        )
+        text = (
+            TIMEOUT_TEXT
+            if deadline_exceeded()
+            else f"Received an error from Bolty:\n{type(e).__name__}: {e}"
+        )
+        with without_deadline():
+            if header:
+                client.chat_update(channel=dm_channel, ts=header, text=text)
+            else:
+                client.chat_postMessage(channel=dm_channel, text=text)
@@ -0,0 +1,40 @@
+# Callback for the admin-only 'bolty-profile' command. It opens a profiling window during which every request
+# is profiled, for the number of seconds given as the command's text or `PROFILING_WINDOW_SECONDS`.
+# Only the user IDs listed in `PROFILING_ADMIN_USER_IDS` may run it.
+import os
+from logging import Logger
+
+from slack_bolt import Ack, BoltContext
+from slack_sdk import WebClient
+
+from observability.profiler import PROFILING_WINDOW_SECONDS, start_profiling_window
+
+PROFILING_ADMIN_USER_IDS = {
+    user_id.strip()
+    for user_id in os.environ.get("PROFILING_ADMIN_USER_IDS", "").split(",")
+    if user_id.strip()
+}
+MAX_WINDOW_SECONDS = 600
+
+
+def profile_callback(
+    client: WebClient, ack: Ack, command, logger: Logger, context: BoltContext
+):
+    ack()
+    user_id = context["user_id"]
+    channel_id = context["channel_id"]
+
+    if user_id not in PROFILING_ADMIN_USER_IDS:
+        logger.warning(f"[profile_command] Refused for non-admin user {user_id}")
+        text = "Sorry, only Bolty's admins can start profiling."
+    else:
+        try:
+            seconds = float(command["text"] or PROFILING_WINDOW_SECONDS)
+        except ValueError:
+            seconds = PROFILING_WINDOW_SECONDS
+        seconds = min(max(seconds, 1), MAX_WINDOW_SECONDS)
+        start_profiling_window(seconds)
+        logger.info(f"[profile_command] {user_id} started a {seconds:.0f}s window")
+        text = f"Profiling every request for {seconds:.0f} seconds. Profiles are written to `data/profiles`."
+
+    client.chat_postEphemeral(channel=channel_id, user=user_id, text=text)
@@ -1,11 +1,23 @@
 from slack_bolt import App
+from ..listener_utils.bulkheads import in_llm_bulkhead
+from ..listener_utils.job_workers import register_job_handler
 from .app_home_opened import app_home_opened_callback
-from .app_mentioned import app_mentioned_callback
-from .app_messaged import app_messaged_callback
+from .app_mentioned import app_mentioned_callback, respond_to_mention
+from .app_messaged import app_messaged_callback, respond_to_dm
+from .channel_messaged import channel_messaged_callback, is_channel_message
 
 
 def register(app: App):
     app.event("app_home_opened")(app_home_opened_callback)
-    app.event("app_mention")(app_mentioned_callback)
+    # LLM-backed listeners run on their own bulkhead, so they cannot starve the App Home and actions
+    app.event("app_mention")(in_llm_bulkhead(app_mentioned_callback))
+    # Channel messages feed the retrieval index; registered first since the DM listener matches every message
+    app.event("message", matchers=[is_channel_message])(channel_messaged_callback)
     # Only listen to direct messages (DMs), not all messages
-    app.event({"type": "message", "channel_type": "im"})(app_messaged_callback)
+    app.event({"type": "message", "channel_type": "im"})(
+        in_llm_bulkhead(app_messaged_callback)
+    )
+
+    # Jobs enqueued by the mention and DM listeners when the durable job queue is enabled
+    register_job_handler("app_mentioned", respond_to_mention)
+    register_job_handler("app_messaged", respond_to_dm)
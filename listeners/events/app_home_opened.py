@@ -1,4 +1,5 @@
 from logging import Logger
+from typing import List, Optional, Tuple
 from ai.providers import get_available_providers
 from slack_sdk import WebClient
 from state_store.get_user_state import get_user_state
@@ -10,6 +11,59 @@ and publishes a view to the user's home tab in Slack.
 """
 
 
+def build_model_options(
+    available_providers: dict, selected_model: Optional[str] = None
+) -> Tuple[List[dict], dict]:
+    """
+    Build the model dropdown's options, each containing the model name and provider, and its initial option.
+    The initial option is the user's previously selected model, or a "Select a provider" placeholder
+    when they have not picked one yet.
+    """
+    # "Auto" lets the model router pick the cheapest model that meets the latency SLO per request
+    options = [
+        {
+            "text": {
+                "type": "plain_text",
+                "text": "Auto (fastest suitable model per request)",
+                "emoji": True,
+            },
+            "value": "auto auto",
+        }
+    ]
+    options.extend(
+        {
+            "text": {
+                "type": "plain_text",
+                "text": f"{model_info['name']} ({model_info['provider']})",
+                "emoji": True,
+            },
+            "value": f"{model_name} {model_info['provider'].lower()}",
+        }
+        for model_name, model_info in available_providers.items()
+    )
+
+    if selected_model is None:
+        # add an empty option if the user has no previously selected model.
+        options.append(
+            {
+                "text": {
+                    "type": "plain_text",
+                    "text": "Select a provider",
+                    "emoji": True,
+                },
+                "value": "null",
+            }
+        )
+        return options, options[-1]
+
+    # set the initial option to the user's previously selected model
+    initial_option = next(
+        (option for option in options if option["value"].startswith(selected_model)),
+        options[-1],
+    )
+    return options, initial_option
+
+
 def app_home_opened_callback(event: dict, logger: Logger, client: WebClient):
     user_id = event["user"]
     tab = event["tab"]
@@ -26,43 +80,16 @@ def app_home_opened_callback(event: dict, logger: Logger, client: WebClient):
         available_providers = get_available_providers()
         logger.info(f"[app_home_opened] Found {len(available_providers)} providers")
         
-        options = [
-            {
-                "text": {
-                    "type": "plain_text",
-                    "text": f"{model_info['name']} ({model_info['provider']})",
-                    "emoji": True,
-                },
-                "value": f"{model_name} {model_info['provider'].lower()}",
-            }
-            for model_name, model_info in available_providers.items()
-        ]
-
         # retrieve user's state to determine if they already have a selected model
         logger.info(f"[app_home_opened] Getting user state for {user_id}...")
         user_state = get_user_state(user_id, True)
-        initial_option = None
-
         if user_state:
-            initial_model = get_user_state(user_id, True)[1]
-            logger.info(f"[app_home_opened] User has existing model: {initial_model}")
-            # set the initial option to the user's previously selected model
-            initial_option = list(
-                filter(lambda x: x["value"].startswith(initial_model), options)
-            )
+            logger.info(f"[app_home_opened] User has existing model: {user_state[1]}")
         else:
             logger.info(f"[app_home_opened] User has no existing model selection")
-            # add an empty option if the user has no previously selected model.
-            options.append(
-                {
-                    "text": {
-                        "type": "plain_text",
-                        "text": "Select a provider",
-                        "emoji": True,
-                    },
-                    "value": "null",
-                }
-            )
+        options, initial_option = build_model_options(
+            available_providers, user_state[1] if user_state else None
+        )
 
         logger.info(f"[app_home_opened] Publishing home view for {user_id}...")
         client.views_publish(
@@ -99,9 +126,7 @@ def app_home_opened_callback(event: dict, logger: Logger, client: WebClient):
                         "elements": [
                             {
                                 "type": "static_select",
-                                "initial_option": initial_option[0]
-                                if initial_option
-                                else options[-1],
+                                "initial_option": initial_option,
                                 "options": options,
                                 "action_id": "pick_a_provider",
                             }
@@ -1,24 +1,49 @@
 from logging import Logger
 
-from slack_bolt import Say
+from slack_bolt import BoltContext, Say
 from slack_sdk import WebClient
 
+from ai.ai_constants import DEFAULT_SYSTEM_CONTENT
+from ai.context_tools import CONTEXT_TOOLS
+from ai.deadlines import deadline_exceeded, without_deadline
 from ai.providers import get_provider_response
+from observability.profiler import profile_request
+from observability.tracing import traced
 
+from ..listener_utils.attachments import include_attachments
+from ..listener_utils.context_tools import SlackContextTools
+from ..listener_utils.installation_clients import installation_of
+from ..listener_utils.job_workers import (
+    DURABLE_JOB_QUEUE,
+    enqueue_job,
+    job_response,
+    send_response,
+)
 from ..listener_utils.listener_constants import (
     DEFAULT_LOADING_TEXT,
     MENTION_WITHOUT_TEXT,
+    TIMEOUT_TEXT,
 )
-from ..listener_utils.message_utils import send_long_message
-from ..listener_utils.parse_conversation import parse_conversation
+from ..listener_utils.speculative import SPECULATIVE_MODE, respond_speculatively
+from ..listener_utils.thread_leases import thread_leased
 
 """
 Handles the event when the app is mentioned in a Slack channel, retrieves the conversation context,
-and generates an AI response if text is provided, otherwise sends a default response
+and generates an AI response if text is provided, otherwise sends a default response.
+Mentions in a thread use the thread as context, with long threads compacted into a stored summary
+plus their most recent messages, while top-level mentions select the most relevant and most recent
+channel messages from the local retrieval index. With `CONTEXT_TOOLS=true`, nothing is fetched up front,
+and the model reads the thread or searches the channel through tool calls when it needs to.
+With the durable job queue enabled, the callback only posts the waiting message and enqueues a job,
+and `respond_to_mention` runs on a job worker instead.
 """
 
 
-def app_mentioned_callback(client: WebClient, event: dict, logger: Logger, say: Say):
+@traced("app_mentioned")
+@profile_request("app_mentioned")
+def app_mentioned_callback(
+    client: WebClient, event: dict, logger: Logger, say: Say, context: BoltContext
+):
     channel_id = event.get("channel")
     thread_ts = event.get("thread_ts")
     user_id = event.get("user")
@@ -32,42 +57,27 @@ def app_mentioned_callback(client: WebClient, event: dict, logger: Logger, say:
 
     waiting_message = None
     try:
-        if thread_ts:
-            logger.info(f"[app_mentioned] Fetching thread conversation...")
-            conversation = client.conversations_replies(
-                channel=channel_id, ts=thread_ts, limit=200
-            )["messages"]
-        else:
-            logger.info(f"[app_mentioned] Fetching channel history...")
-            conversation = client.conversations_history(channel=channel_id, limit=30)[
-                "messages"
-            ]
-            thread_ts = event["ts"]
-
-        conversation_context = parse_conversation(conversation[:-1])
-        logger.info(
-            f"[app_mentioned] Parsed {len(conversation_context)} messages from context"
-        )
-
         if text:
             logger.info(f"[app_mentioned] Sending waiting message...")
-            waiting_message = say(text=DEFAULT_LOADING_TEXT, thread_ts=thread_ts)
+            waiting_message = say(
+                text=DEFAULT_LOADING_TEXT, thread_ts=thread_ts or event["ts"]
+            )
             logger.info(
                 f"[app_mentioned] Waiting message sent with ts: {waiting_message.get('ts')}"
             )
 
-            logger.info(f"[app_mentioned] Calling get_provider_response...")
-            response = get_provider_response(user_id, text, conversation_context)
-            logger.info(
-                f"[app_mentioned] Received response from provider (length: {len(response)})"
-            )
-            logger.debug(f"[app_mentioned] Response content: {response[:200]}...")
+            if DURABLE_JOB_QUEUE:
+                job_id = enqueue_job(
+                    "app_mentioned",
+                    event,
+                    channel_id,
+                    waiting_message["ts"],
+                    installation_of(context),
+                )
+                logger.info(f"[app_mentioned] Enqueued job {job_id}")
+                return
 
-            logger.info(f"[app_mentioned] Updating message with response...")
-            send_long_message(
-                client, channel_id, thread_ts, waiting_message["ts"], response
-            )
-            logger.info(f"[app_mentioned] Message successfully updated!")
+            respond_to_mention(client, event, waiting_message["ts"], logger)
         else:
             logger.warning(f"[app_mentioned] No text provided in mention")
             response = MENTION_WITHOUT_TEXT
@@ -81,14 +91,101 @@ def app_mentioned_callback(client: WebClient, event: dict, logger: Logger, say:
             f"[app_mentioned] ERROR: {type(e).__name__}: {str(e)}", exc_info=True
         )
         if waiting_message:
+            text = (
+                TIMEOUT_TEXT
+                if deadline_exceeded()
+                else f"Received an error from Bolty:\n{type(e).__name__}: {e}"
+            )
             try:
-                client.chat_update(
-                    channel=channel_id,
-                    ts=waiting_message["ts"],
-                    text=f"Received an error from Bolty:\n{type(e).__name__}: {e}",
-                )
+                with without_deadline():
+                    client.chat_update(
+                        channel=channel_id, ts=waiting_message["ts"], text=text
+                    )
             except Exception as update_error:
                 logger.error(
                     f"[app_mentioned] Failed to update error message: {update_error}",
                     exc_info=True,
                 )
+
+
+@thread_leased
+@profile_request("respond_to_mention")
+def respond_to_mention(
+    client: WebClient, event: dict, waiting_message_ts: str, logger: Logger
+):
+    """Retrieve the mention's context, generate the response and replace the waiting message with it."""
+    response = job_response(
+        lambda: generate_mention_response(client, event, waiting_message_ts, logger)
+    )
+
+    logger.info(f"[app_mentioned] Updating message with response...")
+    send_response(
+        client,
+        event.get("channel"),
+        event.get("thread_ts") or event["ts"],
+        waiting_message_ts,
+        response,
+    )
+    logger.info(f"[app_mentioned] Message successfully updated!")
+
+
+def generate_mention_response(
+    client: WebClient, event: dict, waiting_message_ts: str, logger: Logger
+) -> str:
+    channel_id = event.get("channel")
+    thread_ts = event.get("thread_ts")
+    user_id = event.get("user")
+    text = event.get("text")
+
+    context_tools = SlackContextTools(client, event, waiting_message_ts)
+    use_tools = CONTEXT_TOOLS and not SPECULATIVE_MODE
+    if use_tools:
+        logger.info(f"[app_mentioned] Leaving the context to the model's tool calls")
+        conversation_context = []
+    elif thread_ts:
+        logger.info(f"[app_mentioned] Fetching thread conversation...")
+        conversation_context = context_tools.thread_context()
+    else:
+        logger.info(f"[app_mentioned] Selecting context from retrieval index...")
+        conversation_context = context_tools.channel_context(text)
+    thread_ts = thread_ts or event["ts"]
+
+    logger.info(
+        f"[app_mentioned] Parsed {len(conversation_context)} messages from context"
+    )
+
+    text, conversation_context = include_attachments(
+        client.token, text, event.get("files"), conversation_context
+    )
+
+    if SPECULATIVE_MODE:
+        logger.info(f"[app_mentioned] Responding speculatively...")
+        response = respond_speculatively(
+            client,
+            channel_id,
+            waiting_message_ts,
+            user_id,
+            text,
+            conversation_context,
+            DEFAULT_SYSTEM_CONTENT,
+            "app_mentioned",
+            thread_ts=thread_ts,
+            message_ts=event["ts"],
+        )
+    else:
+        logger.info(f"[app_mentioned] Calling get_provider_response...")
+        response = get_provider_response(
+            user_id,
+            text,
+            conversation_context,
+            channel_id=channel_id,
+            listener="app_mentioned",
+            thread_ts=thread_ts,
+            message_ts=event["ts"],
+            tools=context_tools if use_tools else None,
+        )
+    logger.info(
+        f"[app_mentioned] Received response from provider (length: {len(response)})"
+    )
+    logger.debug(f"[app_mentioned] Response content: {response[:200]}...")
+    return response
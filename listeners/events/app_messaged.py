@@ -1,22 +1,56 @@
 from logging import Logger
 
-from slack_bolt import Say
+from slack_bolt import BoltContext, Say
 from slack_sdk import WebClient
 
 from ai.ai_constants import DM_SYSTEM_CONTENT
+from ai.cancellation import RequestCancelled, cancellable
+from ai.context_tools import CONTEXT_TOOLS
+from ai.deadlines import DEADLINE_REASON, deadline_exceeded, without_deadline
 from ai.providers import get_provider_response
+from ai.response_chains import invalidate_for_edit
+from observability.profiler import profile_request
+from observability.tracing import traced
 
-from ..listener_utils.listener_constants import DEFAULT_LOADING_TEXT
-from ..listener_utils.message_utils import send_long_message
-from ..listener_utils.parse_conversation import parse_conversation
+from ..listener_utils.attachments import include_attachments
+from ..listener_utils.context_tools import SlackContextTools
+from ..listener_utils.in_flight import (
+    SUPERSEDE_DEBOUNCE_SECONDS,
+    SUPERSEDE_REQUESTS,
+    in_flight,
+)
+from ..listener_utils.installation_clients import installation_of
+from ..listener_utils.job_workers import (
+    DURABLE_JOB_QUEUE,
+    enqueue_job,
+    job_response,
+    send_response,
+)
+from ..listener_utils.listener_constants import (
+    DEFAULT_LOADING_TEXT,
+    SUPERSEDED_TEXT,
+    TIMEOUT_TEXT,
+)
+from ..listener_utils.speculative import SPECULATIVE_MODE, respond_speculatively
+from ..listener_utils.thread_leases import thread_leased
 
 """
 Handles the event when a direct message is sent to the bot, retrieves the conversation context,
-and generates an AI response.
+and generates an AI response. Long threads are compacted into a stored summary plus their most recent messages.
+With `CONTEXT_TOOLS=true`, the thread is only read when the model asks for it through a tool call.
+With the durable job queue enabled, the callback only posts the waiting message and enqueues a job,
+and `respond_to_dm` runs on a job worker instead.
+With `SUPERSEDE_REQUESTS=true`, a DM is answered only once no newer message arrives in the same conversation
+within `SUPERSEDE_DEBOUNCE_SECONDS`, together with the messages it superseded. A newer message, an edit or
+a deletion cancels the provider call in flight; an edited message is answered again in the same waiting message.
 """
 
 
-def app_messaged_callback(client: WebClient, event: dict, logger: Logger, say: Say):
+@traced("app_messaged")
+@profile_request("app_messaged")
+def app_messaged_callback(
+    client: WebClient, event: dict, logger: Logger, say: Say, context: BoltContext
+):
     channel_id = event.get("channel")
     thread_ts = event.get("thread_ts")
     user_id = event.get("user")
@@ -29,58 +63,216 @@ def app_messaged_callback(client: WebClient, event: dict, logger: Logger, say: S
     logger.info(f"[app_messaged] Thread TS: {thread_ts}")
     logger.info(f"[app_messaged] Channel type: {event.get('channel_type')}")
 
+    # Edited or deleted DMs are not new questions, but the thread's response chain is stale
+    if event.get("subtype") in ("message_changed", "message_deleted"):
+        invalidate_for_edit(event)
+        if SUPERSEDE_REQUESTS:
+            supersede_for_edit(client, event, logger)
+        return
+
     waiting_message = None
     try:
         if event.get("channel_type") == "im":
-            conversation_context = ""
-
-            if thread_ts:  # Retrieves context to continue the conversation in a thread.
-                logger.info(f"[app_messaged] Fetching thread context for {thread_ts}")
-                conversation = client.conversations_replies(
-                    channel=channel_id, limit=200, ts=thread_ts
-                )["messages"]
-                conversation_context = parse_conversation(conversation[:-1])
-                logger.info(
-                    f"[app_messaged] Parsed {len(conversation_context)} messages from thread"
-                )
-
             logger.info(f"[app_messaged] Sending waiting message...")
             waiting_message = say(text=DEFAULT_LOADING_TEXT, thread_ts=thread_ts)
             logger.info(
                 f"[app_messaged] Waiting message sent with ts: {waiting_message.get('ts')}"
             )
 
-            logger.info(f"[app_messaged] Calling get_provider_response...")
-            response = get_provider_response(
-                user_id, text, conversation_context, DM_SYSTEM_CONTENT
-            )
-            logger.info(
-                f"[app_messaged] Received response from provider (length: {len(response)})"
-            )
-            logger.debug(f"[app_messaged] Response content: {response[:200]}...")
-
-            logger.info(f"[app_messaged] Updating message with response...")
-            send_long_message(
-                client,
-                channel_id,
-                thread_ts or waiting_message["ts"],
-                waiting_message["ts"],
-                response,
-            )
-            logger.info(f"[app_messaged] Message successfully updated!")
+            if DURABLE_JOB_QUEUE:
+                job_id = enqueue_job(
+                    "app_messaged",
+                    event,
+                    channel_id,
+                    waiting_message["ts"],
+                    installation_of(context),
+                )
+                logger.info(f"[app_messaged] Enqueued job {job_id}")
+                return
+
+            if SUPERSEDE_REQUESTS:
+                respond_to_latest(client, event, waiting_message["ts"], logger)
+            else:
+                respond_to_dm(client, event, waiting_message["ts"], logger)
     except Exception as e:
         logger.error(
             f"[app_messaged] ERROR: {type(e).__name__}: {str(e)}", exc_info=True
         )
         if waiting_message:
+            text = (
+                TIMEOUT_TEXT
+                if deadline_exceeded()
+                else f"Received an error from Bolty:\n{type(e).__name__}: {e}"
+            )
             try:
-                client.chat_update(
-                    channel=channel_id,
-                    ts=waiting_message["ts"],
-                    text=f"Received an error from Bolty:\n{type(e).__name__}: {e}",
-                )
+                with without_deadline():
+                    client.chat_update(
+                        channel=channel_id, ts=waiting_message["ts"], text=text
+                    )
             except Exception as update_error:
                 logger.error(
                     f"[app_messaged] Failed to update error message: {update_error}",
                     exc_info=True,
                 )
+
+
+def respond_to_latest(
+    client: WebClient,
+    event: dict,
+    waiting_message_ts: str,
+    logger: Logger,
+    reason: str = "superseded",
+):
+    """Answer the DM after the debounce window, unless a newer message, an edit or a deletion cancels it first."""
+    request = in_flight.start(event, waiting_message_ts, reason)
+    try:
+        with cancellable(request.token):
+            request.token.wait(SUPERSEDE_DEBOUNCE_SECONDS)
+            request.token.raise_if_cancelled()
+            # Threads hold the superseded messages in their context; top-level DMs need them in the prompt
+            if not event.get("thread_ts"):
+                event = {**event, "text": request.text}
+            respond_to_dm(client, event, waiting_message_ts, logger)
+    except RequestCancelled as e:
+        logger.info(f"[app_messaged] Request for {event.get('ts')} {e.reason}")
+        if e.reason == "deleted":
+            client.chat_delete(channel=event.get("channel"), ts=waiting_message_ts)
+        elif e.reason == "superseded":
+            client.chat_update(
+                channel=event.get("channel"),
+                ts=waiting_message_ts,
+                text=SUPERSEDED_TEXT,
+            )
+        elif e.reason == DEADLINE_REASON:
+            with without_deadline():
+                client.chat_update(
+                    channel=event.get("channel"),
+                    ts=waiting_message_ts,
+                    text=TIMEOUT_TEXT,
+                )
+        # An edited message is answered again in the same waiting message
+    finally:
+        in_flight.finish(request)
+
+
+def supersede_for_edit(client: WebClient, event: dict, logger: Logger):
+    """Cancel the request answering an edited or deleted DM, answering an edited one again."""
+    channel_id = event.get("channel")
+    if event.get("subtype") == "message_deleted":
+        request = in_flight.find(channel_id, event.get("deleted_ts"))
+        if request is not None and in_flight.discard_message(
+            request, event.get("deleted_ts")
+        ):
+            logger.info(
+                f"[app_messaged] Message {event.get('deleted_ts')} deleted, still answering the rest"
+            )
+        return
+
+    message = event.get("message") or {}
+    previous_message = event.get("previous_message") or {}
+    # Link unfurls also change a message, without changing its text
+    if message.get("text") == previous_message.get("text"):
+        return
+    request = in_flight.find(channel_id, message.get("ts"))
+    if request is None:
+        return
+    logger.info(
+        f"[app_messaged] Message {message.get('ts')} edited, answering it again"
+    )
+    edited = {**message, "channel": channel_id, "channel_type": "im"}
+    try:
+        respond_to_latest(
+            client, edited, request.waiting_message_ts, logger, reason="edited"
+        )
+    except Exception as e:
+        logger.error(
+            f"[app_messaged] ERROR: {type(e).__name__}: {str(e)}", exc_info=True
+        )
+        text = (
+            TIMEOUT_TEXT
+            if deadline_exceeded()
+            else f"Received an error from Bolty:\n{type(e).__name__}: {e}"
+        )
+        with without_deadline():
+            client.chat_update(
+                channel=channel_id, ts=request.waiting_message_ts, text=text
+            )
+
+
+@thread_leased
+@profile_request("respond_to_dm")
+def respond_to_dm(
+    client: WebClient, event: dict, waiting_message_ts: str, logger: Logger
+):
+    """Retrieve the DM thread's context, generate the response and replace the waiting message with it."""
+    response = job_response(
+        lambda: generate_dm_response(client, event, waiting_message_ts, logger)
+    )
+
+    logger.info(f"[app_messaged] Updating message with response...")
+    send_response(
+        client,
+        event.get("channel"),
+        event.get("thread_ts") or waiting_message_ts,
+        waiting_message_ts,
+        response,
+    )
+    logger.info(f"[app_messaged] Message successfully updated!")
+
+
+def generate_dm_response(
+    client: WebClient, event: dict, waiting_message_ts: str, logger: Logger
+) -> str:
+    channel_id = event.get("channel")
+    thread_ts = event.get("thread_ts")
+    user_id = event.get("user")
+    text = event.get("text")
+
+    conversation_context = ""
+    context_tools = SlackContextTools(client, event, waiting_message_ts)
+    use_tools = CONTEXT_TOOLS and not SPECULATIVE_MODE
+    if use_tools:
+        logger.info(f"[app_messaged] Leaving the context to the model's tool calls")
+    elif thread_ts:  # Retrieves context to continue the conversation in a thread.
+        logger.info(f"[app_messaged] Fetching thread context for {thread_ts}")
+        conversation_context = context_tools.thread_context()
+        logger.info(
+            f"[app_messaged] Parsed {len(conversation_context)} messages from thread"
+        )
+
+    text, conversation_context = include_attachments(
+        client.token, text, event.get("files"), conversation_context
+    )
+
+    if SPECULATIVE_MODE:
+        logger.info(f"[app_messaged] Responding speculatively...")
+        response = respond_speculatively(
+            client,
+            channel_id,
+            waiting_message_ts,
+            user_id,
+            text,
+            conversation_context,
+            DM_SYSTEM_CONTENT,
+            "app_messaged",
+            thread_ts=thread_ts,
+            message_ts=event["ts"],
+        )
+    else:
+        logger.info(f"[app_messaged] Calling get_provider_response...")
+        response = get_provider_response(
+            user_id,
+            text,
+            conversation_context,
+            DM_SYSTEM_CONTENT,
+            channel_id=channel_id,
+            listener="app_messaged",
+            thread_ts=thread_ts,
+            message_ts=event["ts"],
+            tools=context_tools if use_tools else None,
+        )
+    logger.info(
+        f"[app_messaged] Received response from provider (length: {len(response)})"
+    )
+    logger.debug(f"[app_messaged] Response content: {response[:200]}...")
+    return response
@@ -0,0 +1,44 @@
+# Keeps the per-channel retrieval index up to date from `message` events in public and private channels.
+# Only top-level messages are indexed, mirroring what `conversations_history` returns,
+# so `app_mentioned_callback` can select relevant context for top-level mentions.
+# Edits and deletions also drop the response chain of the thread they happened in.
+from logging import Logger
+
+from ai.channel_index import get_channel_index
+from ai.response_chains import invalidate_for_edit
+
+
+def is_channel_message(event: dict) -> bool:
+    return event.get("channel_type") in ("channel", "group")
+
+
+def channel_messaged_callback(event: dict, logger: Logger):
+    channel_id = event.get("channel")
+    subtype = event.get("subtype")
+    index = get_channel_index(channel_id)
+
+    try:
+        if subtype in ("message_changed", "message_deleted"):
+            invalidate_for_edit(event)
+
+        if subtype == "message_deleted":
+            logger.debug(f"[channel_messaged] Removing {event.get('deleted_ts')}")
+            index.remove(event.get("deleted_ts"))
+            return
+
+        message = event.get("message", {}) if subtype == "message_changed" else event
+        if subtype not in (None, "message_changed", "thread_broadcast"):
+            return
+        if "user" not in message or message.get("bot_id"):
+            return
+        if message.get("thread_ts") not in (None, message.get("ts")):
+            return
+
+        logger.debug(f"[channel_messaged] Indexing {message.get('ts')} in {channel_id}")
+        index.add(
+            {"user": message["user"], "text": message.get("text"), "ts": message["ts"]}
+        )
+    except Exception as e:
+        logger.error(
+            f"[channel_messaged] ERROR: {type(e).__name__}: {str(e)}", exc_info=True
+        )
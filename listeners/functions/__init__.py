@@ -1,6 +1,7 @@
 from slack_bolt import App
+from ..listener_utils.bulkheads import in_llm_bulkhead
 from .summary_function import handle_summary_function_callback
 
 
 def register(app: App):
-    app.function("summary_function")(handle_summary_function_callback)
+    app.function("summary_function")(in_llm_bulkhead(handle_summary_function_callback))
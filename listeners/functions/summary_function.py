@@ -1,20 +1,57 @@
 from logging import Logger
 
-from slack_bolt import Ack, Complete, Fail
+from slack_bolt import Ack, BoltContext, Complete, Fail
 from slack_sdk import WebClient
 
+from ai.batch import SUMMARY_BATCH_MODE, get_batch_queue, register_batch_handler
+from ai.deadlines import deadline_exceeded, without_deadline
+from ai.overload import should_shed
 from ai.providers import get_provider_response
+from observability.profiler import profile_request
+from observability.tracing import traced
 
-from ..listener_utils.listener_constants import SUMMARIZE_CHANNEL_WORKFLOW
+from ..listener_utils.installation_clients import client_for, installation_of
+from ..listener_utils.listener_constants import (
+    BUSY_TEXT,
+    SUMMARIZE_CHANNEL_WORKFLOW,
+    TIMEOUT_TEXT,
+)
 from ..listener_utils.parse_conversation import parse_conversation
 
 """
 Handles the event to summarize a Slack channel's conversation history.
 It retrieves the conversation history, parses it, generates a summary using an AI response,
 and completes the workflow with the summary or fails if an error occurs.
+With `SUMMARY_BATCH_MODE` enabled, the summary is generated through the batch lane instead,
+and the workflow is completed from the batch queue once the result is ready, even after a restart:
+the batch request carries the function execution and its installation rather than the listener's callbacks,
+and is completed with a client for that installation (see `listeners/listener_utils/installation_clients.py`).
+Workflow runs are low priority: at the overload controller's last level they fail right away
+with a "busy, try again" message (see `ai/overload.py`).
 """
 
 
+def _complete_batched_summary(payload: dict, summary: str):
+    client_for(payload.get("installation", {})).functions_completeSuccess(
+        function_execution_id=payload["function_execution_id"],
+        outputs={"user_context": payload["user_context"], "response": summary},
+    )
+
+
+def _fail_batched_summary(payload: dict, error: Exception):
+    client_for(payload.get("installation", {})).functions_completeError(
+        function_execution_id=payload["function_execution_id"],
+        error=f"{type(error).__name__}: {error}",
+    )
+
+
+register_batch_handler(
+    "summary_function", _complete_batched_summary, _fail_batched_summary
+)
+
+
+@traced("summary_function")
+@profile_request("summary_function")
 def handle_summary_function_callback(
     ack: Ack,
     inputs: dict,
@@ -22,6 +59,7 @@ def handle_summary_function_callback(
     logger: Logger,
     client: WebClient,
     complete: Complete,
+    context: BoltContext,
 ):
     ack()
 
@@ -33,6 +71,11 @@ def handle_summary_function_callback(
         f"[summary_function] Summary request from user {user_id} for channel {channel_id}"
     )
 
+    if should_shed("summary_function"):
+        logger.warning("[summary_function] Shedding the request under overload")
+        fail(BUSY_TEXT)
+        return
+
     try:
         logger.info(f"[summary_function] Fetching channel history...")
         history = client.conversations_history(channel=channel_id, limit=30)["messages"]
@@ -42,9 +85,30 @@ def handle_summary_function_callback(
         conversation = parse_conversation(history)
         logger.info(f"[summary_function] Parsed {len(conversation)} conversation items")
 
+        if SUMMARY_BATCH_MODE:
+            logger.info(f"[summary_function] Queueing summary in the batch lane...")
+            get_batch_queue().submit(
+                user_id=user_id,
+                prompt=SUMMARIZE_CHANNEL_WORKFLOW,
+                context=conversation,
+                channel_id=channel_id,
+                listener="summary_function",
+                kind="summary_function",
+                payload={
+                    "installation": installation_of(context),
+                    "function_execution_id": complete.function_execution_id,
+                    "user_context": user_context,
+                },
+            )
+            return
+
         logger.info(f"[summary_function] Generating summary...")
         summary = get_provider_response(
-            user_id, SUMMARIZE_CHANNEL_WORKFLOW, conversation
+            user_id,
+            SUMMARIZE_CHANNEL_WORKFLOW,
+            conversation,
+            channel_id=channel_id,
+            listener="summary_function",
         )
         logger.info(f"[summary_function] Summary generated (length: {len(summary)})")
         logger.debug(f"[summary_function] Summary preview: {summary[:200]}...")
@@ -56,4 +120,6 @@ def handle_summary_function_callback(
         logger.error(
             f"[summary_function] ERROR: {type(e).__name__}: {str(e)}", exc_info=True
         )
-        fail(e)
+        timed_out = deadline_exceeded()
+        with without_deadline():
+            fail(TIMEOUT_TEXT if timed_out else e)
@@ -0,0 +1,298 @@
+# Brings the text of files shared in Slack (logs, CSVs, snippets, PDFs) into the context sent to the AI providers.
+# Opt in with ATTACHMENT_INGESTION=true; the app also needs the `files:read` scope.
+# Downloads are streamed with a size cap and decoded incrementally, within the request's deadline, and the
+# extracted text is cached in `./data/attachments` by file id and version hash, so later turns in a thread
+# reuse it. Cached files unused for ATTACHMENT_CACHE_TTL_SECONDS are evicted, and the least recently used
+# ones once the cache passes ATTACHMENT_CACHE_MAX_BYTES.
+# In cluster mode the cache lives in the shared backend for ATTACHMENT_CACHE_TTL_SECONDS instead,
+# so replicas reuse each other's extractions.
+import codecs
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from ai.cancellation import RequestCancelled, raise_if_cancelled
+from ai.deadlines import stage_timeout
+from state_store.shared_backend import get_shared_backend
+
+logger = logging.getLogger(__name__)
+
+ATTACHMENT_INGESTION = os.environ.get("ATTACHMENT_INGESTION", "").lower() in (
+    "1",
+    "true",
+)
+# Estimated tokens (characters / 4) of attachment text added to a single request
+ATTACHMENT_TOKEN_BUDGET = int(os.environ.get("ATTACHMENT_TOKEN_BUDGET", "8000"))
+# Files are never downloaded past this many bytes; larger text files are truncated, larger PDFs skipped
+ATTACHMENT_MAX_BYTES = int(
+    os.environ.get("ATTACHMENT_MAX_BYTES", str(20 * 1024 * 1024))
+)
+ATTACHMENT_CACHE_DIR = "./data/attachments"
+ATTACHMENT_CACHE_TTL_SECONDS = float(
+    os.environ.get("ATTACHMENT_CACHE_TTL_SECONDS", str(7 * 24 * 3600))
+)
+ATTACHMENT_CACHE_MAX_BYTES = int(
+    os.environ.get("ATTACHMENT_CACHE_MAX_BYTES", str(256 * 1024 * 1024))
+)
+
+# Text extracted per file and kept in the cache, independent of the budget left in a given request
+_MAX_CACHED_CHARS = 4 * ATTACHMENT_TOKEN_BUDGET
+_CHUNK_SIZE = 64 * 1024
+_DOWNLOAD_TIMEOUT_SECONDS = 30
+# The cache directory is scanned for eviction at most this often, after a write
+_EVICTION_INTERVAL_SECONDS = 300
+_last_eviction = 0.0
+_eviction_lock = threading.Lock()
+_TEXT_FILETYPES = {
+    "text",
+    "csv",
+    "tsv",
+    "log",
+    "json",
+    "yaml",
+    "xml",
+    "markdown",
+    "post",
+    "python",
+    "javascript",
+    "typescript",
+    "java",
+    "go",
+    "shell",
+    "sql",
+    "diff",
+}
+_TEXT_MIMETYPES = ("text/", "application/json", "application/xml", "application/x-yaml")
+
+
+def _is_text(file: dict) -> bool:
+    return (
+        file.get("mode") == "snippet"
+        or file.get("filetype") in _TEXT_FILETYPES
+        or (file.get("mimetype") or "").startswith(_TEXT_MIMETYPES)
+    )
+
+
+def _is_pdf(file: dict) -> bool:
+    return file.get("filetype") == "pdf" or file.get("mimetype") == "application/pdf"
+
+
+def _cache_path(file: dict) -> Path:
+    # Snippets can be edited in place, so the key covers the file's version as well as its id
+    version = (
+        f"{file['id']}:{file.get('size')}:{file.get('created')}:{file.get('updated')}"
+    )
+    digest = hashlib.sha256(version.encode()).hexdigest()[:16]
+    return Path(ATTACHMENT_CACHE_DIR) / f"{file['id']}-{digest}.txt"
+
+
+def _open(token: str, file: dict):
+    url = file.get("url_private_download") or file.get("url_private")
+    request = urllib.request.Request(url, headers={"Authorization": f"Bearer {token}"})
+    response = urllib.request.urlopen(
+        request,
+        timeout=stage_timeout("attachments.download", _DOWNLOAD_TIMEOUT_SECONDS),
+    )
+    # Without the `files:read` scope Slack answers with its HTML sign-in page instead of the file
+    if (
+        response.headers.get_content_type() == "text/html"
+        and file.get("filetype") != "html"
+    ):
+        response.close()
+        raise PermissionError("Slack returned a sign-in page, is `files:read` granted?")
+    return response
+
+
+def _stream_text(token: str, file: dict) -> str:
+    """Decode the file chunk by chunk, stopping once enough text was extracted or the size cap is hit."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    parts = []
+    chars = 0
+    read = 0
+    truncated = False
+    with _open(token, file) as response:
+        while True:
+            raise_if_cancelled()
+            chunk = response.read(_CHUNK_SIZE)
+            if not chunk:
+                parts.append(decoder.decode(b"", final=True))
+                break
+            read += len(chunk)
+            text = decoder.decode(chunk)
+            parts.append(text)
+            chars += len(text)
+            if chars >= _MAX_CACHED_CHARS or read >= ATTACHMENT_MAX_BYTES:
+                truncated = True
+                break
+    text = "".join(parts)[:_MAX_CACHED_CHARS]
+    return f"{text}\n[truncated]" if truncated else text
+
+
+def _stream_pdf(token: str, file: dict) -> Optional[str]:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        logger.warning("[attachments] Install `pypdf` to read PDF attachments")
+        return None
+    if (file.get("size") or 0) > ATTACHMENT_MAX_BYTES:
+        logger.info(f"[attachments] Skipping {file['id']}: larger than the size cap")
+        return None
+
+    # PDFs need random access, so they are spooled to disk rather than held in memory
+    with tempfile.TemporaryFile() as spool:
+        read = 0
+        with _open(token, file) as response:
+            while chunk := response.read(_CHUNK_SIZE):
+                raise_if_cancelled()
+                read += len(chunk)
+                if read > ATTACHMENT_MAX_BYTES:
+                    return None
+                spool.write(chunk)
+        spool.seek(0)
+
+        # Pages are extracted one at a time, stopping once enough text was extracted
+        parts = []
+        chars = 0
+        for page in PdfReader(spool).pages:
+            text = page.extract_text() or ""
+            parts.append(text)
+            chars += len(text)
+            if chars >= _MAX_CACHED_CHARS:
+                return "\n".join(parts)[:_MAX_CACHED_CHARS] + "\n[truncated]"
+    return "\n".join(parts)
+
+
+def extract_file_text(token: str, file: dict) -> Optional[str]:
+    """Return the text of a shared file from the cache, or download and extract it. None if unreadable."""
+    if not file.get("id") or not (_is_text(file) or _is_pdf(file)):
+        return None
+
+    path = _cache_path(file)
+    backend = get_shared_backend()
+    cached = None
+    if backend is not None:
+        cached = backend.get(f"attachment:{path.stem}")
+    elif path.exists():
+        try:
+            cached = path.read_text()
+            # Recently used files are the last to be evicted
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+    if cached is not None:
+        logger.debug(f"[attachments] Cache hit for {file['id']}")
+        return cached
+
+    try:
+        logger.info(f"[attachments] Extracting {file['id']} ({file.get('filetype')})")
+        text = _stream_pdf(token, file) if _is_pdf(file) else _stream_text(token, file)
+    except RequestCancelled:
+        raise
+    except Exception as e:
+        logger.error(
+            f"[attachments] Failed to read {file['id']}: {type(e).__name__}: {e}"
+        )
+        return None
+    if text is None:
+        return None
+
+    if backend is not None:
+        backend.set(f"attachment:{path.stem}", text, ATTACHMENT_CACHE_TTL_SECONDS)
+        return text
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(".partial")
+    partial.write_text(text)
+    os.replace(partial, path)
+    _evict_cache()
+    return text
+
+
+def _evict_cache():
+    """Drop cached files unused for the TTL, then the least recently used ones past the size cap."""
+    global _last_eviction
+    with _eviction_lock:
+        now = time.time()
+        if now - _last_eviction < _EVICTION_INTERVAL_SECONDS:
+            return
+        _last_eviction = now
+
+        entries = []
+        for path in Path(ATTACHMENT_CACHE_DIR).glob("*.txt"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for used_at, size, path in entries:
+            expired = now - used_at >= ATTACHMENT_CACHE_TTL_SECONDS
+            if not expired and total <= ATTACHMENT_CACHE_MAX_BYTES:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+        if evicted:
+            logger.info(f"[attachments] Evicted {evicted} cached files")
+
+
+def _render_files(
+    token: str, files: Optional[List[dict]], budget_chars: int
+) -> Tuple[str, int]:
+    rendered = []
+    used = 0
+    for file in files or []:
+        name = file.get("name") or file.get("title") or file.get("id")
+        if used >= budget_chars:
+            rendered.append(
+                f"[Attached file {name}: left out, over the attachment budget]"
+            )
+            continue
+        text = extract_file_text(token, file)
+        if text is None:
+            rendered.append(f"[Attached file {name}: not readable]")
+            continue
+        text = text[: budget_chars - used]
+        used += len(text)
+        rendered.append(f"[Attached file {name}]\n{text}\n[End of {name}]")
+    return "\n".join(rendered), used
+
+
+def include_attachments(
+    token: str, prompt: str, files: Optional[List[dict]], context: Optional[List]
+) -> Tuple[str, Optional[List]]:
+    """
+    Append the text of the prompt's own files, then of the files in the context from newest to oldest,
+    until `ATTACHMENT_TOKEN_BUDGET` is spent. Context messages are copied, never modified in place.
+    """
+    if not ATTACHMENT_INGESTION:
+        return prompt, context
+
+    budget_chars = ATTACHMENT_TOKEN_BUDGET * 4
+    rendered, used = _render_files(token, files, budget_chars)
+    if rendered:
+        prompt = f"{prompt}\n{rendered}"
+
+    if not context:
+        return prompt, context
+    context = list(context)
+    for position in range(len(context) - 1, -1, -1):
+        message = context[position]
+        if not message.get("files"):
+            continue
+        rendered, message_used = _render_files(
+            token, message["files"], budget_chars - used
+        )
+        used += message_used
+        context[position] = {
+            **message,
+            "text": f"{message.get('text') or ''}\n{rendered}",
+        }
+    return prompt, context
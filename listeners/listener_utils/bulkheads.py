@@ -0,0 +1,161 @@
+# Separate thread pools for fast and slow listeners, so a backlog of LLM requests cannot starve the rest.
+# Bolt runs every listener on `fast_bulkhead`. LLM-backed listeners decorated with `@in_llm_bulkhead`
+# acknowledge the request and hand their work to `llm_bulkhead`, returning the fast thread right away.
+# When the LLM bulkhead's queue is full, the user gets an immediate "busy" message instead of a long wait.
+# How long requests wait for an LLM thread feeds the overload controller (see ai/overload.py).
+# Each request's deadline starts when it is accepted, so the wait counts against it (see ai/deadlines.py);
+# a request whose deadline passed in the queue gets the "busy" message instead of running.
+import functools
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from ai.deadlines import REQUEST_DEADLINE_SECONDS, deadline_scope, start_deadline
+from ai.overload import record_queue_wait
+from observability.metrics import increment, set_gauge
+from observability.tracing import ContextExecutor
+
+from .listener_constants import BUSY_TEXT
+
+logger = logging.getLogger(__name__)
+
+FAST_LISTENER_WORKERS = int(os.environ.get("FAST_LISTENER_WORKERS", "5"))
+LLM_LISTENER_WORKERS = int(os.environ.get("LLM_LISTENER_WORKERS", "8"))
+# Requests waiting for an LLM listener thread before new ones are turned away
+LLM_LISTENER_QUEUE = int(os.environ.get("LLM_LISTENER_QUEUE", "16"))
+
+
+class BulkheadFull(Exception):
+    pass
+
+
+class Bulkhead(ContextExecutor):
+    """A thread pool reporting its queue depth, and rejecting work past `max_queue` waiting tasks."""
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: int,
+        max_queue: Optional[int] = None,
+        on_wait: Optional[Callable[[float], None]] = None,
+    ):
+        super().__init__(max_workers=max_workers, thread_name_prefix=f"bulkhead-{name}")
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        # Called with the seconds each task waited for a thread
+        self.on_wait = on_wait
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self._pending - self.max_workers)
+
+    def submit(self, fn, /, *args, **kwargs):
+        with self._lock:
+            if (
+                self.max_queue is not None
+                and self._pending >= self.max_workers + self.max_queue
+            ):
+                increment("bulkhead_rejected", bulkhead=self.name)
+                raise BulkheadFull(f"The {self.name} bulkhead is saturated")
+            self._pending += 1
+            self._report()
+        if self.on_wait is not None:
+            fn = functools.partial(self._timed, fn, time.monotonic())
+        future = super().submit(fn, *args, **kwargs)
+        future.add_done_callback(self._task_done)
+        return future
+
+    def _timed(self, fn, submitted: float, *args, **kwargs):
+        self.on_wait(time.monotonic() - submitted)
+        return fn(*args, **kwargs)
+
+    def _task_done(self, future):
+        with self._lock:
+            self._pending -= 1
+            self._report()
+
+    def _report(self):
+        set_gauge("bulkhead_queue_depth", self.queue_depth, bulkhead=self.name)
+        set_gauge(
+            "bulkhead_active", min(self._pending, self.max_workers), bulkhead=self.name
+        )
+
+
+fast_bulkhead = Bulkhead("fast", FAST_LISTENER_WORKERS)
+llm_bulkhead = Bulkhead(
+    "llm", LLM_LISTENER_WORKERS, LLM_LISTENER_QUEUE, on_wait=record_queue_wait
+)
+
+
+def _reject(kwargs: dict):
+    """Tell the user right away that Bolty is too busy, through whatever the listener was given."""
+    event = kwargs.get("event")
+    command = kwargs.get("command")
+    if "fail" in kwargs:
+        kwargs["fail"](BUSY_TEXT)
+    elif event is not None and "say" in kwargs:
+        # Edits, deletions and the like are not questions waiting for an answer
+        if not event.get("subtype"):
+            thread_ts = event.get("thread_ts")
+            if event.get("type") == "app_mention":
+                thread_ts = thread_ts or event.get("ts")
+            kwargs["say"](text=BUSY_TEXT, thread_ts=thread_ts)
+    elif command is not None and "client" in kwargs:
+        kwargs["client"].chat_postEphemeral(
+            channel=command["channel_id"], user=command["user_id"], text=BUSY_TEXT
+        )
+
+
+def _send_busy(name: str, kwargs: dict):
+    try:
+        _reject(kwargs)
+    except Exception as e:
+        logger.error(f"[bulkheads] Failed to send the busy message for {name}: {e}")
+
+
+def _run_with_deadline(function, deadline, kwargs: dict):
+    with deadline_scope(deadline):
+        if deadline is not None and deadline.expired:
+            logger.warning(
+                f"[bulkheads] {function.__name__} timed out waiting for an LLM thread"
+            )
+            deadline.expire()
+            _send_busy(function.__name__, kwargs)
+            return
+        return function(**kwargs)
+
+
+def in_llm_bulkhead(function, deadline_seconds: float = REQUEST_DEADLINE_SECONDS):
+    """Decorator running an LLM-backed listener on `llm_bulkhead` within `deadline_seconds`, after acknowledging its request."""
+
+    @functools.wraps(function)
+    def wrapper(**kwargs):
+        # Slack expects the ack within 3 seconds, however long the queue; a second ack() is a no-op
+        if "ack" in kwargs:
+            kwargs["ack"]()
+        deadline = start_deadline(deadline_seconds)
+        try:
+            future = llm_bulkhead.submit(_run_with_deadline, function, deadline, kwargs)
+        except BulkheadFull:
+            logger.warning(
+                f"[bulkheads] Rejecting {function.__name__}: {llm_bulkhead.queue_depth} requests waiting"
+            )
+            if deadline is not None:
+                deadline.close()
+            _send_busy(function.__name__, kwargs)
+            return
+        future.add_done_callback(functools.partial(_log_error, function.__name__))
+
+    return wrapper
+
+
+def _log_error(name: str, future):
+    # Bolt no longer sees the errors of listeners it handed off, so they are logged here
+    error = future.exception()
+    if error is not None:
+        logger.error(f"[bulkheads] {name} failed: {error!r}", exc_info=error)
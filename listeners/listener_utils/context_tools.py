@@ -0,0 +1,178 @@
+# The Slack side of on-demand context (see `ai/context_tools.py`): tools reading the conversation a mention
+# or DM is answered in, backed by the Slack client and the app's caches. `get_thread_messages` reads the
+# current thread, compacted like the eager context; `search_channel` queries the channel's retrieval index,
+# backfilling it on first use; `get_user_name` resolves user IDs, cached for USER_NAME_CACHE_SECONDS,
+# in the shared backend in cluster mode. `prefetch()` is the eager context the listeners send otherwise.
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from slack_sdk import WebClient
+
+from ai.channel_index import get_channel_index
+from ai.compaction import compact_context
+from ai.context_tools import ContextTools, ToolSpec
+from state_store.shared_backend import get_shared_backend
+
+from .attachments import include_attachments
+from .parse_conversation import parse_conversation
+
+logger = logging.getLogger(__name__)
+
+# Number of messages fetched to seed a channel's retrieval index the first time the bot is mentioned there,
+# once per channel and process
+INDEX_BACKFILL_LIMIT = 200
+USER_NAME_CACHE_SECONDS = float(os.environ.get("USER_NAME_CACHE_SECONDS", "3600"))
+
+GET_THREAD_MESSAGES = ToolSpec(
+    name="get_thread_messages",
+    description=(
+        "Read the earlier messages of the Slack thread the question was asked in, oldest first, "
+        "as `user_id: text` lines. Long threads start with a summary of their older messages."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "limit": {
+                "type": "integer",
+                "description": "Only return this many of the most recent messages",
+            }
+        },
+    },
+)
+SEARCH_CHANNEL = ToolSpec(
+    name="search_channel",
+    description=(
+        "Search the Slack channel the question was asked in for the messages most relevant to a query, "
+        "along with its most recent messages, oldest first, as `user_id: text` lines."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "query": {"type": "string", "description": "Keywords to search for"}
+        },
+        "required": ["query"],
+    },
+)
+GET_USER_NAME = ToolSpec(
+    name="get_user_name",
+    description="Look up the display name of a Slack user ID such as U012AB3CD.",
+    parameters={
+        "type": "object",
+        "properties": {"user_id": {"type": "string"}},
+        "required": ["user_id"],
+    },
+)
+
+_user_names: Dict[str, Tuple[str, float]] = {}
+_user_names_lock = threading.Lock()
+
+
+def _render(context: Optional[List]) -> str:
+    if not context:
+        return "No messages."
+    return "\n".join(f"{message['user']}: {message['text']}" for message in context)
+
+
+class SlackContextTools(ContextTools):
+    """Context tools for the conversation `event` is answered in, leaving out the bot's waiting message."""
+
+    def __init__(self, client: WebClient, event: dict, waiting_message_ts: str):
+        self.client = client
+        self.channel_id = event.get("channel")
+        self.thread_ts = event.get("thread_ts")
+        self.user_id = event.get("user")
+        self.text = event.get("text") or ""
+        self.message_ts = event.get("ts")
+        self.exclude_ts = {waiting_message_ts, self.message_ts}
+        self.specs = [GET_USER_NAME]
+        if self.thread_ts:
+            self.specs.append(GET_THREAD_MESSAGES)
+        # DMs are not indexed
+        if event.get("channel_type") != "im":
+            self.specs.append(SEARCH_CHANNEL)
+
+    def prefetch(self) -> List[dict]:
+        if self.thread_ts:
+            return self.thread_context()
+        if SEARCH_CHANNEL in self.specs:
+            return self.channel_context(self.text)
+        return []
+
+    def thread_context(self) -> List[dict]:
+        conversation = self.client.conversations_replies(
+            channel=self.channel_id, ts=self.thread_ts, limit=200
+        )["messages"]
+        # Drop the waiting message and the message being answered, which is sent as the prompt
+        conversation = [
+            message for message in conversation if message["ts"] not in self.exclude_ts
+        ]
+        return compact_context(
+            self.user_id,
+            self.channel_id,
+            self.thread_ts,
+            parse_conversation(conversation),
+        )
+
+    def channel_context(self, query: str) -> List[dict]:
+        index = get_channel_index(self.channel_id)
+        if index.mark_backfilled():
+            logger.info(f"[context_tools] Backfilling retrieval index...")
+            try:
+                history = self.client.conversations_history(
+                    channel=self.channel_id, limit=INDEX_BACKFILL_LIMIT
+                )["messages"]
+            except Exception:
+                # Let the next mention in the channel try again
+                index.backfilled = False
+                raise
+            # Same filter as the live index in listeners/events/channel_messaged.py: Bolty's own posts carry `user` too
+            human_messages = [
+                message
+                for message in history
+                if "user" in message and not message.get("bot_id")
+            ]
+            index.add_messages(parse_conversation(human_messages))
+        return [
+            message
+            for message in index.select_context(query, exclude_ts=self.message_ts)
+            if message["ts"] not in self.exclude_ts
+        ]
+
+    def get_thread_messages(self, limit: Optional[int] = None) -> str:
+        context = self.thread_context()
+        if limit:
+            context = context[-limit:]
+        _, context = include_attachments(self.client.token, "", None, context)
+        return _render(context)
+
+    def search_channel(self, query: str) -> str:
+        return _render(self.channel_context(query))
+
+    def get_user_name(self, user_id: str) -> str:
+        user_id = user_id.strip("<@>")
+        backend = get_shared_backend()
+        if backend is not None:
+            name = backend.get(f"user_name:{user_id}")
+        else:
+            with _user_names_lock:
+                name, expires_at = _user_names.get(user_id, (None, 0.0))
+            if expires_at < time.monotonic():
+                name = None
+        if name:
+            return name
+
+        user = self.client.users_info(user=user_id)["user"]
+        profile = user.get("profile") or {}
+        name = profile.get("display_name") or user.get("real_name") or user["name"]
+        if backend is not None:
+            backend.set(f"user_name:{user_id}", name, USER_NAME_CACHE_SECONDS)
+        else:
+            with _user_names_lock:
+                _user_names[user_id] = (
+                    name,
+                    time.monotonic() + USER_NAME_CACHE_SECONDS,
+                )
+        return name
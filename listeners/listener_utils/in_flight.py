@@ -0,0 +1,83 @@
+# Tracks the request answering each DM conversation by `(channel, thread_ts)`, so that a newer message,
+# an edit or a deletion of a message it answers can cancel it through its `CancellationToken`.
+# A new message or an edit supersedes the conversation's request in flight and carries its messages over,
+# so messages sent in quick succession are answered together, once no newer one arrives within the debounce window.
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from ai.cancellation import CancellationToken
+
+SUPERSEDE_REQUESTS = os.environ.get("SUPERSEDE_REQUESTS", "").lower() in ("1", "true")
+SUPERSEDE_DEBOUNCE_SECONDS = float(os.environ.get("SUPERSEDE_DEBOUNCE_SECONDS", "1.0"))
+
+
+class InFlightRequest:
+    def __init__(self, key: Tuple[str, str], event: dict, waiting_message_ts: str):
+        self.key = key
+        self.event = event
+        self.waiting_message_ts = waiting_message_ts
+        self.token = CancellationToken()
+        # The messages this request answers as (ts, text), oldest first
+        self.messages: List[Tuple[str, str]] = [
+            (event.get("ts"), event.get("text") or "")
+        ]
+
+    @property
+    def text(self) -> str:
+        return "\n".join(text for _, text in self.messages if text)
+
+
+class InFlightRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests: Dict[Tuple[str, str], InFlightRequest] = {}
+
+    def start(
+        self, event: dict, waiting_message_ts: str, reason: str = "superseded"
+    ) -> InFlightRequest:
+        """Track a request for `event`, taking over the messages of the one in flight in the same conversation."""
+        key = (event.get("channel"), event.get("thread_ts") or "")
+        request = InFlightRequest(key, event, waiting_message_ts)
+        with self._lock:
+            previous = self._requests.get(key)
+            self._requests[key] = request
+            if previous is not None:
+                # An edited message replaces its earlier text instead of repeating it
+                request.messages = sorted(
+                    [m for m in previous.messages if m[0] != event.get("ts")]
+                    + request.messages,
+                    key=lambda message: float(message[0] or 0),
+                )
+        if previous is not None:
+            previous.token.cancel(reason)
+        return request
+
+    def find(self, channel_id: str, message_ts: str) -> Optional[InFlightRequest]:
+        """The request in flight answering the message sent at `message_ts`, if any."""
+        with self._lock:
+            for request in self._requests.values():
+                if request.key[0] == channel_id and any(
+                    ts == message_ts for ts, _ in request.messages
+                ):
+                    return request
+        return None
+
+    def discard_message(self, request: InFlightRequest, message_ts: str) -> bool:
+        """Stop answering a deleted message; returns whether the request has others left to answer."""
+        with self._lock:
+            request.messages = [m for m in request.messages if m[0] != message_ts]
+            if request.messages:
+                return True
+            if self._requests.get(request.key) is request:
+                del self._requests[request.key]
+        request.token.cancel("deleted")
+        return False
+
+    def finish(self, request: InFlightRequest):
+        with self._lock:
+            if self._requests.get(request.key) is request:
+                del self._requests[request.key]
+
+
+in_flight = InFlightRegistry()
@@ -0,0 +1,47 @@
+# Slack clients for work that finishes after its event was acknowledged: batched summaries and durable jobs.
+# That work keeps a reference to its installation instead of a token, and gets a client for it when it
+# runs: function tokens only last as long as their execution, and a workspace can reinstall the app.
+# With an installation store (app_oauth.py), the installation's current bot token is looked up there;
+# without one (app.py), the app's own client already belongs to the only installation.
+# Both apps call `set_app(app)` before resuming such work.
+from typing import Optional
+
+from slack_bolt import App, BoltContext
+from slack_sdk import WebClient
+
+from observability.tracing import TracedWebClient
+
+_app: Optional[App] = None
+
+
+def set_app(app: App):
+    global _app
+    _app = app
+
+
+def installation_of(context: BoltContext) -> dict:
+    """The reference to the request's installation that `client_for()` resolves later."""
+    return {
+        "enterprise_id": context.enterprise_id,
+        "team_id": context.team_id,
+        "is_enterprise_install": context.is_enterprise_install,
+    }
+
+
+def client_for(installation: dict) -> WebClient:
+    if _app is None:
+        raise RuntimeError("No app to authorize with, call set_app() at startup")
+    installation_store = _app.installation_store
+    if installation_store is None:
+        return _app.client
+    bot = installation_store.find_bot(
+        enterprise_id=installation.get("enterprise_id"),
+        team_id=installation.get("team_id"),
+        is_enterprise_install=installation.get("is_enterprise_install"),
+    )
+    if bot is None:
+        raise RuntimeError(f"The app is no longer installed for {installation}")
+    # Shares the app client's keep-alive connection pool, like the clients Bolt builds per event
+    client = TracedWebClient.from_client(_app.client)
+    client.token = bot.bot_token
+    return client
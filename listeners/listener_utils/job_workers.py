@@ -0,0 +1,220 @@
+# A worker pool draining the durable job queue, so LLM work survives deploys and crashes.
+# Opt in with DURABLE_JOB_QUEUE=true. Listeners post their placeholder, enqueue a job and return;
+# the workers run the handler registered for the job's kind and update the placeholder on failure.
+# Each run gets its own deadline (see ai/deadlines.py); a job that times out is not retried.
+# Handlers generate their response through `job_response()` and post it with `send_response()`, which
+# checkpoint the job, so a retry after a partial post sends the rest of the same response.
+# Superseding DMs (SUPERSEDE_REQUESTS) tracks requests in memory and is not supported with the job queue.
+# Jobs keep a reference to their installation, and each one is run and reported with a client for it
+# (see installation_clients.py), so the workers serve every workspace of an OAuth install.
+import contextvars
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from slack_sdk import WebClient
+
+from ai.deadlines import deadline_scope, start_deadline
+from observability.tracing import start_span, trace_id_for_event
+from state_store.job_queue import JobQueue
+
+from .in_flight import SUPERSEDE_REQUESTS
+from .installation_clients import client_for
+from .listener_constants import TIMEOUT_TEXT
+from .message_utils import send_long_message
+
+logger = logging.getLogger(__name__)
+
+DURABLE_JOB_QUEUE = os.environ.get("DURABLE_JOB_QUEUE", "").lower() in ("1", "true")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "8"))
+JOB_VISIBILITY_TIMEOUT = float(os.environ.get("JOB_VISIBILITY_TIMEOUT", "300"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+# Jobs older than this when the bot restarts are failed instead of answered late
+JOB_MAX_AGE_SECONDS = float(os.environ.get("JOB_MAX_AGE_SECONDS", "900"))
+JOB_RETRY_DELAY_SECONDS = 5.0
+
+INTERRUPTED_TEXT = (
+    "Sorry, Bolty was restarted before it could answer. Please ask again."
+)
+
+JobHandler = Callable[[WebClient, dict, str, logging.Logger], None]
+
+_handlers: Dict[str, JobHandler] = {}
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+_job_available = threading.Event()
+_running_jobs = set()
+_running_jobs_lock = threading.Lock()
+_current_job: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar(
+    "job", default=None
+)
+
+
+def register_job_handler(kind: str, handler: JobHandler):
+    _handlers[kind] = handler
+
+
+def _get_queue() -> JobQueue:
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
+
+
+def enqueue_job(
+    kind: str, event: dict, channel_id: str, placeholder_ts: str, installation: dict
+) -> int:
+    job_id = _get_queue().enqueue(kind, event, channel_id, placeholder_ts, installation)
+    _job_available.set()
+    return job_id
+
+
+def start_job_workers(workers: int = JOB_WORKERS):
+    """Recover jobs left over by the previous process, then start the worker and heartbeat threads."""
+    if SUPERSEDE_REQUESTS:
+        logger.warning(
+            "[job_workers] SUPERSEDE_REQUESTS is not supported with DURABLE_JOB_QUEUE, "
+            "DMs are answered one by one"
+        )
+    _recover()
+    for number in range(workers):
+        threading.Thread(target=_work, name=f"job-worker-{number}", daemon=True).start()
+    threading.Thread(target=_heartbeat, name="job-heartbeat", daemon=True).start()
+    logger.info(f"[job_workers] Started {workers} workers")
+
+
+def _recover():
+    queue = _get_queue()
+    for job in queue.unfinished():
+        if time.time() - job["created_at"] > JOB_MAX_AGE_SECONDS:
+            logger.warning(f"[job_workers] Failing stale job {job['id']}")
+            queue.dead_letter(job["id"], "Stale after restart")
+            _update_placeholder(job, INTERRUPTED_TEXT)
+        else:
+            logger.info(f"[job_workers] Resuming job {job['id']} ({job['kind']})")
+            queue.release(job["id"])
+
+
+def _work():
+    queue = _get_queue()
+    while True:
+        job = queue.claim(JOB_VISIBILITY_TIMEOUT)
+        if job is None:
+            _job_available.wait(1.0)
+            _job_available.clear()
+            continue
+
+        with _running_jobs_lock:
+            _running_jobs.add(job["id"])
+        deadline = start_deadline()
+        reset = _current_job.set(job)
+        try:
+            logger.info(
+                f"[job_workers] Running job {job['id']} ({job['kind']}, attempt {job['attempts']})"
+            )
+            # Jobs join the trace of the event they answer
+            with deadline_scope(deadline):
+                with start_span(
+                    f"job.{job['kind']}",
+                    {"job.id": job["id"], "job.attempt": job["attempts"]},
+                    trace_id=trace_id_for_event(job["payload"]),
+                ):
+                    _handlers[job["kind"]](
+                        client_for(job["installation"]),
+                        job["payload"],
+                        job["placeholder_ts"],
+                        logger,
+                    )
+            queue.complete(job["id"])
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            logger.error(
+                f"[job_workers] Job {job['id']} failed: {error}", exc_info=True
+            )
+            if deadline is not None and deadline.expired:
+                # The user has waited long enough; a retry would answer even later
+                queue.dead_letter(job["id"], error)
+                _update_placeholder(job, TIMEOUT_TEXT)
+            elif job["attempts"] < JOB_MAX_ATTEMPTS:
+                queue.retry(job["id"], error, JOB_RETRY_DELAY_SECONDS * job["attempts"])
+            else:
+                queue.dead_letter(job["id"], error)
+                _update_placeholder(job, f"Received an error from Bolty:\n{error}")
+        finally:
+            _current_job.reset(reset)
+            with _running_jobs_lock:
+                _running_jobs.discard(job["id"])
+
+
+def job_response(generate: Callable[[], str]) -> str:
+    """Generate the running job's response once: a retry reuses the response of the failed attempt."""
+    job = _current_job.get()
+    if job is None:
+        return generate()
+    if job["response"] is not None:
+        logger.info(f"[job_workers] Reusing the response of job {job['id']}")
+        return job["response"]
+    response = generate()
+    _get_queue().save_response(job["id"], response)
+    job["response"] = response
+    return response
+
+
+def send_response(
+    client: WebClient,
+    channel_id: str,
+    thread_ts: str,
+    waiting_message_ts: str,
+    response: str,
+):
+    """`send_long_message()`, skipping the chunks a failed attempt of the running job already posted."""
+    job = _current_job.get()
+    if job is None:
+        send_long_message(client, channel_id, thread_ts, waiting_message_ts, response)
+        return
+
+    def checkpoint(posted_chunks: int):
+        _get_queue().set_posted_chunks(job["id"], posted_chunks)
+        job["posted_chunks"] = posted_chunks
+
+    send_long_message(
+        client,
+        channel_id,
+        thread_ts,
+        waiting_message_ts,
+        response,
+        posted_chunks=job["posted_chunks"],
+        on_chunk_posted=checkpoint,
+    )
+
+
+def _heartbeat():
+    # Keep long-running jobs invisible to other workers while they are still being processed
+    while True:
+        time.sleep(JOB_VISIBILITY_TIMEOUT / 3)
+        with _running_jobs_lock:
+            job_ids = list(_running_jobs)
+        try:
+            _get_queue().extend(job_ids, JOB_VISIBILITY_TIMEOUT)
+        except Exception as e:
+            logger.error(f"[job_workers] Heartbeat failed: {e}", exc_info=True)
+
+
+def _update_placeholder(job: dict, text: str):
+    if not job["placeholder_ts"]:
+        return
+    if job["posted_chunks"]:
+        # The placeholder already holds the start of the answer
+        logger.warning(
+            f"[job_workers] Job {job['id']} failed after posting {job['posted_chunks']} chunks"
+        )
+        return
+    try:
+        client_for(job["installation"]).chat_update(
+            channel=job["channel_id"], ts=job["placeholder_ts"], text=text
+        )
+    except Exception as e:
+        logger.error(f"[job_workers] Failed to update placeholder: {e}", exc_info=True)
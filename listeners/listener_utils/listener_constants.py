@@ -1,6 +1,7 @@
 # This file defines constant messages used by the Slack bot for when a user mentions the bot without text,
-# when summarizing a channel's conversation history, and a default loading message.
-# Used in `app_mentioned_callback`, `dm_sent_callback`, and `handle_summary_function_callback`.
+# when summarizing a channel's conversation history or several channels into a digest, a default loading message,
+# and the messages replacing it when a request is superseded, turned away or timed out.
+# Used in `app_mentioned_callback`, `dm_sent_callback`, `handle_summary_function_callback` and `digest_callback`.
 
 MENTION_WITHOUT_TEXT = """
 Hi there! You didn't provide a message with your mention.
@@ -11,4 +12,19 @@ A user has just joined this Slack channel.
 Please create a quick summary of the conversation in this channel to help them catch up.
 Don't use user IDs or names in your response.
 """
+DIGEST_CHANNEL_PROMPT = """
+Summarize what happened in the #{channel} Slack channel in at most five short bullet points:
+decisions, open questions, blockers and anything that needs a manager's attention.
+Don't use user IDs or names in your response.
+"""
+DIGEST_MERGE_PROMPT = """
+The context holds one summary per Slack channel. Merge them into a single digest for a manager:
+start with the few items that need attention across channels, then one short line per channel.
+Keep the channel names as they are written.
+"""
 DEFAULT_LOADING_TEXT = "Thinking..."
+SUPERSEDED_TEXT = "Answering your newer message instead."
+BUSY_TEXT = (
+    "Bolty is handling a lot of requests right now. Please try again in a minute."
+)
+TIMEOUT_TEXT = "Sorry, Bolty took too long to answer and gave up. Please try again."
@@ -1,4 +1,7 @@
 # Utility functions for handling Slack message operations
+from typing import Callable, Optional
+
+from observability.tracing import start_span
 
 # Slack's message limit is 4,000 characters, use 3,900 to be safe
 MAX_MESSAGE_LENGTH = 3900
@@ -38,18 +41,37 @@ def split_message(text: str, max_length: int = MAX_MESSAGE_LENGTH) -> list[str]:
 
 
 def send_long_message(
-    client, channel_id: str, thread_ts: str, waiting_message_ts: str, text: str
+    client,
+    channel_id: str,
+    thread_ts: str,
+    waiting_message_ts: str,
+    text: str,
+    posted_chunks: int = 0,
+    on_chunk_posted: Optional[Callable[[int], None]] = None,
 ):
     """
     Send a potentially long message, splitting into multiple messages if needed.
     Updates the waiting message with the first chunk, then posts additional
     messages as replies in the thread.
+    Skips the first `posted_chunks` chunks, and calls `on_chunk_posted` with the number
+    of chunks posted so far after each one, so an interrupted send can be resumed.
     """
     chunks = split_message(text)
 
-    # Update the waiting message with the first chunk
-    client.chat_update(channel=channel_id, ts=waiting_message_ts, text=chunks[0])
-
-    # Post remaining chunks as separate messages in the thread
-    for chunk in chunks[1:]:
-        client.chat_postMessage(channel=channel_id, thread_ts=thread_ts, text=chunk)
+    with start_span(
+        "slack.send_long_message",
+        {"slack.chunks": len(chunks), "slack.response_chars": len(text)},
+    ):
+        for number, chunk in enumerate(chunks[posted_chunks:], start=posted_chunks):
+            if number == 0:
+                # Update the waiting message with the first chunk
+                client.chat_update(
+                    channel=channel_id, ts=waiting_message_ts, text=chunk
+                )
+            else:
+                # Post remaining chunks as separate messages in the thread
+                client.chat_postMessage(
+                    channel=channel_id, thread_ts=thread_ts, text=chunk
+                )
+            if on_chunk_posted is not None:
+                on_chunk_posted(number + 1)
@@ -1,4 +1,4 @@
-from typing import Optional, List
+from typing import List
 from slack_sdk.web.slack_response import SlackResponse
 import logging
 
@@ -6,20 +6,50 @@ logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
 """
-Parses a conversation history, excluding messages from the bot,
-and formats it as a string with user IDs and their messages.
+Parses a conversation history into the messages sent as context, with their user IDs.
+Bot replies are kept and flagged with `bot`; bot messages without a `user` use their `bot_id` instead.
+Joins, topic changes and other messages without content are skipped, as is any malformed message,
+so one odd message never costs the rest of the context.
 Used in `app_mentioned_callback`, `dm_sent_callback`,
 and `handle_summary_function_callback`."""
 
+# Subtypes that carry no message content of their own
+SKIPPED_SUBTYPES = {
+    "channel_join",
+    "channel_leave",
+    "channel_topic",
+    "channel_purpose",
+    "channel_name",
+    "channel_archive",
+    "channel_unarchive",
+    "group_join",
+    "group_leave",
+    "pinned_item",
+    "unpinned_item",
+    "tombstone",
+}
 
-def parse_conversation(conversation: SlackResponse) -> Optional[List[dict]]:
+
+def parse_conversation(conversation: SlackResponse) -> List[dict]:
     parsed = []
-    try:
-        for message in conversation:
-            user = message["user"]
-            text = message["text"]
-            parsed.append({"user": user, "text": text})
-        return parsed
-    except Exception as e:
-        logger.error(e)
-        return None
+    for message in conversation:
+        if not isinstance(message, dict) or message.get("subtype") in SKIPPED_SUBTYPES:
+            continue
+        user = message.get("user") or message.get("bot_id")
+        text = message.get("text") or ""
+        files = message.get("files") or []
+        if not user or not (text or files):
+            logger.debug(
+                f"Skipping message without a sender or content: {message.get('ts')}"
+            )
+            continue
+        parsed.append(
+            {
+                "user": user,
+                "text": text,
+                "ts": message.get("ts"),
+                "bot": "bot_id" in message,
+                "files": files,
+            }
+        )
+    return parsed
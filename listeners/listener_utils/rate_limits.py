@@ -0,0 +1,58 @@
+# Client-side rate limiting for listeners that call one Slack Web API method many times in a row,
+# such as the digest fetching the history of dozens of channels. Callers share a `RateLimiter` per method,
+# and `call_rate_limited` waits for it before each call, then retries calls Slack still rate limits
+# after the `Retry-After` it asks for.
+import logging
+import threading
+import time
+
+from slack_sdk.errors import SlackApiError
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """A token bucket allowing `per_minute` calls a minute on average, in bursts of up to `burst` calls."""
+
+    def __init__(self, per_minute: float, burst: int = 1):
+        self.interval = 60.0 / per_minute
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) / self.interval
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) * self.interval
+            time.sleep(wait)
+
+
+def _retry_after(error: SlackApiError) -> float:
+    for name, value in error.response.headers.items():
+        if name.lower() == "retry-after":
+            return float(value)
+    return 1.0
+
+
+def call_rate_limited(limiter: RateLimiter, method, max_retries: int = 3, **kwargs):
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
+        try:
+            return method(**kwargs)
+        except SlackApiError as e:
+            if e.response.status_code != 429 or attempt == max_retries:
+                raise e
+            retry_after = _retry_after(e)
+            logger.warning(
+                f"[rate_limits] {e.response.api_url} rate limited, retrying in {retry_after}s"
+            )
+            time.sleep(retry_after)
@@ -0,0 +1,125 @@
+# A keep-alive connection pool shared by every Slack Web API call, instead of the new connection and
+# TLS handshake slack_sdk's urllib transport pays for on each call. A `TracedWebClient` given a transport
+# sends its requests through it. Bolt builds a plain `WebClient` for every event, so
+# `slack_transport_middleware` swaps it for one on the shared transport, which the tracing and recording
+# middleware keep. HTTP/2 is used when the `h2` package is installed, multiplexing concurrent calls
+# over the same connections. With request deadlines on, the event's client is swapped even without the pool,
+# as only a `TracedWebClient` caps its calls' timeouts at the time left (see ai/deadlines.py).
+import atexit
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+from urllib.error import URLError
+
+import httpx
+from slack_sdk.errors import SlackRequestError
+
+from ai.deadlines import REQUEST_DEADLINE_SECONDS
+from observability.metrics import increment
+from observability.tracing import TracedWebClient, replace_client
+
+logger = logging.getLogger(__name__)
+
+SLACK_HTTP_POOL = os.environ.get("SLACK_HTTP_POOL", "").lower() in ("1", "true")
+SLACK_HTTP_MAX_CONNECTIONS = int(os.environ.get("SLACK_HTTP_MAX_CONNECTIONS", "20"))
+SLACK_HTTP_KEEPALIVE_SECONDS = float(
+    os.environ.get("SLACK_HTTP_KEEPALIVE_SECONDS", "60")
+)
+SLACK_HTTP_CONNECT_TIMEOUT = float(os.environ.get("SLACK_HTTP_CONNECT_TIMEOUT", "5"))
+# Per call, covering the wait for a pooled connection and the response
+SLACK_HTTP_TIMEOUT = int(os.environ.get("SLACK_HTTP_TIMEOUT", "30"))
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class PooledTransport:
+    """Sends Slack Web API requests over a bounded pool of keep-alive connections, safe to share across threads."""
+
+    def __init__(
+        self,
+        max_connections: int = SLACK_HTTP_MAX_CONNECTIONS,
+        keepalive_seconds: float = SLACK_HTTP_KEEPALIVE_SECONDS,
+        connect_timeout: float = SLACK_HTTP_CONNECT_TIMEOUT,
+        http2: Optional[bool] = None,
+    ):
+        self.http2 = _http2_available() if http2 is None else http2
+        self.connect_timeout = connect_timeout
+        self._client = httpx.Client(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=keepalive_seconds,
+            ),
+            # A client with its own proxy falls back to urllib, see `TracedWebClient`
+            trust_env=False,
+        )
+
+    def send(
+        self, url: str, body: bytes, headers: Dict[str, str], timeout: float
+    ) -> Dict[str, Any]:
+        """POST `body` to `url`, returning the response's `{"status", "headers", "body"}`."""
+        if not url.lower().startswith("http"):
+            raise SlackRequestError(f"Invalid URL detected: {url}")
+        try:
+            response = self._client.post(
+                url,
+                content=body,
+                headers={name: str(value) for name, value in headers.items()},
+                timeout=httpx.Timeout(timeout, connect=self.connect_timeout),
+            )
+        except httpx.TimeoutException as e:
+            increment("slack_http_errors", kind="timeout")
+            raise TimeoutError(f"Slack API request timed out: {e}") from e
+        except httpx.TransportError as e:
+            increment("slack_http_errors", kind="connection")
+            # slack_sdk's connection error retry handler retries `URLError`s
+            raise URLError(e) from e
+
+        headers = dict(response.headers)
+        if headers.get("content-type", "").startswith("application/gzip"):
+            # admin.analytics.getFile
+            body = response.content
+        else:
+            body = response.content.decode(response.charset_encoding or "utf-8")
+        return {"status": response.status_code, "headers": headers, "body": body}
+
+    def close(self):
+        self._client.close()
+
+
+_transport: Optional[PooledTransport] = None
+_transport_lock = threading.Lock()
+
+
+def get_slack_transport() -> Optional[PooledTransport]:
+    """The transport shared by every Slack client, or None to keep slack_sdk's urllib transport."""
+    global _transport
+    if not SLACK_HTTP_POOL:
+        return None
+    with _transport_lock:
+        if _transport is None:
+            _transport = PooledTransport()
+            atexit.register(_transport.close)
+            logger.info(
+                f"[slack_transport] Pooling up to {SLACK_HTTP_MAX_CONNECTIONS} connections over "
+                f"{'HTTP/2' if _transport.http2 else 'HTTP/1.1 (install h2 for HTTP/2)'}"
+            )
+        return _transport
+
+
+def slack_transport_middleware(context, next):
+    """Bolt global middleware swapping the request's `WebClient` for one on the shared pool that honors deadlines."""
+    transport = get_slack_transport()
+    if transport is not None or REQUEST_DEADLINE_SECONDS > 0:
+        replace_client(
+            context, TracedWebClient.from_client(context.client, transport=transport)
+        )
+    return next()
@@ -0,0 +1,175 @@
+# Speculative responses: post a fast draft first, then replace it with the full answer.
+# Opt in with SPECULATIVE_MODE=true. Used in `app_mentioned_callback` and `app_messaged_callback`.
+import logging
+import os
+import re
+import threading
+from typing import List, Optional
+
+from ai.cancellation import CancellationToken, RequestCancelled, cancellable
+from ai.model_router import DEEP_REASONING_CUES, Route
+from ai.providers import get_provider_response, resolve_route
+from observability.tracing import ContextExecutor
+
+from .bulkheads import LLM_LISTENER_WORKERS
+from .message_utils import MAX_MESSAGE_LENGTH
+
+logger = logging.getLogger(__name__)
+
+SPECULATIVE_MODE = os.environ.get("SPECULATIVE_MODE", "").lower() in ("1", "true")
+DRAFT_PROVIDER = os.environ.get("SPECULATIVE_DRAFT_PROVIDER", "openai")
+DRAFT_MODEL = os.environ.get("SPECULATIVE_DRAFT_MODEL", "gpt-4.1-nano")
+# How long the full request waits for the draft, so a confident draft can skip it entirely
+DRAFT_HEAD_START_SECONDS = float(os.environ.get("SPECULATIVE_HEAD_START", "1.5"))
+
+DRAFT_MARKER = ":zap: _Quick draft. A more thorough answer is on its way..._"
+DRAFT_SUFFICIENT_REASON = "draft was sufficient"
+
+# Prompts that need fresh information or careful reasoning always get the full answer
+_NEEDS_FULL_ANSWER = re.compile(
+    r"\b(today|latest|current(ly)?|news|price|weather|recent|this week|search|https?://)\b",
+    re.IGNORECASE,
+)
+_HEDGING = re.compile(
+    r"(i'm not sure|i am not sure|i don't know|i do not have access|as of my|knowledge cutoff"
+    r"|i can't|i cannot|not able to|unable to)",
+    re.IGNORECASE,
+)
+_MAX_CONFIDENT_PROMPT_LENGTH = 300
+_MAX_CONFIDENT_CONTEXT_ITEMS = 10
+_MAX_CONFIDENT_DRAFT_LENGTH = 800
+
+# Drafts run here while the full answer runs on the listener's own thread. Each LLM listener
+# thread has at most one draft in flight, so this pool never limits concurrency below the bulkhead.
+_draft_executor = ContextExecutor(
+    max_workers=LLM_LISTENER_WORKERS, thread_name_prefix="speculative"
+)
+
+
+def is_draft_sufficient(prompt: str, context: Optional[List], draft: str) -> bool:
+    """
+    Cheap confidence check: a short, self-contained question answered by a short,
+    non-hedging draft does not need the full model.
+    """
+    return (
+        len(prompt) <= _MAX_CONFIDENT_PROMPT_LENGTH
+        and len(context or []) <= _MAX_CONFIDENT_CONTEXT_ITEMS
+        and not _NEEDS_FULL_ANSWER.search(prompt)
+        and not DEEP_REASONING_CUES.search(prompt)
+        and 0 < len(draft) <= _MAX_CONFIDENT_DRAFT_LENGTH
+        and not _HEDGING.search(draft)
+    )
+
+
+def respond_speculatively(
+    client,
+    channel_id: str,
+    waiting_message_ts: str,
+    user_id: str,
+    prompt: str,
+    context: Optional[List],
+    system_content: str,
+    listener: str,
+    thread_ts: Optional[str] = None,
+    message_ts: Optional[str] = None,
+) -> str:
+    """
+    Generate the answer to `prompt`, showing a fast-model draft in the waiting message while
+    the full model runs in parallel. Returns the final answer for the caller to post.
+    Only the full answer continues the thread's response chain.
+    """
+    route = resolve_route(user_id, prompt, context, listener)
+    if route["model"] == DRAFT_MODEL:
+        logger.info(f"[speculative] {listener} already routed to {DRAFT_MODEL}")
+        return get_provider_response(
+            user_id,
+            prompt,
+            context,
+            system_content,
+            channel_id=channel_id,
+            listener=listener,
+            route=route,
+            thread_ts=thread_ts,
+            message_ts=message_ts,
+        )
+
+    draft_done = threading.Event()
+    draft_sufficient = threading.Event()
+    draft_token = CancellationToken()
+    full_token = CancellationToken()
+
+    def run_draft() -> Optional[str]:
+        try:
+            with cancellable(draft_token):
+                draft = get_provider_response(
+                    user_id,
+                    prompt,
+                    context,
+                    system_content,
+                    channel_id=channel_id,
+                    listener=f"{listener}_draft",
+                    route=Route(
+                        provider=DRAFT_PROVIDER,
+                        model=DRAFT_MODEL,
+                        reasoning_effort=None,
+                        reason="speculative draft",
+                    ),
+                    web_search=False,
+                )
+            if is_draft_sufficient(prompt, context, draft):
+                logger.info(f"[speculative] Draft is sufficient for {listener}")
+                draft_sufficient.set()
+                full_token.cancel(DRAFT_SUFFICIENT_REASON)
+            elif not draft_token.cancelled:
+                text = f"{DRAFT_MARKER}\n\n{draft}"
+                client.chat_update(
+                    channel=channel_id,
+                    ts=waiting_message_ts,
+                    text=text[:MAX_MESSAGE_LENGTH],
+                )
+            return draft
+        except Exception as e:
+            logger.warning(
+                f"[speculative] Draft failed, waiting for the full answer: {type(e).__name__}: {e}"
+            )
+            return None
+        finally:
+            draft_done.set()
+
+    draft_answer = _draft_executor.submit(run_draft)
+
+    try:
+        # A confident draft within the head start saves the full request altogether
+        draft_done.wait(DRAFT_HEAD_START_SECONDS)
+        if draft_sufficient.is_set():
+            return draft_answer.result()
+        with cancellable(full_token):
+            return get_provider_response(
+                user_id,
+                prompt,
+                context,
+                system_content,
+                channel_id=channel_id,
+                listener=listener,
+                route=route,
+                thread_ts=thread_ts,
+                message_ts=message_ts,
+            )
+    except RequestCancelled as e:
+        if e.reason != DRAFT_SUFFICIENT_REASON:
+            raise
+        logger.info(f"[speculative] Cancelled the full request for {listener}")
+        return draft_answer.result()
+    except Exception as e:
+        # Keep the draft the user already sees rather than replacing it with an error
+        draft = draft_answer.result()
+        if not draft:
+            raise
+        logger.warning(
+            f"[speculative] Full request failed, keeping the draft: {type(e).__name__}: {e}"
+        )
+        return draft
+    finally:
+        # The draft must not replace the final answer once the caller posts it
+        draft_token.cancel("full answer is ready")
+        draft_done.wait()
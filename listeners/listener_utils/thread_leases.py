@@ -0,0 +1,60 @@
+# In cluster mode, makes sure only one replica at a time answers in a given conversation: a thread,
+# or a DM's top-level messages. `@thread_leased` handlers first take the conversation's lease in the
+# shared backend, waiting up to CLUSTER_LEASE_WAIT_SECONDS while another replica holds it, so messages
+# in the same thread are answered one after the other, each with the previous answer in its context.
+# A replica that dies loses its leases after CLUSTER_LEASE_SECONDS.
+import functools
+import os
+from logging import Logger
+from typing import Optional
+
+from slack_sdk import WebClient
+
+from ai.cancellation import current_cancellation, raise_if_cancelled
+from observability.metrics import increment
+from state_store.shared_backend import Lease, LeaseTimeout, get_shared_backend
+
+CLUSTER_LEASE_SECONDS = float(os.environ.get("CLUSTER_LEASE_SECONDS", "30"))
+CLUSTER_LEASE_WAIT_SECONDS = float(os.environ.get("CLUSTER_LEASE_WAIT_SECONDS", "300"))
+
+
+def conversation_key(event: dict) -> Optional[str]:
+    """The conversation an event is answered in, or None for a mention starting a new thread."""
+    if event.get("thread_ts"):
+        return f"{event.get('channel')}:{event['thread_ts']}"
+    if event.get("channel_type") == "im":
+        return f"{event.get('channel')}:"
+    return None
+
+
+def thread_leased(function):
+    """Decorator for `(client, event, waiting_message_ts, logger)` handlers, run under the conversation's lease."""
+
+    @functools.wraps(function)
+    def wrapper(
+        client: WebClient, event: dict, waiting_message_ts: str, logger: Logger
+    ):
+        backend = get_shared_backend()
+        key = conversation_key(event)
+        if backend is None or key is None:
+            return function(client, event, waiting_message_ts, logger)
+
+        lease = Lease(backend, f"lease:{key}", CLUSTER_LEASE_SECONDS)
+        try:
+            acquired = lease.acquire(CLUSTER_LEASE_WAIT_SECONDS, current_cancellation())
+        except Exception as e:
+            # Better a rare concurrent answer than none while the backend is unreachable
+            logger.warning(f"[thread_leases] Answering {key} without a lease: {e}")
+            return function(client, event, waiting_message_ts, logger)
+        if not acquired:
+            raise_if_cancelled()
+            increment("lease_timeouts")
+            raise LeaseTimeout(
+                f"Another replica is still answering in this conversation after {CLUSTER_LEASE_WAIT_SECONDS:g}s"
+            )
+        try:
+            return function(client, event, waiting_message_ts, logger)
+        finally:
+            lease.release()
+
+    return wrapper
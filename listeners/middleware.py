@@ -0,0 +1,81 @@
+# Global middleware acknowledging and dropping events no listener acts on, before Bolt dispatches them
+# to the listener thread pool. Drops are counted in the `events_dropped` metric by reason.
+# Dropped are messages and mentions posted by bots, including Bolty's own waiting messages,
+# edits and deletions of bot messages (such as Bolty replacing its waiting message with the response),
+# edits and deletions in DMs unless `RESPONSE_CHAINING` needs them to invalidate chains
+# or `SUPERSEDE_REQUESTS` to cancel the requests answering them,
+# and message subtypes like joins, topic changes and pins.
+# In cluster mode, each event, command or interaction is also claimed in the shared backend by its
+# `event_id` or `trigger_id`, and dropped as a `duplicate` by every replica but the first to claim it,
+# so retries and redeliveries landing on another replica are not answered twice.
+import logging
+import os
+
+from slack_bolt import BoltResponse
+
+from ai.response_chains import RESPONSE_CHAINING
+from observability.metrics import increment
+from state_store.shared_backend import REPLICA_ID, get_shared_backend
+
+from .listener_utils.in_flight import SUPERSEDE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# How long a claimed event is remembered; Slack stops retrying an event well within an hour
+CLUSTER_DEDUPE_SECONDS = float(os.environ.get("CLUSTER_DEDUPE_SECONDS", "3600"))
+
+# Message subtypes the listeners answer or index
+CONTENT_SUBTYPES = {None, "thread_broadcast", "file_share", "me_message"}
+EDIT_SUBTYPES = {"message_changed", "message_deleted"}
+
+
+def _drop_reason(event: dict, bot_user_id: str):
+    event_type = event.get("type")
+    if event_type not in ("message", "app_mention"):
+        return None
+    if event.get("bot_id") or (bot_user_id and event.get("user") == bot_user_id):
+        return "bot_message"
+
+    subtype = event.get("subtype")
+    if subtype in CONTENT_SUBTYPES:
+        return None
+    if subtype not in EDIT_SUBTYPES:
+        return "ignored_subtype"
+    edited = event.get("message") or event.get("previous_message") or {}
+    if edited.get("bot_id"):
+        return "bot_edit"
+    if event.get("channel_type") == "im" and not (
+        RESPONSE_CHAINING or SUPERSEDE_REQUESTS
+    ):
+        return "ignored_subtype"
+    return None
+
+
+def event_filter_middleware(body: dict, context, next):
+    event = body.get("event")
+    if body.get("type") == "event_callback" and event:
+        reason = _drop_reason(event, context.bot_user_id)
+        if reason:
+            increment("events_dropped", reason=reason, event_type=event.get("type"))
+            return BoltResponse(status=200, body="")
+    return next()
+
+
+def event_dedupe_middleware(body: dict, next):
+    backend = get_shared_backend()
+    key = body.get("event_id") or body.get("trigger_id")
+    if backend is None or not key:
+        return next()
+    try:
+        claimed = backend.set_if_absent(
+            f"event:{key}", REPLICA_ID, CLUSTER_DEDUPE_SECONDS
+        )
+    except Exception as e:
+        # Answering twice beats not answering while the backend is unreachable
+        logger.warning(f"[middleware] Failed to claim {key}: {e}")
+        return next()
+    if not claimed:
+        event_type = (body.get("event") or {}).get("type") or body.get("type")
+        increment("events_dropped", reason="duplicate", event_type=event_type)
+        return BoltResponse(status=200, body="")
+    return next()
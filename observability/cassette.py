@@ -0,0 +1,223 @@
+# Records production traffic into a cassette for `observability/replay.py`.
+# With `RECORD_CASSETTE` set to a file path, `recording_middleware` appends every incoming Bolt payload,
+# `RecordingWebClient` every Slack Web API response, and `get_provider_response()` every provider response
+# to that gzipped JSON-lines file, each with its offset in seconds from the start of the recording.
+# Everything is redacted before it is written. Tokens, file URLs and response URLs are dropped, and user,
+# team and bot IDs are replaced by consistent pseudonyms. With `CASSETTE_REDACTION=pii` (the default), email
+# addresses, phone numbers, API keys and links are masked in message text. With `CASSETTE_REDACTION=full`,
+# every visible character except mentions is masked, which keeps message lengths and shapes.
+import atexit
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from slack_sdk.web import SlackResponse
+
+from .tracing import TracedWebClient, replace_client
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+RECORD_CASSETTE = os.environ.get("RECORD_CASSETTE", "")
+CASSETTE_REDACTION = os.environ.get("CASSETTE_REDACTION", "pii").lower()
+
+_DROPPED_KEYS = {
+    "token",
+    "authorization",
+    "authorizations",
+    "response_url",
+    "trigger_id",
+    "url_private",
+    "url_private_download",
+    "permalink",
+    "permalink_public",
+    "thumb_64",
+    "thumb_360",
+    "image_original",
+}
+_ID_KEYS = {
+    "user",
+    "user_id",
+    "bot_id",
+    "bot_user_id",
+    "parent_user_id",
+    "team",
+    "team_id",
+    "enterprise_id",
+    "inviter",
+    "app_id",
+    "api_app_id",
+}
+_TEXT_KEYS = {
+    "text",
+    "title",
+    "name",
+    "real_name",
+    "display_name",
+    "preview",
+    "plain_text",
+}
+
+_MENTION = re.compile(r"<[@#!][^>]*>")
+_SENSITIVE = re.compile(
+    r"xox[a-z]-[\w-]+"
+    r"|\bsk-[\w-]{10,}"
+    r"|[\w.+-]+@[\w-]+\.[\w.-]+"
+    r"|https?://\S+"
+    r"|\+?\d[\d ().-]{7,}\d"
+)
+_USER_MENTION = re.compile(r"<@([A-Z0-9]+)(\|[^>]*)?>")
+# Pseudonyms are only consistent within one recording
+_SALT = secrets.token_hex(16)
+
+
+def pseudonymize(value: Optional[str]) -> Optional[str]:
+    if not value:
+        return value
+    digest = hashlib.sha256(f"{_SALT}:{value}".encode()).hexdigest()[:10].upper()
+    return f"{value[0]}{digest}"
+
+
+def redact_text(text: str) -> str:
+    text = _USER_MENTION.sub(lambda match: f"<@{pseudonymize(match.group(1))}>", text)
+    if CASSETTE_REDACTION == "full":
+        # Mask everything but the mentions, keeping lengths and whitespace
+        parts = []
+        position = 0
+        for match in _MENTION.finditer(text):
+            parts.append(re.sub(r"\S", "x", text[position : match.start()]))
+            parts.append(match.group(0))
+            position = match.end()
+        parts.append(re.sub(r"\S", "x", text[position:]))
+        return "".join(parts)
+    return _SENSITIVE.sub(lambda match: "x" * len(match.group(0)), text)
+
+
+def redact(value: Any, key: Optional[str] = None) -> Any:
+    if isinstance(value, dict):
+        return {
+            child_key: redact(child, child_key)
+            for child_key, child in value.items()
+            if child_key not in _DROPPED_KEYS
+        }
+    if isinstance(value, list):
+        return [redact(item, key) for item in value]
+    if isinstance(value, str):
+        if key in _ID_KEYS:
+            return pseudonymize(value)
+        if key in _TEXT_KEYS:
+            return redact_text(value)
+    return value
+
+
+class _CassetteWriter:
+    _FLUSH_EVERY = 50
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Gzip members can be appended, so a restarted process keeps extending the same cassette
+        self._file = gzip.open(path, "at")
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._unflushed = 0
+        atexit.register(self.close)
+        logger.info(f"[cassette] Recording to {path}")
+
+    def write(self, kind: str, record: dict):
+        line = json.dumps(
+            {"t": round(time.monotonic() - self._started, 4), "kind": kind, **record},
+            separators=(",", ":"),
+        )
+        with self._lock:
+            self._file.write(line + "\n")
+            self._unflushed += 1
+            if self._unflushed >= self._FLUSH_EVERY:
+                self._file.flush()
+                self._unflushed = 0
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+_writer: Optional[_CassetteWriter] = None
+_writer_lock = threading.Lock()
+
+
+def _record(kind: str, record: dict):
+    # Recording must never fail the request it records
+    global _writer
+    try:
+        with _writer_lock:
+            if _writer is None:
+                _writer = _CassetteWriter(RECORD_CASSETTE)
+        _writer.write(kind, record)
+    except Exception as e:
+        logger.error(f"[cassette] Failed to record {kind}: {e}", exc_info=True)
+
+
+def record_provider_call(provider: str, model: str, response: str, metadata: dict):
+    if RECORD_CASSETTE:
+        _record(
+            "provider",
+            {
+                "provider": provider,
+                "model": model,
+                "text": redact_text(response),
+                "metadata": metadata,
+            },
+        )
+
+
+class RecordingWebClient(TracedWebClient):
+    """A `TracedWebClient` that also records every Slack Web API response while recording is on."""
+
+    def api_call(self, api_method: str, **kwargs) -> SlackResponse:
+        started = time.perf_counter()
+        response = super().api_call(api_method, **kwargs)
+        if RECORD_CASSETTE:
+            _record(
+                "slack",
+                {
+                    "method": api_method,
+                    "elapsed": round(time.perf_counter() - started, 4),
+                    "status": response.status_code,
+                    "data": redact(response.data),
+                },
+            )
+        return response
+
+
+def recording_middleware(body: dict, context, next):
+    """Bolt global middleware recording each incoming payload and the Web API calls made for it."""
+    if not RECORD_CASSETTE:
+        return next()
+
+    _record(
+        "event",
+        {"body": redact(body), "bot_user_id": pseudonymize(context.bot_user_id)},
+    )
+    replace_client(
+        context,
+        RecordingWebClient.from_client(
+            context.client, getattr(context.client, "trace_parent", None)
+        ),
+    )
+    return next()
+
+
+def read_cassette(path: str) -> Iterator[dict]:
+    with gzip.open(path, "rt") as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
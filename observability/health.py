@@ -0,0 +1,113 @@
+# Liveness and readiness reporting for orchestrators.
+# With `HEALTH_PORT` set, `start_health_server()` serves `/livez`, which answers 200 as long as the process
+# serves HTTP, `/readyz`, which answers 503 until `set_ready()` is called after the warm-up phase and the
+# Socket Mode connection, and `/metrics`, the counters of `observability/metrics.py` in Prometheus text format.
+# Both health endpoints return the outcome and duration of each warm-up step recorded with `run_check()`.
+# A failed step is reported but does not hold readiness back, since the app can still serve without it.
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict
+
+from .metrics import snapshot
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+HEALTH_PORT = int(os.environ.get("HEALTH_PORT") or 0)
+
+_lock = threading.Lock()
+_checks: Dict[str, dict] = {}
+_ready = False
+_started_at = time.time()
+
+
+def run_check(name: str, function: Callable) -> bool:
+    """Run one warm-up step, recording whether it succeeded and how long it took."""
+    start = time.perf_counter()
+    error = None
+    try:
+        function()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        logger.warning(f"[health] Warm-up step {name} failed: {error}")
+    seconds = time.perf_counter() - start
+    with _lock:
+        _checks[name] = {
+            "ok": error is None,
+            "seconds": round(seconds, 3),
+            "error": error,
+        }
+    logger.info(f"[health] Warm-up step {name} took {seconds:.2f}s")
+    return error is None
+
+
+def set_ready(ready: bool = True):
+    global _ready
+    _ready = ready
+    logger.info(f"[health] Ready: {ready}")
+
+
+def _status() -> dict:
+    with _lock:
+        checks = dict(_checks)
+    return {
+        "ready": _ready,
+        "uptime_seconds": round(time.time() - _started_at, 1),
+        "checks": checks,
+    }
+
+
+def _render_metrics() -> str:
+    lines = []
+    for name, labels, value in snapshot():
+        label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+        lines.append(
+            f"bolty_{name}{{{label_text}}} {value:g}"
+            if label_text
+            else f"bolty_{name} {value:g}"
+        )
+    lines.append(f"bolty_ready {int(_ready)}")
+    return "\n".join(lines) + "\n"
+
+
+class _HealthHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/livez":
+            self._send(200, "application/json", json.dumps(_status()))
+        elif self.path == "/readyz":
+            status = _status()
+            self._send(
+                200 if status["ready"] else 503, "application/json", json.dumps(status)
+            )
+        elif self.path == "/metrics":
+            self._send(200, "text/plain; version=0.0.4", _render_metrics())
+        else:
+            self._send(404, "text/plain", "not found\n")
+
+    def _send(self, code: int, content_type: str, body: str):
+        payload = body.encode()
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # Probes hit these endpoints every few seconds
+        pass
+
+
+def start_health_server(port: int = HEALTH_PORT):
+    if not port:
+        return
+    server = ThreadingHTTPServer(("0.0.0.0", port), _HealthHandler)
+    threading.Thread(
+        target=server.serve_forever, name="health-server", daemon=True
+    ).start()
+    logger.info(f"[health] Serving /livez, /readyz and /metrics on port {port}")
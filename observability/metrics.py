@@ -0,0 +1,30 @@
+# In-process counters and gauges for things worth watching but not worth a span, such as events dropped
+# before dispatch or the queue depth of an executor.
+# `increment("events_dropped", reason="bot_message")` adds to the counter with that name and labels,
+# `set_gauge("bulkhead_queue_depth", 3, bulkhead="llm")` replaces the gauge's value,
+# and `snapshot()` returns every counter and gauge as `(name, labels, value)`.
+import threading
+from collections import Counter
+from typing import Dict, List, Tuple
+
+_lock = threading.Lock()
+_counters: Counter = Counter()
+_gauges: Dict[Tuple[str, tuple], float] = {}
+
+
+def increment(name: str, value: float = 1, **labels: str):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] += value
+
+
+def set_gauge(name: str, value: float, **labels: str):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _gauges[key] = value
+
+
+def snapshot() -> List[Tuple[str, Dict[str, str], float]]:
+    with _lock:
+        items = list(_counters.items()) + list(_gauges.items())
+    return [(name, dict(labels), value) for (name, labels), value in sorted(items)]
@@ -0,0 +1,227 @@
+# An opt-in sampling profiler for live requests.
+# Functions decorated with `@profile_request(name)` (the listeners and `get_provider_response()`) are profiled
+# for a `PROFILING_SAMPLE_RATE` fraction of requests, or for every request while a profiling window is open.
+# A window is opened with `start_profiling_window()`, by sending SIGUSR1 to the process, or by an admin
+# running `/bolty-profile`. The decision is made once per request and carried in a contextvar, so nested
+# decorated calls, including those `ContextExecutor` runs on other threads (the LLM bulkhead, speculative drafts),
+# are sections of the same profile. While a request is profiled, a background thread samples the stacks of
+# every thread it runs on every `PROFILING_INTERVAL_MS` milliseconds.
+# Each profiled request writes its collapsed stacks (one `frame;frame;frame count` line per stack, readable
+# by flamegraph.pl and speedscope) to `./data/profiles`, and appends its wall and CPU time, broken down by
+# the decorated functions it called, to `./data/profiles/requests.jsonl`.
+# When no request is profiled, the decorator costs a clock read per call and the sampler thread is asleep.
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_INTERVAL_MS = float(os.environ.get("PROFILING_INTERVAL_MS", "5"))
+PROFILING_WINDOW_SECONDS = float(os.environ.get("PROFILING_WINDOW_SECONDS", "60"))
+PROFILES_DIR = "./data/profiles"
+
+_window_until = 0.0
+_write_lock = threading.Lock()
+
+# Bookkeeping of a profiled request, left out of its record in requests.jsonl
+_INTERNAL_KEYS = ("threads", "stacks", "other_threads_cpu_time", "finished")
+# A request that was not sampled, so that its nested calls do not roll the dice again
+_UNSAMPLED = "unsampled"
+_current_request: contextvars.ContextVar[Optional[Union[dict, str]]] = (
+    contextvars.ContextVar("profiled_request", default=None)
+)
+
+
+class _Sampler:
+    """Samples the stacks of the threads currently running a profiled request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stacks: Dict[int, Counter] = {}
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, thread_id: int, stacks: Counter):
+        with self._lock:
+            self._stacks[thread_id] = stacks
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="profiler-sampler", daemon=True
+                )
+                self._thread.start()
+        self._wake.set()
+
+    def remove(self, thread_id: int):
+        with self._lock:
+            self._stacks.pop(thread_id, None)
+
+    def _run(self):
+        interval = PROFILING_INTERVAL_MS / 1000
+        while True:
+            with self._lock:
+                idle = not self._stacks
+            if idle:
+                # Sleep until the next profiled request instead of polling
+                self._wake.wait()
+                self._wake.clear()
+                continue
+
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, stacks in self._stacks.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[_collapse(frame)] += 1
+            del frames
+            time.sleep(interval)
+
+
+_sampler = _Sampler()
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def start_profiling_window(seconds: float = PROFILING_WINDOW_SECONDS):
+    """Profile every request for the next `seconds` seconds."""
+    global _window_until
+    _window_until = time.time() + seconds
+    logger.info(f"[profiler] Profiling every request for {seconds:.0f} seconds")
+
+
+def install_signal_handler():
+    """Open a profiling window on SIGUSR1. Must be called from the main thread."""
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: start_profiling_window())
+
+
+def _should_profile() -> bool:
+    return time.time() < _window_until or (
+        PROFILING_SAMPLE_RATE > 0 and random.random() < PROFILING_SAMPLE_RATE
+    )
+
+
+def profile_request(name: str):
+    """Decorator profiling sampled calls; nested decorated calls are recorded as sections of the outer one."""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            request = _current_request.get()
+            if request is None:
+                if _should_profile():
+                    return _run_profiled(name, function, args, kwargs)
+                reset = _current_request.set(_UNSAMPLED)
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    _current_request.reset(reset)
+            # Background work copying the context of a request can outlive its profile
+            if request is _UNSAMPLED or request["finished"]:
+                return function(*args, **kwargs)
+            return _run_section(request, name, function, args, kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _run_section(request: dict, name: str, function, args, kwargs):
+    thread_id = threading.get_ident()
+    # The first section on another thread samples that thread too, for as long as it runs
+    joined = thread_id not in request["threads"]
+    if joined:
+        request["threads"].add(thread_id)
+        _sampler.add(thread_id, request["stacks"])
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        cpu_time = time.thread_time() - cpu_start
+        section = request["sections"].setdefault(
+            name, {"calls": 0, "wall_time": 0.0, "cpu_time": 0.0}
+        )
+        section["calls"] += 1
+        section["wall_time"] += time.perf_counter() - wall_start
+        section["cpu_time"] += cpu_time
+        if joined:
+            _sampler.remove(thread_id)
+            request["threads"].discard(thread_id)
+            request["other_threads_cpu_time"] += cpu_time
+
+
+def _run_profiled(name: str, function, args, kwargs):
+    thread_id = threading.get_ident()
+    stacks = Counter()
+    request = {
+        "name": name,
+        "started_at": time.time(),
+        "sections": {},
+        "threads": {thread_id},
+        "stacks": stacks,
+        "other_threads_cpu_time": 0.0,
+        "finished": False,
+    }
+    reset = _current_request.set(request)
+    _sampler.add(thread_id, stacks)
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    error = None
+    try:
+        return function(*args, **kwargs)
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        request["finished"] = True
+        request["wall_time"] = time.perf_counter() - wall_start
+        # CPU time across every thread the request ran on
+        request["cpu_time"] = (
+            time.thread_time() - cpu_start + request["other_threads_cpu_time"]
+        )
+        request["error"] = error
+        _sampler.remove(thread_id)
+        _current_request.reset(reset)
+        _write_profile(request, stacks)
+
+
+def _write_profile(request: dict, stacks: Counter):
+    # Profiling must never fail the request it profiles
+    try:
+        Path(PROFILES_DIR).mkdir(parents=True, exist_ok=True)
+        stem = f"{int(request['started_at'] * 1000)}-{request['name']}-{threading.get_ident()}"
+        request["samples"] = sum(stacks.values())
+        request["stacks_file"] = f"{stem}.folded"
+        with open(f"{PROFILES_DIR}/{stem}.folded", "w") as file:
+            file.writelines(f"{stack} {count}\n" for stack, count in stacks.items())
+        record = {
+            key: value for key, value in request.items() if key not in _INTERNAL_KEYS
+        }
+        with _write_lock, open(f"{PROFILES_DIR}/requests.jsonl", "a") as file:
+            file.write(json.dumps(record) + "\n")
+        logger.info(
+            f"[profiler] {request['name']}: wall {request['wall_time']:.3f}s, cpu {request['cpu_time']:.3f}s,"
+            f" {request['samples']} samples"
+        )
+    except Exception as e:
+        logger.error(f"[profiler] Failed to write profile: {e}", exc_info=True)
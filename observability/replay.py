@@ -0,0 +1,416 @@
+# Replays a cassette recorded with `RECORD_CASSETTE` through `register_listeners()`.
+# The recorded payloads are dispatched to a fresh Bolt app in recording order, either at their original
+# offsets (`--speed original`) or back to back (`--speed fast`). Slack Web API calls are answered from the
+# recorded responses for the same method, in order, and provider calls from the recorded responses for the
+# same model; in original mode both also take as long as they did when recorded. Nothing leaves the process,
+# and the app's state stores live in a temporary directory.
+# The report gives each event's latency (dispatch until its listeners finished), peak allocations and the
+# top allocation sites, and call counts by Slack method, model and event type.
+#
+# Run with `python -m observability.replay cassette.jsonl.gz [--speed fast] [--json report.json]`.
+import argparse
+import contextvars
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from slack_bolt import App, BoltRequest
+from slack_bolt.authorization import AuthorizeResult
+from slack_sdk import WebClient
+from slack_sdk.web import SlackResponse
+
+from .cassette import read_cassette
+from .metrics import snapshot
+from .tracing import ContextExecutor, replace_client
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+ORIGINAL = "original"
+FAST = "fast"
+
+# Index of the event a task belongs to, carried into every executor by `ContextExecutor`
+_replayed_event: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar(
+    "replayed_event", default=None
+)
+
+
+class ReplayWebClient(WebClient):
+    """
+    A `WebClient` answering every call with the next recorded response for its method. Once those run out,
+    e.g. because replayed events raced differently than recorded ones, the last one is repeated.
+    """
+
+    def __init__(self, responses: Dict[str, Deque[dict]], speed: str):
+        super().__init__()
+        self._responses = responses
+        self._speed = speed
+        self._lock = threading.Lock()
+        self.calls: Counter = Counter()
+        self.unmatched: Counter = Counter()
+        self._last: Dict[str, dict] = {}
+
+    def api_call(self, api_method: str, **kwargs) -> SlackResponse:
+        with self._lock:
+            self.calls[api_method] += 1
+            queue = self._responses.get(api_method)
+            if queue:
+                record = self._last[api_method] = queue.popleft()
+            else:
+                record = self._last.get(api_method)
+                self.unmatched[api_method] += 1
+        if record is None:
+            data, status = {"ok": True, "ts": f"{time.time():.6f}"}, 200
+        else:
+            data, status = record["data"], record["status"]
+            if self._speed == ORIGINAL:
+                time.sleep(record.get("elapsed", 0))
+        return SlackResponse(
+            client=self,
+            http_verb="POST",
+            api_url=f"{self.base_url}{api_method}",
+            req_args=kwargs,
+            data=data,
+            headers={},
+            status_code=status,
+        ).validate()
+
+
+class ReplayProvider:
+    """Stands in for every provider, answering with the recorded responses of the requested model."""
+
+    supports_response_chaining = False
+    reasoning_effort: Optional[str] = None
+    web_search = True
+    previous_response_id: Optional[str] = None
+
+    def __init__(self, responses: "_ProviderResponses", provider_name: str):
+        self._responses = responses
+        self.provider_name = provider_name
+        self.current_model = None
+
+    def set_model(self, model_name: str):
+        self.current_model = model_name
+
+    def set_reasoning_effort(self, effort: Optional[str]):
+        self.reasoning_effort = effort
+
+    def set_web_search(self, enabled: bool):
+        self.web_search = enabled
+
+    def set_previous_response_id(self, response_id: Optional[str]):
+        self.previous_response_id = response_id
+
+    def generate_response(self, prompt: str, system_content: str):
+        record = self._responses.next(self.current_model)
+        if record is None:
+            text, recorded = "", {}
+        else:
+            text, recorded = record["text"], record["metadata"]
+            if self._responses.speed == ORIGINAL:
+                time.sleep(recorded.get("wall_time", 0))
+        metadata = {
+            "provider": self.provider_name,
+            "model": self.current_model,
+            "input_tokens": recorded.get("input_tokens", 0),
+            "output_tokens": recorded.get("output_tokens", 0),
+            "cached_tokens": recorded.get("cached_tokens", 0),
+            "reasoning_tokens": recorded.get("reasoning_tokens", 0),
+            "wall_time": recorded.get("wall_time", 0.0),
+            "response_id": None,
+        }
+        return text, metadata
+
+
+class _ProviderResponses:
+    def __init__(self, records: List[dict], speed: str):
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._by_model: Dict[str, Deque[dict]] = defaultdict(deque)
+        # Responses are matched by model first, then in recording order, since replayed
+        # requests may be routed to another model than when they were recorded
+        self._all: Deque[dict] = deque(records)
+        self._used = set()
+        for record in records:
+            self._by_model[record["model"]].append(record)
+        self.calls: Counter = Counter()
+
+    def next(self, model: str) -> Optional[dict]:
+        with self._lock:
+            self.calls[model] += 1
+            for queue in (self._by_model[model], self._all):
+                while queue:
+                    record = queue.popleft()
+                    if id(record) not in self._used:
+                        self._used.add(id(record))
+                        return record
+        return None
+
+
+class _Tracker:
+    """Records when the last task of each replayed event finished, across every executor it went through."""
+
+    def __init__(self):
+        self.finished: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def track(self, future):
+        event = _replayed_event.get()
+        if event is not None:
+            future.add_done_callback(lambda _: self._finish(event))
+
+    def _finish(self, event: int):
+        with self._lock:
+            self.finished[event] = max(self.finished.get(event, 0), time.perf_counter())
+
+
+class _TrackingExecutor(ContextExecutor):
+    def __init__(self, tracker: _Tracker, max_workers: int):
+        super().__init__(max_workers=max_workers)
+        self._tracker = tracker
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = super().submit(fn, *args, **kwargs)
+        self._tracker.track(future)
+        return future
+
+
+def _event_type(body: dict) -> str:
+    event = body.get("event") or {}
+    if event:
+        subtype = event.get("subtype")
+        return f"{event.get('type')}.{subtype}" if subtype else event.get("type")
+    return body.get("command") or body.get("type") or "unknown"
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def _latency_summary(values: List[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50": _percentile(values, 50),
+        "p95": _percentile(values, 95),
+        "max": max(values, default=0.0),
+    }
+
+
+def _build_app(
+    records: List[dict], speed: str, max_workers: int, tracker: _Tracker
+) -> Tuple[App, ReplayWebClient, _ProviderResponses, List[ContextExecutor]]:
+    # Imported here so the app's module-level state is created in the replay's data directory
+    import ai.providers
+    import listeners.listener_utils.bulkheads as bulkheads
+    from listeners import register_listeners
+
+    slack_responses: Dict[str, Deque[dict]] = defaultdict(deque)
+    for record in records:
+        if record["kind"] == "slack":
+            slack_responses[record["method"]].append(record)
+    provider_responses = _ProviderResponses(
+        [record for record in records if record["kind"] == "provider"], speed
+    )
+    client = ReplayWebClient(slack_responses, speed)
+    executor = _TrackingExecutor(tracker, max_workers)
+    # LLM-backed listeners continue on their bulkhead, sized as in production
+    llm_bulkhead = bulkheads.llm_bulkhead
+    original_submit = llm_bulkhead.submit
+
+    def tracked_submit(fn, /, *args, **kwargs):
+        future = original_submit(fn, *args, **kwargs)
+        tracker.track(future)
+        return future
+
+    llm_bulkhead.submit = tracked_submit
+    bot_user_ids = [
+        record.get("bot_user_id") for record in records if record["kind"] == "event"
+    ]
+    bot_user_id = next((user_id for user_id in bot_user_ids if user_id), "UREPLAY")
+
+    def authorize(enterprise_id, team_id, user_id):
+        return AuthorizeResult(
+            enterprise_id=enterprise_id,
+            team_id=team_id,
+            bot_token="xoxb-replay",
+            bot_user_id=bot_user_id,
+            bot_id="BREPLAY",
+        )
+
+    def replay_client_middleware(context, next):
+        replace_client(context, client)
+        return next()
+
+    ai.providers._get_provider = lambda provider_name: ReplayProvider(
+        provider_responses, provider_name
+    )
+    app = App(
+        authorize=authorize,
+        signing_secret="replay",
+        client=client,
+        listener_executor=executor,
+        request_verification_enabled=False,
+    )
+    register_listeners(app)
+    # Registered last, so it replaces the clients the tracing and recording middleware set up
+    app.use(replay_client_middleware)
+    return app, client, provider_responses, [executor, llm_bulkhead]
+
+
+def replay(
+    path: str, speed: str = FAST, max_workers: int = 5, trace_allocations: bool = True
+) -> dict:
+    records = list(read_cassette(path))
+    events = [record for record in records if record["kind"] == "event"]
+    tracker = _Tracker()
+    app, client, provider_responses, executors = _build_app(
+        records, speed, max_workers, tracker
+    )
+    logger.info(f"[replay] Replaying {len(events)} events from {path} ({speed})")
+
+    if trace_allocations:
+        tracemalloc.start(10)
+    dispatched: Dict[int, float] = {}
+    event_types: Dict[int, str] = {}
+    replay_started = time.perf_counter()
+    first_offset = events[0]["t"] if events else 0
+    for position, record in enumerate(events):
+        if speed == ORIGINAL:
+            delay = record["t"] - first_offset - (time.perf_counter() - replay_started)
+            if delay > 0:
+                time.sleep(delay)
+        event_types[position] = _event_type(record["body"])
+        token = _replayed_event.set(position)
+        dispatched[position] = time.perf_counter()
+        response = app.dispatch(BoltRequest(body=record["body"], mode="socket_mode"))
+        _replayed_event.reset(token)
+        if response.status >= 400:
+            logger.warning(
+                f"[replay] Event {position} ({event_types[position]}) was rejected with {response.status}"
+            )
+    # Listener threads hand off to the LLM bulkhead, so they are drained first
+    for executor in executors:
+        executor.shutdown(wait=True)
+    duration = time.perf_counter() - replay_started
+
+    allocations = None
+    if trace_allocations:
+        allocation_snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        allocations = {
+            "current_bytes": current,
+            "peak_bytes": peak,
+            "top": [
+                {
+                    "site": str(stat.traceback[0]),
+                    "bytes": stat.size,
+                    "count": stat.count,
+                }
+                for stat in allocation_snapshot.statistics("lineno")[:10]
+            ],
+        }
+
+    latencies = {
+        position: tracker.finished.get(position, dispatched[position]) - started
+        for position, started in dispatched.items()
+    }
+    by_type: Dict[str, List[float]] = defaultdict(list)
+    for position, latency in latencies.items():
+        by_type[event_types[position]].append(latency)
+    return {
+        "cassette": path,
+        "speed": speed,
+        "events": len(events),
+        "duration": duration,
+        "latency": _latency_summary(list(latencies.values())),
+        "latency_by_event_type": {
+            event_type: _latency_summary(values)
+            for event_type, values in sorted(by_type.items())
+        },
+        "slack_calls": dict(client.calls.most_common()),
+        "unmatched_slack_calls": dict(client.unmatched.most_common()),
+        "provider_calls": dict(provider_responses.calls.most_common()),
+        "rejected": {
+            labels["bulkhead"]: value
+            for name, labels, value in snapshot()
+            if name == "bulkhead_rejected"
+        },
+        "allocations": allocations,
+    }
+
+
+def _print_report(report: dict):
+    latency = report["latency"]
+    print(
+        f"{report['events']} events in {report['duration']:.2f}s ({report['speed']}): "
+        f"p50 {latency['p50'] * 1000:.1f}ms, p95 {latency['p95'] * 1000:.1f}ms, max {latency['max'] * 1000:.1f}ms"
+    )
+    for bulkhead, rejected in report["rejected"].items():
+        print(f"{rejected:g} requests rejected by the {bulkhead} bulkhead")
+    print(
+        f"\n{'event type':<32} {'count':>6} {'p50_ms':>9} {'p95_ms':>9} {'max_ms':>9}"
+    )
+    for event_type, summary in report["latency_by_event_type"].items():
+        print(
+            f"{event_type:<32} {summary['count']:>6} {summary['p50'] * 1000:>9.1f} "
+            f"{summary['p95'] * 1000:>9.1f} {summary['max'] * 1000:>9.1f}"
+        )
+    print(f"\n{'slack method':<32} {'calls':>6} {'unmatched':>9}")
+    for method, calls in report["slack_calls"].items():
+        print(
+            f"{method:<32} {calls:>6} {report['unmatched_slack_calls'].get(method, 0):>9}"
+        )
+    print(f"\n{'model':<32} {'calls':>6}")
+    for model, calls in report["provider_calls"].items():
+        print(f"{model:<32} {calls:>6}")
+    if report["allocations"]:
+        allocations = report["allocations"]
+        print(
+            f"\npeak traced memory {allocations['peak_bytes'] / 1024:.0f} KiB, top allocation sites:"
+        )
+        for site in allocations["top"]:
+            print(
+                f"{site['bytes'] / 1024:>10.1f} KiB {site['count']:>8} {site['site']}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay a recorded cassette through Bolty's listeners."
+    )
+    parser.add_argument("cassette")
+    parser.add_argument("--speed", choices=(ORIGINAL, FAST), default=FAST)
+    parser.add_argument("--workers", type=int, default=5, help="Listener threads")
+    parser.add_argument(
+        "--no-allocations",
+        action="store_true",
+        help="Skip tracemalloc, which slows the replay down",
+    )
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    cassette = os.path.abspath(args.cassette)
+    report_path = os.path.abspath(args.json) if args.json else None
+    # Keep the replay's thread state, caches and usage rollups away from the real ./data
+    os.chdir(tempfile.mkdtemp(prefix="bolty-replay-"))
+    report = replay(cassette, args.speed, args.workers, not args.no_allocations)
+    _print_report(report)
+    if report_path:
+        with open(report_path, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,522 @@
+# OpenTelemetry-style tracing for following one Slack event through the bot.
+# `tracing_middleware` opens a root span per incoming event envelope and hands the listeners a `TracedWebClient`
+# carrying it. The client adds a child span for every Slack Web API call, `@traced` listeners run in a child span
+# of it, and `get_provider_response()` adds spans for provider calls carrying the model and
+# token counts. The trace id of an event is derived from its channel and timestamp, so Slack's retries of an
+# event and the durable job that answers it land in the same trace.
+# Set `TRACING_EXPORTER=jsonl` to append finished spans to `./data/traces/spans.jsonl`, or `TRACING_EXPORTER=otlp`
+# to send them to an OTLP/HTTP collector at `OTEL_EXPORTER_OTLP_ENDPOINT`. Spans are exported from a background
+# thread; with tracing off, `start_span()` returns a no-op span.
+import contextvars
+import copy
+import functools
+import hashlib
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode
+
+from slack_bolt import Say
+from slack_sdk import WebClient
+from slack_sdk.http_retry import HttpRequest as RetryHttpRequest
+from slack_sdk.http_retry import HttpResponse as RetryHttpResponse
+from slack_sdk.http_retry import RetryState
+from slack_sdk.web import SlackResponse
+
+from ai.cancellation import RequestCancelled
+from ai.deadlines import capped_timeout, stage_timeout
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+TRACING_EXPORTER = os.environ.get("TRACING_EXPORTER", "").lower()
+OTEL_EXPORTER_OTLP_ENDPOINT = os.environ.get(
+    "OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318"
+)
+OTEL_SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME", "bolty")
+TRACES_DIR = "./data/traces"
+
+INTERNAL = "internal"
+SERVER = "server"
+CLIENT = "client"
+# OTLP SpanKind values
+_OTLP_KINDS = {INTERNAL: 1, SERVER: 2, CLIENT: 3}
+
+_EXPORT_BATCH_SIZE = 256
+_EXPORT_INTERVAL_SECONDS = 2.0
+
+
+class Span:
+    __slots__ = (
+        "name",
+        "kind",
+        "trace_id",
+        "span_id",
+        "parent_span_id",
+        "start_time_ns",
+        "end_time_ns",
+        "attributes",
+        "error",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        kind: str,
+        trace_id: str,
+        parent_span_id: Optional[str],
+        attributes: Optional[Dict[str, Any]] = None,
+    ):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.start_time_ns = time.time_ns()
+        self.end_time_ns = None
+        self.attributes = {}
+        self.error = None
+        self.set_attributes(attributes or {})
+
+    def set_attribute(self, key: str, value: Any):
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def record_error(self, error: BaseException):
+        self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time_ns": self.start_time_ns,
+            "end_time_ns": self.end_time_ns,
+            "duration_ms": (self.end_time_ns - self.start_time_ns) / 1e6,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        pass
+
+    def record_error(self, error: BaseException):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+def trace_id_for_event(event: dict) -> str:
+    key = f"{event.get('channel')}:{event.get('event_ts') or event.get('ts')}"
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def current_span():
+    return _current_span.get() or _NOOP_SPAN
+
+
+@contextmanager
+def start_span(
+    name: str,
+    attributes: Optional[Dict[str, Any]] = None,
+    kind: str = INTERNAL,
+    trace_id: Optional[str] = None,
+    parent: Optional[Span] = None,
+):
+    """
+    Open a span as a child of the current span, or else of `parent`,
+    or else as the root of `trace_id` (or of a new trace).
+    """
+    if not TRACING_EXPORTER:
+        yield _NOOP_SPAN
+        return
+
+    parent = _current_span.get() or parent
+    if parent is not None and trace_id in (None, parent.trace_id):
+        span = Span(name, kind, parent.trace_id, parent.span_id, attributes)
+    else:
+        span = Span(name, kind, trace_id or secrets.token_hex(16), None, attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end_time_ns = time.time_ns()
+        _get_exporter().export(span)
+
+
+def traced(name: str, kind: str = INTERNAL):
+    """
+    Decorator running the function in a span. Listeners run on Bolt's thread pool after the middleware
+    returned, so their span is parented to the envelope span carried by their `TracedWebClient`.
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not TRACING_EXPORTER:
+                return function(*args, **kwargs)
+            client = kwargs.get("client")
+            parent = (
+                client.trace_parent if isinstance(client, TracedWebClient) else None
+            )
+            with start_span(name, kind=kind, parent=parent):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class ContextExecutor(ThreadPoolExecutor):
+    """A thread pool running each task in a copy of the submitting thread's context, so spans nest across threads."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class TracedWebClient(WebClient):
+    """A `WebClient` adding a child span for every Slack Web API call, within the request's deadline."""
+
+    trace_parent: Optional[Span] = None
+
+    def __init__(self, *args, transport=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Sends the requests instead of urllib when set, see listeners/listener_utils/slack_transport.py
+        self.transport = transport
+
+    @classmethod
+    def from_client(
+        cls, client: WebClient, trace_parent: Optional[Span] = None, transport=None
+    ) -> "TracedWebClient":
+        traced_client = cls(
+            token=client.token,
+            base_url=client.base_url,
+            timeout=client.timeout,
+            ssl=client.ssl,
+            proxy=client.proxy,
+            headers=client.headers,
+            team_id=client.default_params.get("team_id"),
+            logger=client.logger,
+            retry_handlers=list(client.retry_handlers),
+            transport=transport or getattr(client, "transport", None),
+        )
+        traced_client.trace_parent = trace_parent
+        return traced_client
+
+    def api_call(self, api_method: str, **kwargs) -> SlackResponse:
+        # Every call's timeout is capped at what is left of the request's deadline, see ai/deadlines.py
+        timeout = stage_timeout(f"slack.{api_method}", self.timeout)
+        with start_span(
+            f"slack.{api_method}",
+            {"slack.method": api_method},
+            kind=CLIENT,
+            parent=self.trace_parent,
+        ) as span:
+            params = kwargs.get("params") or kwargs.get("json") or kwargs.get("data")
+            if isinstance(params, dict):
+                span.set_attribute("slack.channel", params.get("channel"))
+            if self._pooled(**kwargs):
+                response = self._send_pooled(api_method, **kwargs)
+            else:
+                # urllib reads the public `timeout` attribute, set on a copy so concurrent calls keep their own
+                client = self
+                if timeout != self.timeout:
+                    client = copy.copy(self)
+                    client.timeout = timeout
+                response = WebClient.api_call(client, api_method, **kwargs)
+            span.set_attribute("http.status_code", response.status_code)
+            span.set_attribute("slack.ok", response.get("ok"))
+            return response
+
+    def _pooled(self, files=None, auth=None, **kwargs) -> bool:
+        # Only urllib honors a client's own proxy or SSL context, uploads files and sends basic auth
+        return (
+            self.transport is not None
+            and self.proxy is None
+            and self.ssl is None
+            and not files
+            and auth is None
+        )
+
+    def _send_pooled(
+        self,
+        api_method: str,
+        *,
+        data: Optional[dict] = None,
+        params: Optional[dict] = None,
+        headers: Optional[dict] = None,
+        **kwargs,
+    ) -> SlackResponse:
+        """Perform the call on the transport, retried by the client's `retry_handlers` like slack_sdk does."""
+        body_params = {}
+        for values in (params, data):
+            body_params.update(
+                {k: v for k, v in (values or {}).items() if v is not None}
+            )
+        json_body = dict(kwargs["json"]) if kwargs.get("json") is not None else None
+        fields = json_body if json_body is not None else body_params
+        for name, value in self.default_params.items():
+            fields.setdefault(name, value)
+        token = fields.pop("token", None) or self.token
+
+        request_headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        request_headers.update(self.headers)
+        if token:
+            request_headers["Authorization"] = f"Bearer {token}"
+        request_headers.update(headers or {})
+        if json_body is not None:
+            request_headers["Content-Type"] = "application/json;charset=utf-8"
+            body = json.dumps(json_body).encode("utf-8")
+        else:
+            # Slack expects booleans as 1 and 0 in forms
+            body = urlencode(
+                {
+                    k: int(v) if isinstance(v, bool) else v
+                    for k, v in body_params.items()
+                }
+            ).encode("utf-8")
+
+        # Slack accepts every Web API method as a POST
+        url = f"{self.base_url}{api_method}"
+        retry_request = RetryHttpRequest(
+            method="POST",
+            url=url,
+            headers={k: [str(v)] for k, v in request_headers.items()},
+            body_params=fields,
+            data=body,
+        )
+        retry_state = RetryState()
+        while True:
+            retry_state.next_attempt_requested = False
+            response, retry_response, error = None, None, None
+            try:
+                response = self.transport.send(
+                    url, body, request_headers, capped_timeout(self.timeout)
+                )
+                retry_response = RetryHttpResponse(
+                    status_code=response["status"],
+                    headers={k: [v] for k, v in response["headers"].items()},
+                )
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                self.logger.error(f"Failed to send a request to Slack API server: {e}")
+                error = e
+            for handler in self.retry_handlers:
+                if handler.can_retry(
+                    state=retry_state,
+                    request=retry_request,
+                    response=retry_response,
+                    error=error,
+                ):
+                    handler.prepare_for_next_attempt(
+                        state=retry_state,
+                        request=retry_request,
+                        response=retry_response,
+                        error=error,
+                    )
+                    break
+            if not retry_state.next_attempt_requested:
+                if error is not None:
+                    raise error
+                break
+
+        response_data = response["body"]
+        if isinstance(response_data, str):
+            try:
+                response_data = json.loads(response_data)
+            except ValueError:
+                response_data = {"ok": False, "error": response_data[:100]}
+        return SlackResponse(
+            client=self,
+            http_verb="POST",
+            api_url=url,
+            req_args={
+                "headers": request_headers,
+                "params": body_params,
+                "json": json_body,
+                "data": {},
+                "files": None,
+            },
+            data=response_data,
+            headers=response["headers"],
+            status_code=response["status"],
+        ).validate()
+
+
+def tracing_middleware(body: dict, context, request, next):
+    """Bolt global middleware opening the root span of each event envelope."""
+    if not TRACING_EXPORTER:
+        return next()
+
+    event = body.get("event") or {}
+    kind = event.get("type") or body.get("command") or body.get("type")
+    attributes = {
+        "slack.envelope_type": body.get("type"),
+        "slack.event_type": event.get("type"),
+        "slack.event_id": body.get("event_id"),
+        "slack.command": body.get("command"),
+        "slack.team": context.team_id,
+        "slack.channel": context.channel_id,
+        "slack.user": context.user_id,
+        "slack.retry_num": (request.headers.get("x-slack-retry-num") or [None])[0],
+    }
+    trace_id = trace_id_for_event(event) if event else None
+    with start_span(f"slack.receive {kind}", attributes, SERVER, trace_id) as span:
+        replace_client(context, TracedWebClient.from_client(context.client, span))
+        return next()
+
+
+def replace_client(context, client: WebClient):
+    """Swap the request's `WebClient`, including the one inside `say`."""
+    # Bolt's built-in middleware may already have built `say` around the previous client
+    say = context.get("say")
+    if isinstance(say, Say) and say.client is context.client:
+        context["say"] = Say(
+            client=client,
+            channel=say.channel,
+            thread_ts=say.thread_ts,
+            metadata=say.metadata,
+            build_metadata=say.build_metadata,
+        )
+    context["client"] = client
+
+
+class _Exporter:
+    def __init__(self):
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=10000)
+        threading.Thread(target=self._run, name="span-exporter", daemon=True).start()
+
+    def export(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            logger.warning(f"[tracing] Export queue full, dropping span {span.name}")
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + _EXPORT_INTERVAL_SECONDS
+            while len(batch) < _EXPORT_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                if TRACING_EXPORTER == "otlp":
+                    _export_otlp(batch)
+                else:
+                    _export_jsonl(batch)
+            except Exception as e:
+                logger.error(
+                    f"[tracing] Failed to export {len(batch)} spans: {e}", exc_info=True
+                )
+
+
+def _export_jsonl(spans: List[Span]):
+    Path(TRACES_DIR).mkdir(parents=True, exist_ok=True)
+    with open(f"{TRACES_DIR}/spans.jsonl", "a") as file:
+        file.writelines(json.dumps(span.to_dict()) + "\n" for span in spans)
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[dict]:
+    return [
+        {"key": key, "value": _otlp_value(value)} for key, value in attributes.items()
+    ]
+
+
+def _export_otlp(spans: List[Span]):
+    payload = {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": _otlp_attributes({"service.name": OTEL_SERVICE_NAME})
+                },
+                "scopeSpans": [
+                    {
+                        "scope": {"name": "bolty"},
+                        "spans": [
+                            {
+                                "traceId": span.trace_id,
+                                "spanId": span.span_id,
+                                "parentSpanId": span.parent_span_id or "",
+                                "name": span.name,
+                                "kind": _OTLP_KINDS[span.kind],
+                                "startTimeUnixNano": str(span.start_time_ns),
+                                "endTimeUnixNano": str(span.end_time_ns),
+                                "attributes": _otlp_attributes(span.attributes),
+                                "status": (
+                                    {"code": 2, "message": span.error}
+                                    if span.error
+                                    else {"code": 1}
+                                ),
+                            }
+                            for span in spans
+                        ],
+                    }
+                ],
+            }
+        ]
+    }
+    request = urllib.request.Request(
+        f"{OTEL_EXPORTER_OTLP_ENDPOINT}/v1/traces",
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        response.read()
+
+
+_exporter: Optional[_Exporter] = None
+_exporter_lock = threading.Lock()
+
+
+def _get_exporter() -> _Exporter:
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = _Exporter()
+        return _exporter
@@ -0,0 +1,94 @@
+# Keeps the batch lane's requests until their results are handed over, so batches survive restarts.
+# A request is stored when it is queued, gets the provider batch id once its batch is submitted,
+# and is deleted once its handler has been called. Payloads hold no Slack tokens: handlers resolve a
+# client for the request's installation when they run.
+import json
+import time
+from typing import List, Optional
+
+from .sqlite_store import SQLiteStore
+
+
+class BatchStore(SQLiteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS batch_jobs (
+        custom_id TEXT PRIMARY KEY,
+        backend TEXT NOT NULL,
+        batch_id TEXT,
+        request TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        channel_id TEXT,
+        listener TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        created_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS batch_jobs_batch ON batch_jobs (backend, batch_id);
+    """
+
+    def __init__(self, *, base_dir: str = "./data"):
+        super().__init__(filename="batches.sqlite3", base_dir=base_dir)
+        # Requests queued before payloads stopped carrying the function's token
+        with self._connection() as connection:
+            connection.execute(
+                "UPDATE batch_jobs SET payload = json_remove(payload, '$.token') "
+                "WHERE json_extract(payload, '$.token') IS NOT NULL"
+            )
+
+    def add(
+        self,
+        backend: str,
+        request: dict,
+        user_id: str,
+        channel_id: Optional[str],
+        listener: str,
+        kind: str,
+        payload: dict,
+    ):
+        with self._connection() as connection:
+            connection.execute(
+                """
+                INSERT INTO batch_jobs (custom_id, backend, request, user_id, channel_id, listener, kind, payload, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    request["custom_id"],
+                    backend,
+                    json.dumps(request),
+                    user_id,
+                    channel_id,
+                    listener,
+                    kind,
+                    json.dumps(payload),
+                    time.time(),
+                ),
+            )
+
+    def set_batch_id(self, custom_ids: List[str], batch_id: Optional[str]):
+        with self._connection() as connection:
+            connection.executemany(
+                "UPDATE batch_jobs SET batch_id = ? WHERE custom_id = ?",
+                [(batch_id, custom_id) for custom_id in custom_ids],
+            )
+
+    def remove(self, custom_ids: List[str]):
+        with self._connection() as connection:
+            connection.executemany(
+                "DELETE FROM batch_jobs WHERE custom_id = ?",
+                [(custom_id,) for custom_id in custom_ids],
+            )
+
+    def unfinished(self) -> List[dict]:
+        """Requests left over by the previous process, oldest first."""
+        rows = (
+            self._connection()
+            .execute("SELECT * FROM batch_jobs ORDER BY created_at")
+            .fetchall()
+        )
+        jobs = []
+        for row in rows:
+            job = dict(row)
+            job["request"] = json.loads(job["request"])
+            job["payload"] = json.loads(job["payload"])
+            jobs.append(job)
+        return jobs
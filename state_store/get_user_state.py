@@ -1,6 +1,8 @@
 import json
 import os
 from state_store.user_identity import UserIdentity
+from state_store.shared_backend import get_shared_backend
+from state_store.shared_state_store import SharedStateStore
 import logging
 
 logging.basicConfig(level=logging.ERROR)
@@ -8,6 +10,17 @@ logger = logging.getLogger(__name__)
 
 
 def get_user_state(user_id: str, is_app_home: bool):
+    backend = get_shared_backend()
+    if backend is not None:
+        user_identity = SharedStateStore(backend).get_state(user_id)
+        if user_identity is None:
+            if not is_app_home:
+                raise FileNotFoundError(
+                    "No provider selection found. Please navigate to the App Home and make a selection."
+                )
+            return None
+        return user_identity["provider"], user_identity["model"]
+
     filepath = f"./data/{user_id}"
     if not is_app_home and not os.path.exists(filepath):
         raise FileNotFoundError(
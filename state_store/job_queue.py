@@ -0,0 +1,183 @@
+# A durable SQLite-backed queue for in-flight LLM work.
+# Claimed jobs stay invisible to other workers until their visibility timeout passes, so a job whose
+# worker crashed is claimed again. Jobs that keep failing are moved to the dead-letter status.
+# A job's generated response and the number of its chunks already posted are kept with it,
+# so a retry posts the rest of the same response instead of starting over.
+# Jobs reference the installation they answer, for the worker to post with that installation's client.
+import json
+import time
+from typing import List, Optional
+
+from .sqlite_store import SQLiteStore
+
+QUEUED = "queued"
+RUNNING = "running"
+DEAD = "dead"
+
+
+class JobQueue(SQLiteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        channel_id TEXT,
+        placeholder_ts TEXT,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        visible_at REAL NOT NULL,
+        last_error TEXT,
+        created_at REAL NOT NULL,
+        response TEXT,
+        posted_chunks INTEGER NOT NULL DEFAULT 0,
+        installation TEXT
+    );
+    CREATE INDEX IF NOT EXISTS jobs_visible ON jobs (status, visible_at);
+    """
+
+    def __init__(self, *, base_dir: str = "./data"):
+        super().__init__(filename="jobs.sqlite3", base_dir=base_dir)
+        # Queues created before responses were kept with their jobs
+        with self._connection() as connection:
+            columns = {
+                row["name"] for row in connection.execute("PRAGMA table_info(jobs)")
+            }
+            if "response" not in columns:
+                connection.execute("ALTER TABLE jobs ADD COLUMN response TEXT")
+                connection.execute(
+                    "ALTER TABLE jobs ADD COLUMN posted_chunks INTEGER NOT NULL DEFAULT 0"
+                )
+            # and before they referenced their installation
+            if "installation" not in columns:
+                connection.execute("ALTER TABLE jobs ADD COLUMN installation TEXT")
+
+    def enqueue(
+        self,
+        kind: str,
+        payload: dict,
+        channel_id: Optional[str] = None,
+        placeholder_ts: Optional[str] = None,
+        installation: Optional[dict] = None,
+    ) -> int:
+        now = time.time()
+        with self._connection() as connection:
+            cursor = connection.execute(
+                """
+                INSERT INTO jobs (kind, payload, channel_id, placeholder_ts, installation, status, visible_at, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    kind,
+                    json.dumps(payload),
+                    channel_id,
+                    placeholder_ts,
+                    json.dumps(installation or {}),
+                    QUEUED,
+                    now,
+                    now,
+                ),
+            )
+            return cursor.lastrowid
+
+    def claim(self, visibility_timeout: float) -> Optional[dict]:
+        """Claim the oldest visible job, hiding it from other workers for `visibility_timeout` seconds."""
+        now = time.time()
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                """
+                SELECT * FROM jobs WHERE status IN (?, ?) AND visible_at <= ?
+                ORDER BY id LIMIT 1
+                """,
+                (QUEUED, RUNNING, now),
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, visible_at = ? WHERE id = ?",
+                (RUNNING, now + visibility_timeout, row["id"]),
+            )
+        job = _job(row)
+        job["payload"] = json.loads(job["payload"])
+        job["attempts"] += 1
+        return job
+
+    def extend(self, job_ids: List[int], visibility_timeout: float):
+        if not job_ids:
+            return
+        with self._connection() as connection:
+            connection.executemany(
+                "UPDATE jobs SET visible_at = ? WHERE id = ? AND status = ?",
+                [
+                    (time.time() + visibility_timeout, job_id, RUNNING)
+                    for job_id in job_ids
+                ],
+            )
+
+    def save_response(self, job_id: int, response: str):
+        with self._connection() as connection:
+            connection.execute(
+                "UPDATE jobs SET response = ? WHERE id = ?", (response, job_id)
+            )
+
+    def set_posted_chunks(self, job_id: int, posted_chunks: int):
+        with self._connection() as connection:
+            connection.execute(
+                "UPDATE jobs SET posted_chunks = ? WHERE id = ?",
+                (posted_chunks, job_id),
+            )
+
+    def complete(self, job_id: int):
+        with self._connection() as connection:
+            connection.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def retry(self, job_id: int, error: str, delay: float):
+        with self._connection() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ?, visible_at = ?, last_error = ? WHERE id = ?",
+                (QUEUED, time.time() + delay, error, job_id),
+            )
+
+    def dead_letter(self, job_id: int, error: str):
+        with self._connection() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ?, last_error = ? WHERE id = ?",
+                (DEAD, error, job_id),
+            )
+
+    def unfinished(self) -> List[dict]:
+        """Jobs that were queued or running when the previous process stopped."""
+        rows = (
+            self._connection()
+            .execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY id",
+                (QUEUED, RUNNING),
+            )
+            .fetchall()
+        )
+        return [_job(row) for row in rows]
+
+    def release(self, job_id: int):
+        with self._connection() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ?, visible_at = ? WHERE id = ?",
+                (QUEUED, time.time(), job_id),
+            )
+
+    def dead_letters(self, limit: int = 100) -> List[dict]:
+        rows = (
+            self._connection()
+            .execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?",
+                (DEAD, limit),
+            )
+            .fetchall()
+        )
+        return [dict(row) for row in rows]
+
+
+def _job(row) -> dict:
+    job = dict(row)
+    job["installation"] = json.loads(job["installation"] or "{}")
+    return job
@@ -1,10 +1,13 @@
 from .file_state_store import FileStateStore, UserIdentity
+from .shared_backend import get_shared_backend
+from .shared_state_store import SharedStateStore
 
 
 def set_user_state(user_id: str, provider_name: str, model_name: str):
     try:
         user = UserIdentity(user_id=user_id, provider=provider_name, model=model_name)
-        file_store = FileStateStore()
-        file_store.set_state(user)
+        backend = get_shared_backend()
+        store = SharedStateStore(backend) if backend is not None else FileStateStore()
+        store.set_state(user)
     except Exception as e:
         raise ValueError(f"Error instantiating API: {e}")
@@ -0,0 +1,256 @@
+# Coordination state shared by every replica of the app in cluster mode: user state, event dedupe keys,
+# caches and per-thread leases. `CLUSTER_BACKEND_URL` selects the backend: a `redis://` or `rediss://` URL
+# for any Redis-compatible server (with the `redis` package installed), or `memory://` for an embedded,
+# single-process stand-in with the same semantics, for tests and single-replica runs.
+# Without it, cluster mode is off and each replica keeps its state under `./data`.
+# Values are strings, and keys may expire after a TTL in seconds. A `Lease` holds a key for one replica
+# at a time, renewing it in the background so that it only expires when its replica dies.
+import logging
+import os
+import secrets
+import socket
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from ai.cancellation import CancellationToken
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_BACKEND_URL = os.environ.get("CLUSTER_BACKEND_URL", "")
+CLUSTER_MODE = bool(CLUSTER_BACKEND_URL)
+CLUSTER_KEY_PREFIX = os.environ.get("CLUSTER_KEY_PREFIX", "bolty:")
+REPLICA_ID = os.environ.get("REPLICA_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+class SharedBackend:
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError()
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        raise NotImplementedError()
+
+    def set_if_absent(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        """Set `key` unless it exists; returns whether it was set."""
+        raise NotImplementedError()
+
+    def delete(self, key: str):
+        raise NotImplementedError()
+
+    def delete_if_equals(self, key: str, value: str) -> bool:
+        raise NotImplementedError()
+
+    def expire_if_equals(self, key: str, value: str, ttl: float) -> bool:
+        """Reset the TTL of `key` if it still holds `value`; returns whether it did."""
+        raise NotImplementedError()
+
+    def ping(self) -> bool:
+        raise NotImplementedError()
+
+
+class MemoryBackend(SharedBackend):
+    """An in-process stand-in for Redis, for tests and single-replica runs."""
+
+    # Expired keys are dropped when read, and all at once every this many seconds
+    SWEEP_SECONDS = 60.0
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._lock = threading.Lock()
+        self._swept = time.monotonic()
+
+    def _live(self, key: str, now: float) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= now:
+            del self._data[key]
+            return None
+        return value
+
+    def _put(self, key: str, value: str, ttl: Optional[float], now: float):
+        self._data[key] = (value, now + ttl if ttl else None)
+        if now - self._swept > self.SWEEP_SECONDS:
+            self._swept = now
+            for expired in [k for k, (_, at) in self._data.items() if at and at <= now]:
+                del self._data[expired]
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._live(key, time.monotonic())
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        with self._lock:
+            self._put(key, value, ttl, time.monotonic())
+
+    def set_if_absent(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if self._live(key, now) is not None:
+                return False
+            self._put(key, value, ttl, now)
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_if_equals(self, key: str, value: str) -> bool:
+        with self._lock:
+            if self._live(key, time.monotonic()) != value:
+                return False
+            del self._data[key]
+            return True
+
+    def expire_if_equals(self, key: str, value: str, ttl: float) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if self._live(key, now) != value:
+                return False
+            self._put(key, value, ttl, now)
+            return True
+
+    def ping(self) -> bool:
+        return True
+
+
+# Compare-and-delete and compare-and-expire, atomic on the server
+_DELETE_IF_EQUALS = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+_EXPIRE_IF_EQUALS = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("PEXPIRE", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+def _milliseconds(ttl: Optional[float]) -> Optional[int]:
+    return max(1, int(ttl * 1000)) if ttl else None
+
+
+class RedisBackend(SharedBackend):
+    """Any Redis-compatible server, with every key under `CLUSTER_KEY_PREFIX`."""
+
+    def __init__(self, url: str, prefix: str = CLUSTER_KEY_PREFIX):
+        try:
+            import redis
+        except ImportError as e:
+            logger.error(
+                "[shared_backend] Install `redis` to use a Redis CLUSTER_BACKEND_URL"
+            )
+            raise e
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(
+            url, decode_responses=True, health_check_interval=30
+        )
+        self._delete_if_equals = self._redis.register_script(_DELETE_IF_EQUALS)
+        self._expire_if_equals = self._redis.register_script(_EXPIRE_IF_EQUALS)
+
+    def get(self, key: str) -> Optional[str]:
+        return self._redis.get(self.prefix + key)
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        self._redis.set(self.prefix + key, value, px=_milliseconds(ttl))
+
+    def set_if_absent(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        return bool(
+            self._redis.set(self.prefix + key, value, nx=True, px=_milliseconds(ttl))
+        )
+
+    def delete(self, key: str):
+        self._redis.delete(self.prefix + key)
+
+    def delete_if_equals(self, key: str, value: str) -> bool:
+        return bool(self._delete_if_equals(keys=[self.prefix + key], args=[value]))
+
+    def expire_if_equals(self, key: str, value: str, ttl: float) -> bool:
+        return bool(
+            self._expire_if_equals(
+                keys=[self.prefix + key], args=[value, _milliseconds(ttl)]
+            )
+        )
+
+    def ping(self) -> bool:
+        return bool(self._redis.ping())
+
+
+class LeaseTimeout(Exception):
+    pass
+
+
+class Lease:
+    """Holds `key` for this replica alone, renewing its TTL every third of it until released."""
+
+    def __init__(self, backend: SharedBackend, key: str, ttl: float):
+        self.backend = backend
+        self.key = key
+        self.ttl = ttl
+        self.holder = f"{REPLICA_ID}:{secrets.token_hex(4)}"
+        self._released = threading.Event()
+
+    def acquire(
+        self, timeout: float, cancellation: Optional[CancellationToken] = None
+    ) -> bool:
+        """Wait up to `timeout` seconds for the key; a cancelled `cancellation` ends the wait early."""
+        deadline = time.monotonic() + timeout
+        delay = 0.05
+        while not self.backend.set_if_absent(self.key, self.holder, self.ttl):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            wait = min(delay, remaining)
+            if cancellation is not None:
+                if cancellation.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+            delay = min(delay * 2, 0.5)
+        threading.Thread(
+            target=self._renew, name=f"lease-{self.key}", daemon=True
+        ).start()
+        return True
+
+    def _renew(self):
+        while not self._released.wait(self.ttl / 3):
+            try:
+                if not self.backend.expire_if_equals(self.key, self.holder, self.ttl):
+                    logger.warning(f"[shared_backend] Lost the lease on {self.key}")
+                    return
+            except Exception as e:
+                logger.warning(f"[shared_backend] Failed to renew {self.key}: {e}")
+
+    def release(self):
+        self._released.set()
+        try:
+            self.backend.delete_if_equals(self.key, self.holder)
+        except Exception as e:
+            # The lease expires by itself after its TTL
+            logger.warning(f"[shared_backend] Failed to release {self.key}: {e}")
+
+
+_backend: Optional[SharedBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_shared_backend() -> Optional[SharedBackend]:
+    """The backend shared by every replica, or None when cluster mode is off."""
+    global _backend
+    if not CLUSTER_MODE:
+        return None
+    with _backend_lock:
+        if _backend is None:
+            if CLUSTER_BACKEND_URL.startswith("memory://"):
+                _backend = MemoryBackend()
+            else:
+                _backend = RedisBackend(CLUSTER_BACKEND_URL)
+            logger.info(
+                f"[shared_backend] Cluster mode on as replica {REPLICA_ID}, "
+                f"sharing state through {CLUSTER_BACKEND_URL.split('://')[0]}"
+            )
+        return _backend
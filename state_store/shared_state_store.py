@@ -0,0 +1,33 @@
+from .user_state_store import UserStateStore
+from .user_identity import UserIdentity
+from .shared_backend import SharedBackend
+import logging
+import json
+from typing import Optional
+
+
+class SharedStateStore(UserStateStore):
+    """Keeps each user's provider selection in the cluster's shared backend, so every replica sees it."""
+
+    def __init__(
+        self,
+        backend: SharedBackend,
+        *,
+        logger: logging.Logger = logging.getLogger(__name__),
+    ):
+        self.backend = backend
+        self.logger = logger
+
+    def set_state(self, user_identity: UserIdentity):
+        state = user_identity["user_id"]
+        self.backend.set(f"user:{state}", json.dumps(user_identity))
+        return state
+
+    def get_state(self, user_id: str) -> Optional[UserIdentity]:
+        data = self.backend.get(f"user:{user_id}")
+        return json.loads(data) if data is not None else None
+
+    def unset_state(self, user_identity: UserIdentity):
+        state = user_identity["user_id"]
+        self.backend.delete(f"user:{state}")
+        return state
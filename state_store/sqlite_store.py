@@ -0,0 +1,36 @@
+# Base class for the local SQLite-backed stores kept under `./data`.
+# Each thread gets its own connection, and the database runs in WAL mode
+# so listener threads can write without blocking readers.
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+
+
+class SQLiteStore:
+    SCHEMA = ""
+
+    def __init__(
+        self,
+        *,
+        filename: str,
+        base_dir: str = "./data",
+        logger: logging.Logger = logging.getLogger(__name__),
+    ):
+        self.base_dir = base_dir
+        self.path = f"{base_dir}/{filename}"
+        self.logger = logger
+        self._local = threading.local()
+        Path(base_dir).mkdir(parents=True, exist_ok=True)
+        with self._connection() as connection:
+            connection.executescript(self.SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
@@ -0,0 +1,205 @@
+# Stores per-thread conversation state keyed by `(channel_id, thread_ts)`.
+# Thread summaries cover every message up to and including `summarized_until`,
+# so only the messages after it need to be sent to the provider.
+# Response chains map a thread to the last provider-side response, which already holds every message
+# up to and including `last_ts`.
+# In cluster mode both live in the shared backend instead, expiring `CLUSTER_THREAD_STATE_TTL_SECONDS`
+# after their last update, so whichever replica answers the next message in a thread finds them.
+import json
+import os
+import threading
+import time
+from typing import Optional, TypedDict, Union
+
+from .shared_backend import SharedBackend, get_shared_backend
+from .sqlite_store import SQLiteStore
+
+CLUSTER_THREAD_STATE_TTL_SECONDS = float(
+    os.environ.get("CLUSTER_THREAD_STATE_TTL_SECONDS", str(7 * 24 * 3600))
+)
+
+
+class ThreadSummary(TypedDict):
+    summary: str
+    summarized_until: str
+    updated_at: float
+
+
+class ResponseChain(TypedDict):
+    provider: str
+    model: str
+    response_id: str
+    last_ts: str
+    updated_at: float
+
+
+class ThreadStateStore(SQLiteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS thread_summaries (
+        channel_id TEXT NOT NULL,
+        thread_ts TEXT NOT NULL,
+        summary TEXT NOT NULL,
+        summarized_until TEXT NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (channel_id, thread_ts)
+    );
+    CREATE TABLE IF NOT EXISTS response_chains (
+        channel_id TEXT NOT NULL,
+        thread_ts TEXT NOT NULL,
+        provider TEXT NOT NULL,
+        model TEXT NOT NULL,
+        response_id TEXT NOT NULL,
+        last_ts TEXT NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (channel_id, thread_ts)
+    );
+    """
+
+    def __init__(self, *, base_dir: str = "./data"):
+        super().__init__(filename="threads.sqlite3", base_dir=base_dir)
+
+    def get_summary(self, channel_id: str, thread_ts: str) -> Optional[ThreadSummary]:
+        row = (
+            self._connection()
+            .execute(
+                """
+                SELECT summary, summarized_until, updated_at FROM thread_summaries
+                WHERE channel_id = ? AND thread_ts = ?
+                """,
+                (channel_id, thread_ts),
+            )
+            .fetchone()
+        )
+        return ThreadSummary(**dict(row)) if row else None
+
+    def set_summary(
+        self, channel_id: str, thread_ts: str, summary: str, summarized_until: str
+    ):
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO thread_summaries VALUES (?, ?, ?, ?, ?)",
+                (channel_id, thread_ts, summary, summarized_until, time.time()),
+            )
+
+    def get_response_chain(
+        self, channel_id: str, thread_ts: str
+    ) -> Optional[ResponseChain]:
+        row = (
+            self._connection()
+            .execute(
+                """
+                SELECT provider, model, response_id, last_ts, updated_at FROM response_chains
+                WHERE channel_id = ? AND thread_ts = ?
+                """,
+                (channel_id, thread_ts),
+            )
+            .fetchone()
+        )
+        return ResponseChain(**dict(row)) if row else None
+
+    def set_response_chain(
+        self,
+        channel_id: str,
+        thread_ts: str,
+        provider: str,
+        model: str,
+        response_id: str,
+        last_ts: str,
+    ):
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO response_chains VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    channel_id,
+                    thread_ts,
+                    provider,
+                    model,
+                    response_id,
+                    last_ts,
+                    time.time(),
+                ),
+            )
+
+    def delete_response_chain(self, channel_id: str, thread_ts: str):
+        with self._connection() as connection:
+            connection.execute(
+                "DELETE FROM response_chains WHERE channel_id = ? AND thread_ts = ?",
+                (channel_id, thread_ts),
+            )
+
+
+class SharedThreadStateStore:
+    """The `ThreadStateStore` interface over the cluster's shared backend."""
+
+    def __init__(
+        self, backend: SharedBackend, ttl: float = CLUSTER_THREAD_STATE_TTL_SECONDS
+    ):
+        self.backend = backend
+        self.ttl = ttl
+
+    def get_summary(self, channel_id: str, thread_ts: str) -> Optional[ThreadSummary]:
+        data = self.backend.get(f"summary:{channel_id}:{thread_ts}")
+        return ThreadSummary(**json.loads(data)) if data is not None else None
+
+    def set_summary(
+        self, channel_id: str, thread_ts: str, summary: str, summarized_until: str
+    ):
+        self.backend.set(
+            f"summary:{channel_id}:{thread_ts}",
+            json.dumps(
+                ThreadSummary(
+                    summary=summary,
+                    summarized_until=summarized_until,
+                    updated_at=time.time(),
+                )
+            ),
+            self.ttl,
+        )
+
+    def get_response_chain(
+        self, channel_id: str, thread_ts: str
+    ) -> Optional[ResponseChain]:
+        data = self.backend.get(f"chain:{channel_id}:{thread_ts}")
+        return ResponseChain(**json.loads(data)) if data is not None else None
+
+    def set_response_chain(
+        self,
+        channel_id: str,
+        thread_ts: str,
+        provider: str,
+        model: str,
+        response_id: str,
+        last_ts: str,
+    ):
+        self.backend.set(
+            f"chain:{channel_id}:{thread_ts}",
+            json.dumps(
+                ResponseChain(
+                    provider=provider,
+                    model=model,
+                    response_id=response_id,
+                    last_ts=last_ts,
+                    updated_at=time.time(),
+                )
+            ),
+            self.ttl,
+        )
+
+    def delete_response_chain(self, channel_id: str, thread_ts: str):
+        self.backend.delete(f"chain:{channel_id}:{thread_ts}")
+
+
+_store: Optional[Union[ThreadStateStore, SharedThreadStateStore]] = None
+_store_lock = threading.Lock()
+
+
+def get_thread_state_store() -> Union[ThreadStateStore, SharedThreadStateStore]:
+    global _store
+    with _store_lock:
+        if _store is None:
+            backend = get_shared_backend()
+            if backend is not None:
+                _store = SharedThreadStateStore(backend)
+            else:
+                _store = ThreadStateStore()
+        return _store
@@ -0,0 +1,359 @@
+# An append-only journal of every prompt Bolty sent and the response it got back, for audits and debugging.
+# Callers hand records to a background writer and return right away. The writer drains whatever has queued up,
+# appends each record as a length-prefixed, CRC-checked, zlib-compressed frame to the current segment file,
+# and makes the whole batch durable with a single fsync (group commit) before indexing it.
+# Segments roll over once they reach `TRANSCRIPT_SEGMENT_BYTES`.
+# A SQLite sidecar index maps `(channel, thread_ts)`, user and time to the frame's segment and offset,
+# and lookups read the frames through memory-mapped segments. Only indexed frames are visible to readers,
+# and anything written after the last indexed frame is truncated on startup.
+# When the writer falls `_MAX_QUEUED` records behind, new records are dropped and counted in `transcripts_dropped`.
+# Enable it with `TRANSCRIPT_JOURNAL=1`, and run `python -m state_store.transcript_journal --since 2026-10-01`
+# to export a time range as JSON lines.
+import argparse
+import atexit
+import json
+import logging
+import mmap
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from observability.metrics import increment
+
+from .sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPT_JOURNAL = os.environ.get("TRANSCRIPT_JOURNAL", "").lower() in ("1", "true")
+TRANSCRIPT_SEGMENT_BYTES = int(
+    os.environ.get("TRANSCRIPT_SEGMENT_BYTES", str(64 * 1024 * 1024))
+)
+TRANSCRIPT_DIR = "./data/transcripts"
+
+# Payload length and CRC32 of the compressed payload
+_HEADER = struct.Struct("<II")
+_MAX_BATCH = 512
+_MAX_QUEUED = 10_000
+_MAX_MAPPED_SEGMENTS = 32
+
+
+class TranscriptIndex(SQLiteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS frames (
+        id INTEGER PRIMARY KEY,
+        created_at REAL NOT NULL,
+        user_id TEXT,
+        channel_id TEXT,
+        thread_ts TEXT,
+        segment INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        length INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS frames_thread ON frames (channel_id, thread_ts, created_at);
+    CREATE INDEX IF NOT EXISTS frames_user ON frames (user_id, created_at);
+    CREATE INDEX IF NOT EXISTS frames_time ON frames (created_at);
+    CREATE INDEX IF NOT EXISTS frames_segment ON frames (segment, position);
+    """
+
+    def __init__(self, *, base_dir: str = TRANSCRIPT_DIR):
+        super().__init__(filename="index.sqlite3", base_dir=base_dir)
+
+    def add(self, frames: List[tuple]):
+        with self._connection() as connection:
+            connection.executemany(
+                """
+                INSERT INTO frames (created_at, user_id, channel_id, thread_ts, segment, position, length)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                frames,
+            )
+
+    def segment_end(self, segment: int) -> int:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT COALESCE(MAX(position + length), 0) FROM frames WHERE segment = ?",
+                (segment,),
+            )
+            .fetchone()
+        )
+        return row[0]
+
+    def lookup(self, where: str, params: tuple) -> List[tuple]:
+        return [
+            (row["segment"], row["position"])
+            for row in self._connection().execute(
+                f"SELECT segment, position FROM frames WHERE {where} ORDER BY created_at, id",
+                params,
+            )
+        ]
+
+
+class TranscriptJournal:
+    def __init__(
+        self,
+        *,
+        base_dir: str = TRANSCRIPT_DIR,
+        segment_bytes: int = TRANSCRIPT_SEGMENT_BYTES,
+        read_only: bool = False,
+    ):
+        self.base_dir = Path(base_dir)
+        self.segment_bytes = segment_bytes
+        self.index = TranscriptIndex(base_dir=base_dir)
+        self._maps: "OrderedDict[int, mmap.mmap]" = OrderedDict()
+        self._maps_lock = threading.Lock()
+        self._writer = None
+        if read_only:
+            # Readers must not truncate the frames a running writer has yet to index
+            return
+        self._queue: queue.Queue = queue.Queue(maxsize=_MAX_QUEUED)
+        self._open_last_segment()
+        self._writer = threading.Thread(
+            target=self._run, name="transcript-journal", daemon=True
+        )
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.base_dir / f"segment-{segment:06d}.log"
+
+    def _open_last_segment(self):
+        segments = [int(path.stem[8:]) for path in self.base_dir.glob("segment-*.log")]
+        self._segment = max(segments, default=1)
+        # Frames the index never saw were not acknowledged as durable; drop them
+        end = self.index.segment_end(self._segment)
+        path = self._segment_path(self._segment)
+        self._file = open(path, "r+b" if path.exists() else "w+b")
+        if os.fstat(self._file.fileno()).st_size > end:
+            logger.warning(
+                f"[transcript_journal] Truncating {path.name} to {end} bytes"
+            )
+            self._file.truncate(end)
+        self._file.seek(end)
+        self._size = end
+
+    def _rotate(self):
+        self._sync()
+        self._file.close()
+        self._segment += 1
+        self._file = open(self._segment_path(self._segment), "w+b")
+        self._size = 0
+        logger.info(f"[transcript_journal] Rotated to segment {self._segment}")
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def append(self, record: dict):
+        record.setdefault("created_at", time.time())
+        # A stalled writer must not block the listener threads; the transcript is dropped instead
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            increment("transcripts_dropped")
+            logger.warning(
+                f"[transcript_journal] Writer is {_MAX_QUEUED} records behind, dropping a transcript"
+            )
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Everything that queued up while the last batch was syncing goes out with this one
+            while len(batch) < _MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [record for record in batch if record is not None]
+            try:
+                if records:
+                    self._commit(records)
+            except Exception as e:
+                logger.error(
+                    f"[transcript_journal] Failed to write {len(records)} records: {type(e).__name__}: {str(e)}",
+                    exc_info=True,
+                )
+            if None in batch:
+                return
+
+    def _commit(self, records: List[dict]):
+        frames = []
+        for record in records:
+            payload = zlib.compress(
+                json.dumps(record, separators=(",", ":")).encode("utf-8")
+            )
+            frame = _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+            if self._size and self._size + len(frame) > self.segment_bytes:
+                self._rotate()
+            self._file.write(frame)
+            frames.append(
+                (
+                    record["created_at"],
+                    record.get("user_id"),
+                    record.get("channel_id"),
+                    record.get("thread_ts"),
+                    self._segment,
+                    self._size,
+                    len(frame),
+                )
+            )
+            self._size += len(frame)
+        self._sync()
+        self.index.add(frames)
+
+    def close(self):
+        if self._writer is None:
+            return
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        if not self._file.closed:
+            self._file.close()
+
+    def _read(self, segment: int, position: int) -> dict:
+        with self._maps_lock:
+            view = self._maps.get(segment)
+            if view is None or position + _HEADER.size > len(view):
+                # The active segment has grown past the old mapping; older mappings are
+                # left for the garbage collector, as another thread may still be reading them
+                with open(self._segment_path(segment), "rb") as file:
+                    view = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[segment] = view
+                if len(self._maps) > _MAX_MAPPED_SEGMENTS:
+                    self._maps.popitem(last=False)
+            self._maps.move_to_end(segment)
+        length, crc = _HEADER.unpack_from(view, position)
+        start = position + _HEADER.size
+        payload = view[start : start + length]
+        if zlib.crc32(payload) != crc:
+            raise ValueError(
+                f"Corrupt transcript frame at segment {segment}, offset {position}"
+            )
+        return json.loads(zlib.decompress(payload))
+
+    def find(
+        self,
+        since: float = 0,
+        until: float = float("inf"),
+        user_id: Optional[str] = None,
+        channel_id: Optional[str] = None,
+        thread_ts: Optional[str] = None,
+    ) -> Iterator[dict]:
+        where = ["created_at >= ?", "created_at < ?"]
+        params = [since, until]
+        for column, value in (
+            ("user_id", user_id),
+            ("channel_id", channel_id),
+            ("thread_ts", thread_ts),
+        ):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        for segment, position in self.index.lookup(" AND ".join(where), tuple(params)):
+            yield self._read(segment, position)
+
+    def thread(self, channel_id: str, thread_ts: str) -> List[dict]:
+        return list(self.find(channel_id=channel_id, thread_ts=thread_ts))
+
+    def user(
+        self, user_id: str, since: float = 0, until: float = float("inf")
+    ) -> List[dict]:
+        return list(self.find(since, until, user_id=user_id))
+
+
+_journal: Optional[TranscriptJournal] = None
+_journal_lock = threading.Lock()
+
+
+def get_transcript_journal() -> TranscriptJournal:
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = TranscriptJournal()
+        return _journal
+
+
+def record_transcript(
+    user_id: str,
+    channel_id: Optional[str],
+    thread_ts: Optional[str],
+    listener: str,
+    prompt: str,
+    system_content: str,
+    response: str,
+    metadata: dict,
+):
+    if not TRANSCRIPT_JOURNAL:
+        return
+    # Journaling must never fail the reply it journals
+    try:
+        get_transcript_journal().append(
+            {
+                "user_id": user_id,
+                "channel_id": channel_id,
+                "thread_ts": thread_ts,
+                "listener": listener,
+                "prompt": prompt,
+                "system_content": system_content,
+                "response": response,
+                "metadata": dict(metadata),
+            }
+        )
+    except Exception as e:
+        logger.error(
+            f"[transcript_journal] Failed to record transcript: {type(e).__name__}: {str(e)}",
+            exc_info=True,
+        )
+
+
+def _timestamp(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export Bolty's transcript journal as JSON lines."
+    )
+    parser.add_argument(
+        "--since", required=True, help="ISO date or time, or a Unix timestamp"
+    )
+    parser.add_argument("--until", help="ISO date or time, or a Unix timestamp")
+    parser.add_argument("--user", help="Only this user's transcripts")
+    parser.add_argument("--channel", help="Only this channel's transcripts")
+    parser.add_argument("--thread-ts", help="Only this thread, with --channel")
+    parser.add_argument("--output", help="Write to this file instead of stdout")
+    parser.add_argument("--base-dir", default=TRANSCRIPT_DIR)
+    args = parser.parse_args()
+    if args.thread_ts and not args.channel:
+        parser.error("--thread-ts requires --channel")
+
+    journal = TranscriptJournal(base_dir=args.base_dir, read_only=True)
+    records = journal.find(
+        _timestamp(args.since),
+        _timestamp(args.until) if args.until else float("inf"),
+        user_id=args.user,
+        channel_id=args.channel,
+        thread_ts=args.thread_ts,
+    )
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for record in records:
+            output.write(json.dumps(record) + "\n")
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
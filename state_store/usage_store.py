@@ -0,0 +1,141 @@
+# Stores token usage and latency of provider calls as hourly rollups keyed by
+# user, channel, model and listener type, so the store stays compact no matter how many requests are made.
+# Run `python -m state_store.usage_store --by user_id --hours 24` to query it.
+import argparse
+import time
+from typing import List, Optional
+
+from .sqlite_store import SQLiteStore
+
+GROUP_COLUMNS = ("user_id", "channel_id", "provider", "model", "listener")
+
+
+class UsageStore(SQLiteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS usage_rollup (
+        hour INTEGER NOT NULL,
+        user_id TEXT NOT NULL,
+        channel_id TEXT NOT NULL,
+        provider TEXT NOT NULL,
+        model TEXT NOT NULL,
+        listener TEXT NOT NULL,
+        requests INTEGER NOT NULL DEFAULT 0,
+        input_tokens INTEGER NOT NULL DEFAULT 0,
+        output_tokens INTEGER NOT NULL DEFAULT 0,
+        cached_tokens INTEGER NOT NULL DEFAULT 0,
+        reasoning_tokens INTEGER NOT NULL DEFAULT 0,
+        wall_time REAL NOT NULL DEFAULT 0,
+        cost REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (hour, user_id, channel_id, provider, model, listener)
+    );
+    CREATE INDEX IF NOT EXISTS usage_rollup_user ON usage_rollup (user_id, hour);
+    """
+
+    def __init__(self, *, base_dir: str = "./data"):
+        super().__init__(filename="usage.sqlite3", base_dir=base_dir)
+
+    def record(
+        self,
+        *,
+        user_id: str,
+        channel_id: Optional[str],
+        listener: str,
+        metadata: dict,
+        cost: float = 0.0,
+        timestamp: Optional[float] = None,
+    ):
+        hour = int((timestamp or time.time()) // 3600)
+        with self._connection() as connection:
+            connection.execute(
+                """
+                INSERT INTO usage_rollup VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (hour, user_id, channel_id, provider, model, listener) DO UPDATE SET
+                    requests = requests + 1,
+                    input_tokens = input_tokens + excluded.input_tokens,
+                    output_tokens = output_tokens + excluded.output_tokens,
+                    cached_tokens = cached_tokens + excluded.cached_tokens,
+                    reasoning_tokens = reasoning_tokens + excluded.reasoning_tokens,
+                    wall_time = wall_time + excluded.wall_time,
+                    cost = cost + excluded.cost
+                """,
+                (
+                    hour,
+                    user_id or "unknown",
+                    channel_id or "",
+                    metadata["provider"],
+                    metadata["model"],
+                    listener,
+                    metadata["input_tokens"],
+                    metadata["output_tokens"],
+                    metadata["cached_tokens"],
+                    metadata["reasoning_tokens"],
+                    metadata["wall_time"],
+                    cost,
+                ),
+            )
+
+    def rollup(self, group_by: str, since: Optional[float] = None) -> List[dict]:
+        if group_by not in GROUP_COLUMNS:
+            raise ValueError(f"Cannot group usage by {group_by}")
+        since_hour = int(since // 3600) if since else 0
+        rows = (
+            self._connection()
+            .execute(
+                f"""
+                SELECT {group_by} AS key,
+                    SUM(requests) AS requests,
+                    SUM(input_tokens) AS input_tokens,
+                    SUM(output_tokens) AS output_tokens,
+                    SUM(cached_tokens) AS cached_tokens,
+                    SUM(reasoning_tokens) AS reasoning_tokens,
+                    SUM(wall_time) / SUM(requests) AS avg_wall_time,
+                    SUM(cost) AS cost
+                FROM usage_rollup WHERE hour >= ?
+                GROUP BY {group_by} ORDER BY cost DESC, input_tokens DESC
+                """,
+                (since_hour,),
+            )
+            .fetchall()
+        )
+        return [dict(row) for row in rows]
+
+    def user_tokens_since(self, user_id: str, since: float) -> int:
+        row = (
+            self._connection()
+            .execute(
+                """
+                SELECT COALESCE(SUM(input_tokens + output_tokens), 0) FROM usage_rollup
+                WHERE user_id = ? AND hour >= ?
+                """,
+                (user_id, int(since // 3600)),
+            )
+            .fetchone()
+        )
+        return row[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query Bolty's token usage rollups.")
+    parser.add_argument("--by", choices=GROUP_COLUMNS, default="user_id")
+    parser.add_argument("--hours", type=float, default=24, help="Look-back window")
+    parser.add_argument("--base-dir", default="./data")
+    args = parser.parse_args()
+
+    rows = UsageStore(base_dir=args.base_dir).rollup(
+        args.by, since=time.time() - args.hours * 3600
+    )
+    header = (
+        f"{args.by:<24} {'requests':>8} {'input':>10} {'output':>10} "
+        f"{'cached':>10} {'reasoning':>10} {'avg_s':>7} {'cost_usd':>10}"
+    )
+    print(header)
+    for row in rows:
+        print(
+            f"{row['key'] or '-':<24} {row['requests']:>8} {row['input_tokens']:>10} "
+            f"{row['output_tokens']:>10} {row['cached_tokens']:>10} "
+            f"{row['reasoning_tokens']:>10} {row['avg_wall_time']:>7.2f} {row['cost']:>10.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# Compares every hot-path benchmark against the baseline stored in `baselines.json`, and fails the test
+# when it is more than `BENCHMARK_REGRESSION_THRESHOLD` (a fraction, 0.5 by default) slower.
+# Timings are the fastest round, divided by the fastest run of a fixed calibration workload timed right after
+# the benchmark, so baselines are multiples of the calibration and hold across machines and load.
+# Run `BENCHMARK_UPDATE_BASELINES=1 python -m pytest tests/benchmarks` to record new baselines after an
+# intended change. With `--benchmark-disable` the benchmarks run once, as plain tests, and are not compared.
+import json
+import os
+import platform
+import time
+from pathlib import Path
+
+import pytest
+
+BASELINES_PATH = Path(__file__).with_name("baselines.json")
+BENCHMARK_REGRESSION_THRESHOLD = float(
+    os.environ.get("BENCHMARK_REGRESSION_THRESHOLD", "0.5")
+)
+BENCHMARK_UPDATE_BASELINES = os.environ.get(
+    "BENCHMARK_UPDATE_BASELINES", ""
+).lower() in ("1", "true")
+
+_measured = {}
+
+
+def _load_baselines() -> dict:
+    if not BASELINES_PATH.exists():
+        return {}
+    return json.loads(BASELINES_PATH.read_text())["benchmarks"]
+
+
+def _calibrate() -> float:
+    """Fastest of 100 runs of a fixed pure-Python workload of string building, sorting and splitting."""
+    words = [f"word{index}" for index in range(2000)]
+    fastest = float("inf")
+    for _ in range(100):
+        start = time.perf_counter()
+        "\n".join(sorted(words, key=lambda word: word[::-1])).split("\n")
+        fastest = min(fastest, time.perf_counter() - start)
+    return fastest
+
+
+@pytest.fixture(scope="session")
+def baselines() -> dict:
+    return _load_baselines()
+
+
+@pytest.fixture
+def hot_path(benchmark, baselines, request):
+    """Benchmark `function(*args)` and fail if it regressed past the threshold."""
+
+    def run(function, *args, **kwargs):
+        result = benchmark(function, *args, **kwargs)
+        if benchmark.disabled:
+            return result
+        name = request.node.name
+        relative = benchmark.stats.stats.min / _calibrate()
+        _measured[name] = relative
+        baseline = baselines.get(name)
+        if BENCHMARK_UPDATE_BASELINES or baseline is None:
+            return result
+        limit = baseline * (1 + BENCHMARK_REGRESSION_THRESHOLD)
+        if relative > limit:
+            pytest.fail(
+                f"{name} regressed: {relative:.3f}x the calibration workload against a baseline of "
+                f"{baseline:.3f}x (limit {limit:.3f}x)"
+            )
+        return result
+
+    return run
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if not BENCHMARK_UPDATE_BASELINES or not _measured:
+        return
+    # Benchmarks that did not run this session keep their previous baseline
+    benchmarks = {**_load_baselines(), **_measured}
+    BASELINES_PATH.write_text(
+        json.dumps(
+            {
+                "machine": platform.machine(),
+                "python": platform.python_version(),
+                "benchmarks": dict(sorted(benchmarks.items())),
+            },
+            indent=2,
+        )
+        + "\n"
+    )
@@ -0,0 +1,110 @@
+# Realistic, deterministic inputs for the hot-path benchmarks: long Slack threads as returned by
+# `conversations.replies`, long markdown model outputs, and large model catalogs.
+# Every corpus is generated from a fixed seed, so the baselines always measure the same work.
+import random
+from typing import List
+
+_WORDS = (
+    "deploy staging migration lock timeout retry billing service queue worker latency "
+    "cache index schema rollout incident alert dashboard metric threshold owner review "
+    "release branch config secret token region cluster node pod replica shard backup"
+).split()
+
+_JOIN_SUBTYPES = ("channel_join", "channel_topic", "pinned_item")
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _paragraph(rng: random.Random, sentences: int) -> str:
+    return " ".join(_sentence(rng, rng.randint(6, 18)) for _ in range(sentences))
+
+
+def slack_thread(messages: int = 200, seed: int = 200) -> List[dict]:
+    """A thread of `messages` replies from several users, with bot replies, joins and file shares mixed in."""
+    rng = random.Random(seed)
+    users = [f"U{index:08d}" for index in range(12)]
+    thread = []
+    for index in range(messages):
+        ts = f"{1_760_000_000 + index * 37}.{index:06d}"
+        kind = rng.random()
+        if kind < 0.03:
+            thread.append(
+                {
+                    "type": "message",
+                    "subtype": rng.choice(_JOIN_SUBTYPES),
+                    "user": rng.choice(users),
+                    "text": "",
+                    "ts": ts,
+                }
+            )
+        elif kind < 0.25:
+            thread.append(
+                {
+                    "type": "message",
+                    "bot_id": "B00000001",
+                    "text": "\n\n".join(
+                        _paragraph(rng, rng.randint(2, 6))
+                        for _ in range(rng.randint(1, 4))
+                    ),
+                    "ts": ts,
+                }
+            )
+        else:
+            message = {
+                "type": "message",
+                "user": rng.choice(users),
+                "text": _paragraph(rng, rng.randint(1, 4)),
+                "ts": ts,
+            }
+            if kind > 0.95:
+                message["files"] = [
+                    {
+                        "id": f"F{index:08d}",
+                        "name": "notes.txt",
+                        "mimetype": "text/plain",
+                    }
+                ]
+            thread.append(message)
+    return thread
+
+
+def model_output(size: int = 50_000, seed: int = 50) -> str:
+    """A long markdown answer with headers, lists, bold and italic text, links and code blocks."""
+    rng = random.Random(seed)
+    sections = []
+    length = 0
+    while length < size:
+        section = [
+            f"## {_sentence(rng, 4)[:-1]}",
+            _paragraph(rng, rng.randint(2, 5)).replace(" service ", " **service** ", 1),
+            "\n".join(
+                f"- *{rng.choice(_WORDS)}*: {_sentence(rng, rng.randint(5, 12))}"
+                for _ in range(rng.randint(3, 7))
+            ),
+            f"See [the {rng.choice(_WORDS)} runbook](https://example.com/runbooks/{rng.randint(1, 999)}) for details.",
+            "```python\n"
+            + "\n".join(
+                f"{rng.choice(_WORDS)}_{line} = {rng.randint(0, 10_000)}"
+                for line in range(rng.randint(3, 10))
+            )
+            + "\n```",
+        ]
+        text = "\n\n".join(section)
+        sections.append(text)
+        length += len(text) + 2
+    return "\n\n".join(sections)[:size]
+
+
+def model_catalog(models: int = 300) -> dict:
+    """A catalog shaped like `get_available_providers()`, spread across the providers."""
+    providers = ("OpenAI", "Anthropic", "VertexAI", "Local")
+    return {
+        f"model-{index:04d}": {
+            "name": f"Model {index:04d}",
+            "provider": providers[index % len(providers)],
+            "max_tokens": 4096 * (1 + index % 8),
+        }
+        for index in range(models)
+    }
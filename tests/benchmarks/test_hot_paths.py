@@ -0,0 +1,57 @@
+from ai.providers import build_prompt, build_system_content, convert_markdown_to_slack
+from listeners.events.app_home_opened import build_model_options
+from listeners.listener_utils.message_utils import MAX_MESSAGE_LENGTH, split_message
+from listeners.listener_utils.parse_conversation import parse_conversation
+
+from .corpora import model_catalog, model_output, slack_thread
+
+THREAD = slack_thread(200)
+PARSED_THREAD = parse_conversation(THREAD)
+OUTPUT = model_output(50_000)
+CATALOG = model_catalog(300)
+
+
+def test_split_message_50kb_output(hot_path):
+    chunks = hot_path(split_message, OUTPUT)
+    assert len(chunks) >= len(OUTPUT) // MAX_MESSAGE_LENGTH
+    assert all(len(chunk) <= MAX_MESSAGE_LENGTH for chunk in chunks)
+
+
+def test_split_message_50kb_without_newlines(hot_path):
+    chunks = hot_path(split_message, OUTPUT.replace("\n", " "))
+    assert all(len(chunk) <= MAX_MESSAGE_LENGTH for chunk in chunks)
+
+
+def test_convert_markdown_to_slack_50kb_output(hot_path):
+    converted = hot_path(convert_markdown_to_slack, OUTPUT)
+    assert "**" not in converted
+    assert "](https://" not in converted
+
+
+def test_parse_conversation_200_messages(hot_path):
+    parsed = hot_path(parse_conversation, THREAD)
+    assert 0 < len(parsed) < len(THREAD)
+    assert all(message["user"] and message["text"] for message in parsed)
+
+
+def test_prompt_assembly_200_messages(hot_path):
+    def assemble():
+        return build_prompt("Can you summarize this thread?", PARSED_THREAD), (
+            build_system_content()
+        )
+
+    prompt, system_content = hot_path(assemble)
+    assert prompt.startswith("Prompt: Can you summarize this thread?")
+    assert "Current date:" in system_content
+
+
+def test_build_model_options_300_models(hot_path):
+    options, initial_option = hot_path(build_model_options, CATALOG)
+    assert len(options) == len(CATALOG) + 2
+    assert initial_option["value"] == "null"
+
+
+def test_build_model_options_300_models_with_selection(hot_path):
+    options, initial_option = hot_path(build_model_options, CATALOG, "model-0299")
+    assert len(options) == len(CATALOG) + 1
+    assert initial_option["value"] == "model-0299 local"
@@ -0,0 +1,126 @@
+import time
+
+import pytest
+
+from listeners.listener_utils import job_workers
+from listeners.listener_utils.message_utils import MAX_MESSAGE_LENGTH
+from state_store.job_queue import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    queue = JobQueue(base_dir=str(tmp_path))
+    monkeypatch.setattr(job_workers, "_queue", queue)
+    return queue
+
+
+class FlakySlackClient:
+    """Records the chunks it is sent, failing the first attempt to post the `fail_at` chunk."""
+
+    def __init__(self, fail_at: int):
+        self.fail_at = fail_at
+        self.chunks = []
+
+    def chat_update(self, channel, ts, text):
+        self._post(text)
+
+    def chat_postMessage(self, channel, thread_ts, text):
+        self._post(text)
+
+    def _post(self, text):
+        if len(self.chunks) == self.fail_at:
+            self.fail_at = None
+            raise ConnectionError("Slack is unreachable")
+        self.chunks.append(text)
+
+
+def test_claimed_job_is_hidden_until_its_visibility_timeout(queue):
+    job_id = queue.enqueue("app_messaged", {"text": "hi"}, "D1", "1.0")
+    job = queue.claim(visibility_timeout=0.1)
+    assert job["id"] == job_id
+    assert job["attempts"] == 1
+    assert job["payload"] == {"text": "hi"}
+    assert queue.claim(visibility_timeout=0.1) is None
+    time.sleep(0.15)
+    # The worker holding it died; another one picks it up
+    assert queue.claim(visibility_timeout=0.1)["attempts"] == 2
+
+
+def test_retried_job_waits_for_its_delay(queue):
+    job_id = queue.enqueue("app_messaged", {}, "D1", "1.0")
+    queue.claim(visibility_timeout=60)
+    queue.retry(job_id, "RuntimeError: boom", delay=0.1)
+    assert queue.claim(visibility_timeout=60) is None
+    time.sleep(0.15)
+    job = queue.claim(visibility_timeout=60)
+    assert job["attempts"] == 2
+    assert job["last_error"] == "RuntimeError: boom"
+
+
+def test_dead_lettered_job_is_not_claimed_again(queue):
+    job_id = queue.enqueue("app_messaged", {}, "D1", "1.0")
+    queue.claim(visibility_timeout=60)
+    queue.dead_letter(job_id, "RuntimeError: boom")
+    assert queue.claim(visibility_timeout=0) is None
+    assert queue.unfinished() == []
+    assert [job["id"] for job in queue.dead_letters()] == [job_id]
+
+
+def test_unfinished_jobs_are_released_on_restart(queue):
+    job_id = queue.enqueue("app_messaged", {}, "D1", "1.0")
+    queue.claim(visibility_timeout=60)
+    assert [job["id"] for job in queue.unfinished()] == [job_id]
+    queue.release(job_id)
+    assert queue.claim(visibility_timeout=60)["id"] == job_id
+
+
+def test_completed_job_is_deleted(queue):
+    job_id = queue.enqueue("app_messaged", {}, "D1", "1.0")
+    queue.claim(visibility_timeout=60)
+    queue.complete(job_id)
+    assert queue.unfinished() == []
+    assert queue.dead_letters() == []
+
+
+def test_job_keeps_its_installation(queue):
+    installation = {
+        "enterprise_id": None,
+        "team_id": "T2",
+        "is_enterprise_install": False,
+    }
+    queue.enqueue("app_messaged", {}, "D1", "1.0", installation)
+    assert queue.claim(visibility_timeout=60)["installation"] == installation
+    assert queue.unfinished()[0]["installation"] == installation
+
+
+def test_retry_posts_the_rest_of_the_same_response(queue):
+    response = "\n".join(
+        f"{number}" * (MAX_MESSAGE_LENGTH // 2) for number in range(1, 6)
+    )
+    generated = []
+    client = FlakySlackClient(fail_at=1)
+
+    def handle(job):
+        def generate():
+            generated.append(job["id"])
+            return response
+
+        reset = job_workers._current_job.set(job)
+        try:
+            text = job_workers.job_response(generate)
+            job_workers.send_response(client, "D1", "1.0", "1.0", text)
+        finally:
+            job_workers._current_job.reset(reset)
+
+    job_id = queue.enqueue("app_messaged", {}, "D1", "1.0")
+    with pytest.raises(ConnectionError):
+        handle(queue.claim(visibility_timeout=60))
+    queue.retry(job_id, "ConnectionError: Slack is unreachable", delay=0)
+
+    job = queue.claim(visibility_timeout=60)
+    assert job["posted_chunks"] == 1
+    handle(job)
+    queue.complete(job_id)
+
+    assert generated == [job_id]
+    assert "\n".join(client.chunks) == response
@@ -0,0 +1,154 @@
+from ai.model_router import DEFAULT_LATENCY_SLO_SECONDS, Route
+from ai.overload import (
+    LEVELS,
+    OVERLOAD_CONTEXT_MESSAGES,
+    OVERLOAD_FAST_MODEL,
+    OverloadController,
+    degrade_route,
+    trim_context,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+def controller(clock: FakeClock) -> OverloadController:
+    return OverloadController(
+        window_seconds=60,
+        queue_wait_seconds=5,
+        step_seconds=10,
+        recovery_seconds=30,
+        recovery_pressure=0.5,
+        clock=clock,
+    )
+
+
+def overload(overload_controller: OverloadController, clock: FakeClock, steps: int):
+    for _ in range(steps):
+        clock.advance(10)
+        overload_controller.record_queue_wait(8)
+
+
+def test_stays_normal_without_pressure():
+    clock = FakeClock()
+    overload_controller = controller(clock)
+    for _ in range(20):
+        clock.advance(5)
+        overload_controller.record_queue_wait(1)
+        overload_controller.record_latency("app_mentioned", 1)
+    assert overload_controller.level == 0
+    assert overload_controller.degradation("app_mentioned") == {
+        "level": 0,
+        "context_messages": None,
+        "web_search": True,
+        "fast_model": False,
+        "max_output_tokens": None,
+        "shed": False,
+    }
+
+
+def test_steps_up_one_level_per_step():
+    clock = FakeClock()
+    overload_controller = controller(clock)
+    overload_controller.record_queue_wait(8)
+    clock.advance(9)
+    assert overload_controller.level == 0
+    clock.advance(1)
+    assert overload_controller.level == 1
+    # Many slow requests within one step still move a single level
+    for _ in range(50):
+        overload_controller.record_queue_wait(8)
+    assert overload_controller.level == 1
+
+
+def test_levels_add_up_and_stop_at_shedding():
+    clock = FakeClock()
+    overload_controller = controller(clock)
+    overload(overload_controller, clock, 1)
+    assert overload_controller.degradation("app_mentioned")["context_messages"] == (
+        OVERLOAD_CONTEXT_MESSAGES
+    )
+    overload(overload_controller, clock, 1)
+    assert not overload_controller.degradation("app_mentioned")["web_search"]
+    overload(overload_controller, clock, 1)
+    assert overload_controller.degradation("app_mentioned")["fast_model"]
+    overload(overload_controller, clock, 1)
+    assert overload_controller.degradation("app_mentioned")["max_output_tokens"]
+    overload(overload_controller, clock, 10)
+    assert overload_controller.level == len(LEVELS) - 1
+    assert overload_controller.degradation("summary_function")["shed"]
+    assert not overload_controller.degradation("app_mentioned")["shed"]
+
+
+def test_slow_provider_calls_raise_the_level():
+    clock = FakeClock()
+    overload_controller = controller(clock)
+    for _ in range(3):
+        clock.advance(10)
+        overload_controller.record_latency(
+            "unknown_listener", DEFAULT_LATENCY_SLO_SECONDS * 2
+        )
+    assert overload_controller.level == 3
+
+
+def test_holds_its_level_between_the_recovery_and_overload_pressure():
+    clock = FakeClock()
+    overload_controller = controller(clock)
+    overload(overload_controller, clock, 2)
+    clock.advance(60)
+    for _ in range(20):
+        clock.advance(10)
+        overload_controller.record_queue_wait(3)
+    assert overload_controller.level == 2
+
+
+def test_recovers_one_level_per_recovery_period():
+    clock = FakeClock()
+    overload_controller = controller(clock)
+    overload(overload_controller, clock, 3)
+    # The slow samples leave the window first
+    clock.advance(61)
+    overload_controller.record_queue_wait(0)
+    assert overload_controller.level == 1
+    clock.advance(29)
+    overload_controller.record_queue_wait(0)
+    assert overload_controller.level == 1
+    clock.advance(1)
+    overload_controller.record_queue_wait(0)
+    assert overload_controller.level == 0
+
+
+def test_recovers_several_levels_after_an_idle_period():
+    clock = FakeClock()
+    overload_controller = controller(clock)
+    overload(overload_controller, clock, 5)
+    clock.advance(3600)
+    assert overload_controller.level == 0
+
+
+def test_trim_context_keeps_the_most_recent_messages():
+    degradation = {"context_messages": 2}
+    assert trim_context([1, 2, 3, 4], degradation) == [3, 4]
+    assert trim_context([1, 2], degradation) == [1, 2]
+    assert trim_context([1, 2, 3], {"context_messages": None}) == [1, 2, 3]
+    assert trim_context(None, degradation) is None
+
+
+def test_degrade_route_switches_to_the_fast_model_when_available():
+    route = Route(
+        provider="anthropic", model="claude", reasoning_effort="high", reason="default"
+    )
+    degradation = {"level": 3, "fast_model": True}
+    degraded = degrade_route(route, degradation, {OVERLOAD_FAST_MODEL: {}})
+    assert degraded["model"] == OVERLOAD_FAST_MODEL
+    assert degraded["reasoning_effort"] is None
+    assert degrade_route(route, degradation, {}) == route
+    assert degrade_route(route, {"level": 2, "fast_model": False}, {}) == route
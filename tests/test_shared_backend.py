@@ -0,0 +1,107 @@
+import time
+
+from slack_bolt import BoltResponse
+
+from ai.cancellation import CancellationToken
+from listeners import middleware
+from state_store.shared_backend import Lease, MemoryBackend
+
+
+def test_set_if_absent_only_sets_once():
+    backend = MemoryBackend()
+    assert backend.set_if_absent("key", "first")
+    assert not backend.set_if_absent("key", "second")
+    assert backend.get("key") == "first"
+
+
+def test_keys_expire_after_their_ttl():
+    backend = MemoryBackend()
+    backend.set("key", "value", ttl=0.05)
+    assert backend.get("key") == "value"
+    time.sleep(0.1)
+    assert backend.get("key") is None
+    assert backend.set_if_absent("key", "again")
+
+
+def test_compare_and_delete_leaves_other_holders_alone():
+    backend = MemoryBackend()
+    backend.set("key", "mine")
+    assert not backend.delete_if_equals("key", "theirs")
+    assert not backend.expire_if_equals("key", "theirs", 0.05)
+    assert backend.delete_if_equals("key", "mine")
+    assert backend.get("key") is None
+
+
+def test_lease_is_exclusive_until_released():
+    backend = MemoryBackend()
+    first = Lease(backend, "thread", ttl=5)
+    second = Lease(backend, "thread", ttl=5)
+    assert first.acquire(timeout=0)
+    assert not second.acquire(timeout=0.1)
+    first.release()
+    assert second.acquire(timeout=0)
+    assert backend.get("thread") == second.holder
+    second.release()
+    assert backend.get("thread") is None
+
+
+def test_lease_is_renewed_while_held():
+    backend = MemoryBackend()
+    lease = Lease(backend, "thread", ttl=0.15)
+    assert lease.acquire(timeout=0)
+    time.sleep(0.5)
+    assert backend.get("thread") == lease.holder
+    assert not Lease(backend, "thread", ttl=0.15).acquire(timeout=0)
+    lease.release()
+
+
+def test_lease_expires_when_its_holder_stops_renewing():
+    backend = MemoryBackend()
+    lease = Lease(backend, "thread", ttl=0.1)
+    assert lease.acquire(timeout=0)
+    # A replica that dies stops renewing without deleting the key
+    lease._released.set()
+    successor = Lease(backend, "thread", ttl=5)
+    assert successor.acquire(timeout=1)
+    successor.release()
+
+
+def test_lease_release_after_expiry_keeps_the_new_holder():
+    backend = MemoryBackend()
+    lease = Lease(backend, "thread", ttl=0.05)
+    assert lease.acquire(timeout=0)
+    lease._released.set()
+    time.sleep(0.1)
+    successor = Lease(backend, "thread", ttl=5)
+    assert successor.acquire(timeout=0)
+    lease.release()
+    assert backend.get("thread") == successor.holder
+    successor.release()
+
+
+def test_cancelled_wait_for_a_lease_returns_early():
+    backend = MemoryBackend()
+    holder = Lease(backend, "thread", ttl=5)
+    assert holder.acquire(timeout=0)
+    token = CancellationToken()
+    token.cancel("superseded")
+    started = time.monotonic()
+    assert not Lease(backend, "thread", ttl=5).acquire(timeout=5, cancellation=token)
+    assert time.monotonic() - started < 1
+    holder.release()
+
+
+def test_event_dedupe_lets_one_delivery_through(monkeypatch):
+    backend = MemoryBackend()
+    monkeypatch.setattr(middleware, "get_shared_backend", lambda: backend)
+    body = {"event_id": "Ev123", "event": {"type": "app_mention"}}
+    handled = []
+
+    def next():
+        handled.append(body["event_id"])
+
+    assert middleware.event_dedupe_middleware(body, next) is None
+    duplicate = middleware.event_dedupe_middleware(dict(body), next)
+    assert isinstance(duplicate, BoltResponse)
+    assert duplicate.status == 200
+    assert handled == ["Ev123"]
@@ -0,0 +1,139 @@
+import os
+import threading
+
+import pytest
+
+from observability.metrics import snapshot
+from state_store import transcript_journal
+from state_store.transcript_journal import TranscriptJournal
+
+
+def transcript(number: int, **fields) -> dict:
+    return {
+        "user_id": "U1",
+        "channel_id": "C1",
+        "thread_ts": "1.0",
+        "prompt": f"Question {number}",
+        "response": f"Answer {number} " + "x" * 200,
+        "created_at": 1000.0 + number,
+        **fields,
+    }
+
+
+def dropped_transcripts() -> float:
+    return sum(value for name, _, value in snapshot() if name == "transcripts_dropped")
+
+
+@pytest.fixture
+def base_dir(tmp_path):
+    return str(tmp_path)
+
+
+def test_records_are_found_by_thread_user_and_time(base_dir):
+    journal = TranscriptJournal(base_dir=base_dir)
+    journal.append(transcript(1))
+    journal.append(transcript(2, user_id="U2", thread_ts="2.0"))
+    journal.append(transcript(3))
+    journal.close()
+
+    reader = TranscriptJournal(base_dir=base_dir, read_only=True)
+    assert [r["prompt"] for r in reader.thread("C1", "1.0")] == [
+        "Question 1",
+        "Question 3",
+    ]
+    assert [r["prompt"] for r in reader.user("U2")] == ["Question 2"]
+    assert [r["prompt"] for r in reader.find(since=1002, until=1003)] == ["Question 2"]
+
+
+def test_segments_rotate_at_their_size_limit(base_dir):
+    journal = TranscriptJournal(base_dir=base_dir, segment_bytes=256)
+    for number in range(10):
+        journal.append(transcript(number))
+    journal.close()
+
+    segments = sorted(os.listdir(base_dir))
+    segments = [name for name in segments if name.startswith("segment-")]
+    assert len(segments) > 1
+    reader = TranscriptJournal(base_dir=base_dir, read_only=True)
+    assert [r["prompt"] for r in reader.find()] == [
+        f"Question {number}" for number in range(10)
+    ]
+
+
+def test_unindexed_frames_are_truncated_on_restart(base_dir):
+    journal = TranscriptJournal(base_dir=base_dir)
+    journal.append(transcript(1))
+    journal.close()
+    segment = os.path.join(base_dir, "segment-000001.log")
+    indexed_size = os.path.getsize(segment)
+
+    # A crash between writing a frame and indexing it leaves a torn tail
+    with open(segment, "ab") as file:
+        file.write(b"\x10\x00\x00\x00torn frame")
+
+    journal = TranscriptJournal(base_dir=base_dir)
+    assert os.path.getsize(segment) == indexed_size
+    journal.append(transcript(2))
+    journal.close()
+
+    reader = TranscriptJournal(base_dir=base_dir, read_only=True)
+    assert [r["prompt"] for r in reader.find()] == ["Question 1", "Question 2"]
+
+
+def test_readers_leave_the_tail_alone(base_dir):
+    journal = TranscriptJournal(base_dir=base_dir)
+    journal.append(transcript(1))
+    journal.close()
+    segment = os.path.join(base_dir, "segment-000001.log")
+    with open(segment, "ab") as file:
+        file.write(b"not yet indexed")
+    size = os.path.getsize(segment)
+
+    TranscriptJournal(base_dir=base_dir, read_only=True)
+    assert os.path.getsize(segment) == size
+
+
+def test_corrupt_frames_are_detected(base_dir):
+    journal = TranscriptJournal(base_dir=base_dir)
+    journal.append(transcript(1))
+    journal.close()
+    segment = os.path.join(base_dir, "segment-000001.log")
+    with open(segment, "r+b") as file:
+        file.seek(12)
+        byte = file.read(1)
+        file.seek(12)
+        file.write(bytes([byte[0] ^ 0xFF]))
+
+    reader = TranscriptJournal(base_dir=base_dir, read_only=True)
+    with pytest.raises(ValueError, match="Corrupt transcript frame"):
+        list(reader.find())
+
+
+def test_records_are_dropped_while_the_writer_is_behind(base_dir, monkeypatch):
+    monkeypatch.setattr(transcript_journal, "_MAX_QUEUED", 2)
+    journal = TranscriptJournal(base_dir=base_dir)
+    writing = threading.Event()
+    written = threading.Event()
+    commit = journal._commit
+
+    def stalled_commit(records):
+        writing.set()
+        written.wait()
+        commit(records)
+
+    monkeypatch.setattr(journal, "_commit", stalled_commit)
+    dropped = dropped_transcripts()
+    journal.append(transcript(1))
+    writing.wait()
+    for number in range(2, 6):
+        journal.append(transcript(number))
+    assert dropped_transcripts() == dropped + 2
+    written.set()
+    journal.close()
+
+    reader = TranscriptJournal(base_dir=base_dir, read_only=True)
+    assert [r["prompt"] for r in reader.find()] == [
+        "Question 1",
+        "Question 2",
+        "Question 3",
+    ]